@@ -0,0 +1,117 @@
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # Optional, responses fall back to gzip
+    brotli = None
+
+# Preferred first when a client accepts several
+ENCODINGS = ('br', 'gzip')
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """The best supported encoding a client accepts, ignoring those with q=0"""
+    accepted = set()
+    for part in accept_encoding.split(','):
+        name, *params = part.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    for encoding in ENCODINGS:
+        if encoding == 'br' and brotli is None:
+            continue
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+class _Compressor:
+    """Incremental compressor; flush() emits everything written so far for streamed bodies"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=brotli_quality)
+            self.compress, self.flush, self.finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self.compress = compressor.compress
+            self.flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.finish = compressor.flush
+
+
+class CompressionMiddleware:
+    """Compress responses of at least minimum_size bytes with brotli or gzip.
+
+    Streamed responses are always compressed and flushed per chunk, so NDJSON
+    rows still reach the client as they are produced.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = None
+        if scope['type'] == 'http':
+            encoding = choose_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message = {}
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+            if message['type'] == 'http.response.start':
+                # Held back until the first body shows whether to compress
+                start = message
+                return
+            if message['type'] != 'http.response.body' or passthrough:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start['headers'])
+                if 'content-encoding' in headers or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                body = compressor.compress(body) + (compressor.flush() if more_body else compressor.finish())
+                headers['Content-Encoding'] = encoding
+                headers.add_vary_header('Accept-Encoding')
+                if more_body:
+                    del headers['Content-Length']
+                else:
+                    headers['Content-Length'] = str(len(body))
+                # The encoded body differs byte for byte, so its validator is only weak
+                etag = headers.get('etag')
+                if etag and not etag.startswith('W/'):
+                    headers['ETag'] = f"W/{etag}"
+                await send(start)
+                await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+                return
+
+            body = compressor.compress(body) + (compressor.flush() if more_body else compressor.finish())
+            await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,100 @@
+import os
+from dotenv import load_dotenv
+
+# Load settings from a .env file if one exists
+load_dotenv()
+
+# Number of rows written per executemany batch during ingestion
+BULK_INSERT_BATCH_SIZE = int(os.getenv("BULK_INSERT_BATCH_SIZE", "5000"))
+
+# How to handle rows whose (task_name, sale_id) already exists: skip, upsert or error
+DUPLICATE_POLICY = os.getenv("DUPLICATE_POLICY", "skip")
+
+# Maximum rows parsed, normalised and written per chunk when ingesting a source
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "50000"))
+
+# Worker processes that parse, normalise and filter sources (0 parses in the request
+# thread), CSV bytes per worker unit and directory for chunks handed back to the
+# writer (a tmpfs such as /dev/shm keeps them in shared memory)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))
+INGEST_SPLIT_BYTES = int(os.getenv("INGEST_SPLIT_BYTES", str(32 * 1024 * 1024)))
+INGEST_WORKER_DIR = os.getenv("INGEST_WORKER_DIR") or None
+
+# URL sources: parallel downloads, per-request timeout in seconds and retry policy
+URL_FETCH_CONCURRENCY = int(os.getenv("URL_FETCH_CONCURRENCY", "4"))
+URL_FETCH_TIMEOUT = float(os.getenv("URL_FETCH_TIMEOUT", "30"))
+URL_FETCH_RETRIES = int(os.getenv("URL_FETCH_RETRIES", "3"))
+URL_FETCH_BACKOFF = float(os.getenv("URL_FETCH_BACKOFF", "0.5"))
+
+# Downloads larger than this many bytes are spooled to disk instead of memory
+URL_SPOOL_MAX_SIZE = int(os.getenv("URL_SPOOL_MAX_SIZE", str(8 * 1024 * 1024)))
+
+# Background report jobs: worker threads, max jobs waiting in the queue and upload spool directory
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "20"))
+JOB_SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", "job_spool")
+
+# A running job renews its lease every JOB_HEARTBEAT_SECONDS; at startup, running jobs
+# whose lease is older than JOB_LEASE_SECONDS are taken to be abandoned and requeued
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+# Analytics and task-list response cache bounds
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+
+# Serialise JSON responses with orjson (optional dependency) instead of the standard library
+FAST_JSON = os.getenv("FAST_JSON", "false").lower() in ("1", "true", "yes")
+
+# Responses of at least this many bytes are compressed with brotli or gzip (0 disables),
+# at these compression levels
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+# Allow requests sent with an X-Profile header to return a sampling profile of the
+# call instead of its response, and the seconds between samples
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.001"))
+
+# Most cells returned by a dimension/measure query before it is truncated
+QUERY_MAX_CELLS = int(os.getenv("QUERY_MAX_CELLS", "10000"))
+
+# Optional columnar snapshot of each task, written after every ingest and used by
+# dimension queries: on/off, directory and Arrow IPC compression (lz4, zstd or uncompressed).
+# Uncompressed columns are read straight from the memory map, compressed ones are
+# decoded into memory on every read, see benchmarks/snapshots.py for the trade-off
+COLUMNAR_SNAPSHOTS = os.getenv("COLUMNAR_SNAPSHOTS", "false").lower() in ("1", "true", "yes")
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_COMPRESSION = os.getenv("SNAPSHOT_COMPRESSION", "uncompressed")
+
+# Content-addressed cache of normalised sources, so repeated uploads and unchanged URLs
+# (checked with a conditional GET) skip parsing: on/off, directory and disk budget in
+# bytes, least recently used sources are evicted beyond it
+SOURCE_CACHE = os.getenv("SOURCE_CACHE", "false").lower() in ("1", "true", "yes")
+SOURCE_CACHE_DIR = os.getenv("SOURCE_CACHE_DIR", "source_cache")
+SOURCE_CACHE_MAX_BYTES = int(os.getenv("SOURCE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Directory of the per-task partition files holding each task's sales, rollups and sketches
+TASK_PARTITION_DIR = os.getenv("TASK_PARTITION_DIR", "partitions")
+
+# Retention: most tasks kept and most bytes their partitions may use on disk, 0 for no
+# limit. Beyond either, the least recently viewed tasks are dropped after each write
+TASK_RETENTION_MAX_TASKS = int(os.getenv("TASK_RETENTION_MAX_TASKS", "0"))
+TASK_RETENTION_MAX_BYTES = int(os.getenv("TASK_RETENTION_MAX_BYTES", "0"))
+
+# Seconds a starting worker waits for another worker's schema migration to finish
+MIGRATION_LOCK_TIMEOUT = float(os.getenv("MIGRATION_LOCK_TIMEOUT", "60"))
+
+# SQLite database location
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///car_sales.db")
+
+# SQLite tuning: read connection pool size, seconds to wait on a locked database or
+# for the single write connection, sync mode, page cache in KiB and memory-map size in bytes
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "30"))
+DB_WRITE_WAIT_TIMEOUT = float(os.getenv("DB_WRITE_WAIT_TIMEOUT", "600"))
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "65536"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
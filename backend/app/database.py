@@ -1,9 +1,60 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///car_sales.db"
+from app import config
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+
+
+def _configure_connection(dbapi_connection, read_only: bool) -> None:
+    """Apply WAL journaling and tuning pragmas to a new SQLite connection"""
+    # Transactions are started explicitly by _begin, not by the driver
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute(f"PRAGMA busy_timeout = {int(config.DB_BUSY_TIMEOUT * 1000)}")
+        cursor.execute(f"PRAGMA synchronous = {config.DB_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size = -{config.DB_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size = {config.DB_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+    finally:
+        cursor.close()
+
+
+def _create_engine(read_only: bool, **pool_options):
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, **pool_options
+    )
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        _configure_connection(dbapi_connection, read_only)
+
+    @event.listens_for(engine, "begin")
+    def begin(conn):
+        if conn.get_execution_options().get('isolation_level') == 'AUTOCOMMIT':
+            return
+        # Writers take the write lock up front so a read-then-write transaction never
+        # fails on a stale WAL snapshot, readers get one consistent snapshot
+        conn.exec_driver_sql("BEGIN" if read_only else "BEGIN IMMEDIATE")
+
+    return engine
+
+
+# SQLite allows one writer at a time, so writes share a single pooled connection
+# and wait their turn in the pool instead of failing on a locked database
+write_engine = _create_engine(
+    read_only=False, pool_size=1, max_overflow=0, pool_timeout=config.DB_WRITE_WAIT_TIMEOUT
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) 
\ No newline at end of file
+
+# WAL readers never block on the writer, so reads get their own pool
+read_engine = _create_engine(
+    read_only=True, pool_size=config.DB_READ_POOL_SIZE, max_overflow=config.DB_READ_POOL_SIZE
+)
+
+engine = write_engine
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=write_engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
@@ -0,0 +1,169 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(_Metric):
+    """Monotonic total, one per combination of label values"""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _merge(self, values: dict) -> None:
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+    def render(self) -> Iterator[str]:
+        yield from super().render()
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets, with their sum and count"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent in the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _merge(self, values: dict) -> None:
+        with self._lock:
+            for key, (counts, total) in values.items():
+                current, current_total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+                self._values[key] = ([a + b for a, b in zip(current, counts)], current_total + total)
+
+    def render(self) -> Iterator[str]:
+        yield from super().render()
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        names = self.labelnames + ('le',)
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(bound)
+                yield f"{self.name}_bucket{_format_labels(names, key + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+def timed(iterable: Iterable, stage: str) -> Iterator:
+    """Yield from iterable, observing the time each item took to produce as an ingest stage"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            INGEST_STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        yield item
+
+
+def drain() -> dict:
+    """Take the values recorded in this process since the last drain, resetting them.
+
+    Worker processes return these with their results, so the serving process
+    can merge them into what it exposes.
+    """
+    drained = {}
+    for metric in _registry:
+        with metric._lock:
+            if metric._values:
+                drained[metric.name] = metric._values
+                metric._values = {}
+    return drained
+
+
+def merge(drained: dict) -> None:
+    for metric in _registry:
+        if metric.name in drained:
+            metric._merge(drained[metric.name])
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    return '\n'.join(line for metric in _registry for line in metric.render()) + '\n'
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'dvisuli_http_request_duration_seconds',
+    'Seconds to produce a response, by endpoint, method and status',
+    ('endpoint', 'method', 'status')
+)
+INGEST_STAGE_SECONDS = Histogram(
+    'dvisuli_ingest_stage_seconds',
+    'Seconds spent per chunk in each ingestion stage',
+    ('stage',)
+)
+INGEST_BYTES_READ = Counter('dvisuli_ingest_bytes_read_total', 'Bytes of source data read for ingestion')
+INGEST_ROWS_PARSED = Counter('dvisuli_ingest_rows_parsed_total', 'Rows parsed from sources')
+INGEST_ROWS_FILTERED = Counter('dvisuli_ingest_rows_filtered_total', 'Rows removed by source filters')
+INGEST_ROWS_WRITTEN = Counter('dvisuli_ingest_rows_written_total', 'Sales rows inserted or updated in the database')
+CACHE_REQUESTS = Counter(
+    'dvisuli_cache_requests_total',
+    'Cache lookups by cache and result (hit, miss or revalidated)',
+    ('cache', 'result')
+)
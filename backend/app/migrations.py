@@ -0,0 +1,190 @@
+import logging
+import os
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import create_engine, insert, inspect, or_, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app import config
+from app.database import engine as default_engine
+from app.models import (
+    IngestJob, Sale, SchemaMigration, TaskCatalog,
+    TaskCompanyRollup, TaskMonthRollup, TaskModelRollup, TaskSketch, TaskSource
+)
+
+logger = logging.getLogger(__name__)
+
+DERIVED_TABLES = [
+    TaskCompanyRollup.__table__,
+    TaskMonthRollup.__table__,
+    TaskModelRollup.__table__,
+    TaskCatalog.__table__
+]
+
+
+def _create_tables(conn: Connection, tables) -> None:
+    for table in tables:
+        table.create(conn, checkfirst=True)
+
+
+def initial_schema(conn: Connection) -> None:
+    """Sales and report job tables"""
+    _create_tables(conn, [Sale.__table__, IngestJob.__table__])
+
+
+def task_rollups_and_catalog(conn: Connection) -> None:
+    """Rollup and catalog tables, backfilled from existing sales"""
+    from app.services import rollups
+
+    # Rollups and catalog are derived from sales, so rebuild them from scratch
+    for table in reversed(DERIVED_TABLES):
+        table.drop(conn, checkfirst=True)
+    _create_tables(conn, DERIVED_TABLES)
+
+    db = Session(bind=conn)
+    task_names = rollups.rebuild_rollups(db)
+    db.flush()
+    logger.info(f"Backfilled rollups for {len(task_names)} tasks")
+
+
+def sales_covering_indexes(conn: Connection) -> None:
+    """Per-task indexes covering the rollup and analytics groupings"""
+    for index in Sale.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def task_source_ledger(conn: Connection) -> None:
+    """Content hashes of the sources ingested into each task"""
+    _create_tables(conn, [TaskSource.__table__])
+
+
+def task_price_sketches(conn: Connection) -> None:
+    """Per company and month sketches of prices, models and locations, backfilled from existing sales"""
+    from app.services import sketches
+
+    _create_tables(conn, [TaskSketch.__table__])
+
+    db = Session(bind=conn)
+    task_names = sketches.rebuild_sketches(db)
+    db.flush()
+    logger.info(f"Backfilled sketches for {len(task_names)} tasks")
+
+
+def task_partitions(conn: Connection) -> None:
+    """Move each task's sales, rollups, sketches and sources out of the shared database into its own partition"""
+    from app import partitions
+
+    if not conn.dialect.has_table(conn, Sale.__tablename__, schema='main'):
+        return
+    task_names = list(conn.scalars(select(Sale.task_name).distinct()))
+    if task_names:
+        os.makedirs(config.TASK_PARTITION_DIR, exist_ok=True)
+
+    for task_name in task_names:
+        # Partitions are written outside the migration's transaction, so one left by an
+        # interrupted attempt is replaced
+        partitions.drop(task_name)
+        partition_engine = create_engine(f"sqlite:///{partitions.partition_path(task_name)}")
+        try:
+            with partition_engine.begin() as target:
+                target.exec_driver_sql("PRAGMA journal_mode = WAL")
+                for table in partitions.TASK_TABLES:
+                    table.create(target)
+                    result = conn.execute(
+                        select(table).where(table.c.task_name == task_name), execution_options={'yield_per': 100000}
+                    )
+                    for batch in result.partitions():
+                        target.execute(insert(table), [row._mapping for row in batch])
+        finally:
+            partition_engine.dispose()
+        logger.info(f"Moved task {task_name} to partition {partitions.partition_path(task_name)}")
+
+    # Space freed here is reused by the catalog and jobs, VACUUM returns it to the filesystem
+    for table in reversed(partitions.TASK_TABLES):
+        table.drop(conn, checkfirst=True)
+
+
+def job_worker_ids(conn: Connection) -> None:
+    """Worker that claimed each report job, so startup only requeues jobs whose worker is gone"""
+    columns = {column['name'] for column in inspect(conn).get_columns(IngestJob.__tablename__, schema='main')}
+    if 'worker_id' not in columns:
+        conn.exec_driver_sql(f"ALTER TABLE main.{IngestJob.__tablename__} ADD COLUMN worker_id VARCHAR")
+
+
+def rollup_missing_keys(conn: Connection) -> None:
+    """Rebuild the rollups of tasks with sales missing a company or car model, which earlier rollups left out"""
+    from app import partitions
+    from app.services import rollups
+
+    if not conn.dialect.has_table(conn, TaskCatalog.__tablename__, schema='main'):
+        return
+    for task_name in list(conn.scalars(select(TaskCatalog.task_name))):
+        path = partitions.partition_path(task_name)
+        if not os.path.exists(path):
+            continue
+        # Partitions are separate files, written outside the migration's transaction
+        partition_engine = create_engine(f"sqlite:///{path}")
+        try:
+            with partition_engine.begin() as target:
+                missing = target.execute(
+                    select(Sale.sale_id).where(
+                        Sale.task_name == task_name, or_(Sale.company.is_(None), Sale.car_model.is_(None))
+                    ).limit(1)
+                ).first()
+                if missing:
+                    db = Session(bind=target)
+                    rollups.refresh_task_rollups(db, task_name)
+                    db.flush()
+                    logger.info(f"Rebuilt rollups of task {task_name}")
+        finally:
+            partition_engine.dispose()
+
+
+# Tables are created from the current models with checkfirst, so every migration
+# must be safe to run against a schema that already has its changes. Alter existing
+# tables in a new migration that checks before it changes anything.
+MIGRATIONS: List[Tuple[int, Callable[[Connection], None]]] = [
+    (1, initial_schema),
+    (2, task_rollups_and_catalog),
+    (3, sales_covering_indexes),
+    (4, task_source_ledger),
+    (5, task_price_sketches),
+    (6, task_partitions),
+    (7, job_worker_ids),
+    (8, rollup_missing_keys),
+]
+
+
+def migrate(engine: Engine = default_engine) -> List[int]:
+    """Apply pending migrations and return the versions applied by this call.
+
+    Runs in one BEGIN IMMEDIATE transaction, so workers starting together
+    serialise on the SQLite write lock and all but the first find nothing to apply.
+    """
+    applied = []
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {int(config.MIGRATION_LOCK_TIMEOUT * 1000)}")
+        # Take the write lock up front so workers wait here instead of racing on DDL
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            SchemaMigration.__table__.create(conn, checkfirst=True)
+            done = set(conn.scalars(select(SchemaMigration.version)))
+            for version, upgrade in MIGRATIONS:
+                if version in done:
+                    continue
+                logger.info(f"Applying migration {version}: {upgrade.__name__}")
+                upgrade(conn)
+                conn.execute(insert(SchemaMigration).values(
+                    version=version, name=upgrade.__name__, applied_at=datetime.utcnow()
+                ))
+                applied.append(version)
+            conn.exec_driver_sql("COMMIT")
+        except Exception:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+
+    if applied:
+        logger.info(f"Applied migrations {applied}")
+    return applied
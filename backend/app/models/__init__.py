@@ -1,4 +1,14 @@
 from .base import Base
 from .sale import Sale
+from .job import IngestJob
+from .rollup import TaskCompanyRollup, TaskMonthRollup, TaskModelRollup
+from .catalog import TaskCatalog
+from .migration import SchemaMigration
+from .source import TaskSource
+from .sketch import TaskSketch
 
-__all__ = ['Base', 'Sale']
+__all__ = [
+    'Base', 'Sale', 'IngestJob',
+    'TaskCompanyRollup', 'TaskMonthRollup', 'TaskModelRollup',
+    'TaskCatalog', 'SchemaMigration', 'TaskSource', 'TaskSketch'
+]
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from .base import Base
+from datetime import datetime
+
+class TaskCatalog(Base):
+    __tablename__ = 'task_catalog'
+    # Tables without a schema live in each task's partition, the catalog is shared
+    __table_args__ = {'schema': 'main'}
+
+    task_name = Column(String, primary_key=True)
+    data_version = Column(Integer, nullable=False, default=1)  # Bumped on every write to the task
+    record_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
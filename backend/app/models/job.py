@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON
+from .base import Base
+from datetime import datetime
+
+class IngestJob(Base):
+    __tablename__ = 'ingest_jobs'
+    # In the shared database, whichever task the job writes
+    __table_args__ = {'schema': 'main'}
+
+    id = Column(String, primary_key=True)
+    task_name = Column(String, nullable=False)
+    task_description = Column(String)
+    status = Column(String, nullable=False, default='queued')  # queued, running, completed, failed
+    sources = Column(JSON, nullable=False)  # [{'name', 'type', 'path' or 'url'}]
+    options = Column(JSON, nullable=False)  # filters, chunk_size, batch_size, on_duplicate
+    rows_ingested = Column(Integer, nullable=False, default=0)
+    source_metadata = Column(JSON)
+    error = Column(Text)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    worker_id = Column(String)  # host, pid and token of the worker that claimed the job
+    finished_at = Column(DateTime)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'task_name': self.task_name,
+            'status': self.status,
+            'rows_ingested': self.rows_ingested,
+            'sources': [
+                {'name': source['name'], 'type': source['type']} for source in self.sources
+            ],
+            'source_metadata': self.source_metadata,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'worker_id': self.worker_id,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from .base import Base
+from datetime import datetime
+
+class SchemaMigration(Base):
+    __tablename__ = 'schema_migrations'
+    __table_args__ = {'schema': 'main'}
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, nullable=False, default=datetime.utcnow)
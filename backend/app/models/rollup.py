@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, String, Float, PrimaryKeyConstraint
+from .base import Base
+
+class TaskCompanyRollup(Base):
+    __tablename__ = 'task_company_rollup'
+
+    task_name = Column(String, nullable=False)
+    company = Column(String)
+    sales_count = Column(Integer, nullable=False)
+    revenue = Column(Float, nullable=False)
+    price_min = Column(Float)
+    price_max = Column(Float)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('task_name', 'company', name='pk_task_company_rollup'),
+    )
+
+class TaskMonthRollup(Base):
+    __tablename__ = 'task_month_rollup'
+
+    task_name = Column(String, nullable=False)
+    month = Column(String, nullable=False)  # YYYY-MM
+    sales_count = Column(Integer, nullable=False)
+    revenue = Column(Float, nullable=False)
+    price_min = Column(Float)
+    price_max = Column(Float)
+    date_min = Column(String)  # YYYY-MM-DD
+    date_max = Column(String)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('task_name', 'month', name='pk_task_month_rollup'),
+    )
+
+class TaskModelRollup(Base):
+    __tablename__ = 'task_model_rollup'
+
+    task_name = Column(String, nullable=False)
+    car_model = Column(String)
+    sales_count = Column(Integer, nullable=False)
+    revenue = Column(Float, nullable=False)
+    price_min = Column(Float)
+    price_max = Column(Float)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('task_name', 'car_model', name='pk_task_model_rollup'),
+    )
@@ -1,9 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, Date, PrimaryKeyConstraint
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, Float, Date, PrimaryKeyConstraint, Index
 from .base import Base
-from datetime import datetime
-
-Base = declarative_base()
 
 class Sale(Base):
     __tablename__ = 'sales'
@@ -17,9 +13,14 @@ class Sale(Base):
     sales_location = Column(String)
     date_of_sale = Column(Date)
 
-    # Define composite primary key
+    # Define composite primary key and covering indexes for the per-task
+    # group-by and filter paths, so analytics never scan the whole table
     __table_args__ = (
         PrimaryKeyConstraint('task_name', 'sale_id', name='pk_sale'),
+        Index('ix_sales_task_company', 'task_name', 'company', 'date_of_sale', 'price'),
+        Index('ix_sales_task_date', 'task_name', 'date_of_sale', 'price'),
+        Index('ix_sales_task_model', 'task_name', 'car_model', 'price'),
+        Index('ix_sales_task_location', 'task_name', 'sales_location', 'price'),
     )
 
     @classmethod
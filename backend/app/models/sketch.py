@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, LargeBinary, String, PrimaryKeyConstraint
+from .base import Base
+
+class TaskSketch(Base):
+    __tablename__ = 'task_sketches'
+
+    task_name = Column(String, nullable=False)
+    company = Column(String, nullable=False)  # '' for sales without a company
+    month = Column(String, nullable=False)  # YYYY-MM
+    sales_count = Column(Integer, nullable=False)
+    price_digest = Column(LargeBinary)  # t-digest of prices, None when no sale has one
+    model_hll = Column(LargeBinary, nullable=False)  # HyperLogLog of car models
+    location_hll = Column(LargeBinary, nullable=False)  # HyperLogLog of sales locations
+
+    __table_args__ = (
+        PrimaryKeyConstraint('task_name', 'company', 'month', name='pk_task_sketches'),
+    )
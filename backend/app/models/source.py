@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime, PrimaryKeyConstraint
+from .base import Base
+from datetime import datetime
+
+class TaskSource(Base):
+    __tablename__ = 'task_sources'
+
+    task_name = Column(String, nullable=False)
+    content_hash = Column(String, nullable=False)  # SHA-256 of the source bytes
+    source_name = Column(String)
+    records = Column(Integer, nullable=False, default=0)
+    ingested_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('task_name', 'content_hash', name='pk_task_sources'),
+    )
@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import os
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import config
+from app.database import read_engine, write_engine
+from app.models import (
+    Sale, TaskCompanyRollup, TaskMonthRollup, TaskModelRollup, TaskSketch, TaskSource
+)
+
+logger = logging.getLogger(__name__)
+
+# Schema a session's task partition is attached as. Task tables are declared without a
+# schema and rendered into it, shared tables name the main database explicitly
+SCHEMA = 'task'
+SCHEMA_MAP = {None: SCHEMA}
+
+# Tables every partition holds, for its task alone
+TASK_TABLES = [
+    Sale.__table__,
+    TaskCompanyRollup.__table__,
+    TaskMonthRollup.__table__,
+    TaskModelRollup.__table__,
+    TaskSketch.__table__,
+    TaskSource.__table__
+]
+
+# A partition's database file and the files SQLite keeps beside it
+FILE_SUFFIXES = ('', '-wal', '-shm', '-journal')
+
+
+def partition_path(task_name: str) -> str:
+    digest = hashlib.sha256(task_name.encode('utf-8')).hexdigest()[:32]
+    return os.path.join(config.TASK_PARTITION_DIR, f"{digest}.db")
+
+
+def partition_bytes(task_name: str) -> int:
+    """Disk space a task's partition takes, including its write-ahead log"""
+    path = partition_path(task_name)
+    return sum(os.path.getsize(path + suffix) for suffix in FILE_SUFFIXES if os.path.exists(path + suffix))
+
+
+def last_used(task_name: str) -> float:
+    """When a task was last viewed or written, from its partition's mtime, 0 without a partition"""
+    try:
+        return os.path.getmtime(partition_path(task_name))
+    except OSError:
+        return 0.0
+
+
+def create_tables(connection) -> None:
+    """Create the task tables missing from a freshly attached partition"""
+    existing = {
+        row[0] for row in connection.exec_driver_sql(f"SELECT name FROM {SCHEMA}.sqlite_master WHERE type = 'table'")
+    }
+    for table in TASK_TABLES:
+        if table.name not in existing:
+            table.create(connection, checkfirst=False)
+
+
+def _attach(connection, path: str) -> None:
+    # SQLite cannot attach inside a transaction, so this runs on the driver
+    # connection before the session begins one
+    dbapi_connection = connection.connection.driver_connection
+    dbapi_connection.execute(f"ATTACH DATABASE ? AS {SCHEMA}", (path,))
+    connection.connection.info['partition'] = path
+    if path != ':memory:':
+        dbapi_connection.execute(f"PRAGMA {SCHEMA}.journal_mode = WAL")
+        dbapi_connection.execute(f"PRAGMA {SCHEMA}.synchronous = {config.DB_SYNCHRONOUS}")
+        dbapi_connection.execute(f"PRAGMA {SCHEMA}.cache_size = -{config.DB_CACHE_SIZE_KB}")
+        dbapi_connection.execute(f"PRAGMA {SCHEMA}.mmap_size = {config.DB_MMAP_SIZE}")
+
+
+def _detach(dbapi_connection, connection_record) -> None:
+    """Detach a returned connection's partition, so its file is not held open by the pool"""
+    if connection_record.info.pop('partition', None) and dbapi_connection is not None:
+        dbapi_connection.execute(f"DETACH DATABASE {SCHEMA}")
+
+
+for _engine in (read_engine, write_engine):
+    event.listen(_engine, 'checkin', _detach)
+
+
+class PartitionSession(Session):
+    """Session on its own connection with a task's partition attached, released when the session closes"""
+
+    def close(self) -> None:
+        connection = self.bind
+        try:
+            super().close()
+        finally:
+            connection.close()
+
+
+def open_session(task_name: str, write: bool = False, create: bool = False) -> Session:
+    """Session on a task's partition together with the shared catalog and job tables.
+
+    Opening one marks the task as used for retention. With create, a missing
+    partition is created and the session's info['created'] is set. A read of a
+    task without a partition attaches an empty database, callers look the task up
+    in the catalog before touching its tables.
+    """
+    path = partition_path(task_name)
+    connection = (write_engine if write else read_engine).connect()
+    try:
+        # Checked while holding the single write connection, so no other write creates
+        # or drops the partition in between
+        exists = os.path.exists(path)
+        if create and not exists:
+            os.makedirs(config.TASK_PARTITION_DIR, exist_ok=True)
+        _attach(connection, path if exists or create else ':memory:')
+        connection.execution_options(schema_translate_map=SCHEMA_MAP)
+        if create:
+            create_tables(connection)
+            connection.commit()
+        if exists:
+            os.utime(path)
+    except BaseException:
+        connection.close()
+        raise
+    return PartitionSession(bind=connection, autoflush=False, info={'created': create and not exists})
+
+
+def drop(task_name: str) -> bool:
+    """Delete a task's partition files, in constant time whatever the task's size.
+
+    Connections that still have the partition attached keep reading the unlinked
+    file until they are returned. Returns whether there was a partition.
+    """
+    path = partition_path(task_name)
+    found = False
+    for suffix in FILE_SUFFIXES:
+        try:
+            os.remove(path + suffix)
+            found = True
+        except FileNotFoundError:
+            pass
+    if found:
+        logger.info(f"Dropped partition of task {task_name}")
+    return found
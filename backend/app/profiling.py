@@ -0,0 +1,157 @@
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Innermost frames of threads that are waiting rather than working
+IDLE_FRAMES = {('threading.py', 'wait'), ('selectors.py', 'select'), ('queue.py', 'get')}
+
+# Outermost frames of a thread searched for the context it runs work in
+CONTEXT_DEPTH = 8
+
+# The sampler of the request being profiled, copied into the context of every
+# threadpool call made for the request
+_profiled = contextvars.ContextVar('profiled_request', default=None)
+
+
+class StackSampler(threading.Thread):
+    """Samples the Python stacks of the threads serving one request at a fixed interval.
+
+    Sampling sees the worker threads that run the request's sync endpoint and
+    dependencies, which a profiler enabled on the event loop thread would miss.
+    Threadpool workers run each call in a copy of the caller's context, held by
+    one of their outermost frames, so a worker is sampled only while that context
+    belongs to the request. The event loop thread is sampled while the request is
+    in progress, along with any other request it is serving at the time. Threads
+    idle in a wait, select or queue get are left out.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(name='stack-sampler', daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.loop_thread = threading.get_ident()
+        self._done = threading.Event()
+        # Per thread, its outermost frame and the frame holding a context, if any
+        self._context_frames = {}
+
+    def _serves_request(self, ident: int, frames: list) -> bool:
+        if ident == self.loop_thread:
+            return True
+        cached = self._context_frames.get(ident)
+        if cached is None or cached[0] is not frames[-1]:
+            holder = next((
+                frame for frame in reversed(frames[-CONTEXT_DEPTH:])
+                if any(isinstance(value, contextvars.Context) for value in frame.f_locals.values())
+            ), None)
+            cached = self._context_frames[ident] = (frames[-1], holder)
+        return cached[1] is not None and any(
+            isinstance(value, contextvars.Context) and value.get(_profiled) is self
+            for value in cached[1].f_locals.values()
+        )
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._done.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(frame)
+                    frame = frame.f_back
+                top = frames[0].f_code
+                if (os.path.basename(top.co_filename), top.co_name) in IDLE_FRAMES:
+                    continue
+                if not self._serves_request(ident, frames):
+                    continue
+                self.stacks[tuple(
+                    (frame.f_code.co_filename, frame.f_code.co_firstlineno, frame.f_code.co_name)
+                    for frame in reversed(frames)
+                )] += 1
+
+    def stop(self) -> None:
+        self._done.set()
+        self.join()
+
+    def report(self, title: str, limit: int) -> str:
+        """Functions by the share of samples they were on the stack for, and running themselves"""
+        inclusive = Counter()
+        own = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                inclusive[function] += count
+
+        total = sum(self.stacks.values()) or 1
+        lines = [
+            title,
+            f"{self.samples} samples every {self.interval * 1000:g} ms, "
+            f"{sum(self.stacks.values())} busy stacks of the request's threads",
+            '',
+            f"{'total %':>8} {'self %':>7} {'~seconds':>9}  function"
+        ]
+        for function, count in inclusive.most_common(limit):
+            filename, lineno, name = function
+            lines.append(
+                f"{100 * count / total:>8.1f} {100 * own[function] / total:>7.1f} "
+                f"{count * self.interval:>9.3f}  {name} ({filename}:{lineno})"
+            )
+        return '\n'.join(lines) + '\n'
+
+
+class ProfilingMiddleware:
+    """Return a sampling profile instead of the response for requests sent with an X-Profile header.
+
+    The endpoint runs as usual, its status is reported in X-Profiled-Status and
+    its body is discarded. Only the threads serving the request are sampled, see
+    StackSampler.
+    """
+
+    def __init__(self, app: ASGIApp, interval: float = 0.001, limit: int = 40):
+        self.app = app
+        self.interval = interval
+        self.limit = limit
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or Headers(scope=scope).get('x-profile', '').lower() not in ('1', 'true', 'yes'):
+            await self.app(scope, receive, send)
+            return
+
+        status = None
+
+        async def discard(message: Message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        sampler = StackSampler(self.interval)
+        token = _profiled.set(sampler)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            sampler.stop()
+            _profiled.reset(token)
+        elapsed = time.perf_counter() - start
+
+        title = f"{scope['method']} {scope['path']} -> {status} in {elapsed:.3f}s"
+        body = sampler.report(title, self.limit).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/plain; charset=utf-8'),
+                (b'content-length', str(len(body)).encode('latin-1')),
+                (b'x-profiled-status', str(status).encode('latin-1'))
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
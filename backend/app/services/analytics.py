@@ -0,0 +1,180 @@
+from collections import defaultdict
+from typing import Iterator, List, Optional
+
+from sqlalchemy import String, func, select, type_coerce
+from sqlalchemy.orm import Session
+
+from app.models import Sale, TaskCompanyRollup, TaskMonthRollup, TaskModelRollup
+from app.services import rollups, sketches
+
+# Shown for the rollup bucket of sales without a company or car model
+MISSING_LABEL = 'Unknown'
+
+
+def _label(key: str) -> str:
+    return MISSING_LABEL if key == rollups.MISSING_KEY else key
+
+
+def summary_query(task_name: str):
+    return select(
+        func.sum(TaskMonthRollup.sales_count).label('total_sales'),
+        func.sum(TaskMonthRollup.revenue).label('total_revenue'),
+        func.min(TaskMonthRollup.date_min).label('start'),
+        func.max(TaskMonthRollup.date_max).label('end')
+    ).where(TaskMonthRollup.task_name == task_name)
+
+
+def company_query(task_name: str):
+    return select(TaskCompanyRollup).where(
+        TaskCompanyRollup.task_name == task_name
+    ).order_by(TaskCompanyRollup.company)
+
+
+def monthly_query(task_name: str):
+    return select(TaskMonthRollup).where(
+        TaskMonthRollup.task_name == task_name
+    ).order_by(TaskMonthRollup.month)
+
+
+def model_query(task_name: str):
+    return select(TaskModelRollup).where(
+        TaskModelRollup.task_name == task_name
+    ).order_by(TaskModelRollup.car_model)
+
+
+def sales_query(
+    task_name: str,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    include_task_name: bool = True
+):
+    # Dates are selected as their stored ISO text, skipping a parse and re-format per row
+    columns = [
+        type_coerce(column, String).label(column.name) if column.name == 'date_of_sale' else column
+        for column in Sale.__table__.columns
+        if include_task_name or column.name != 'task_name'
+    ]
+    query = select(*columns).where(Sale.task_name == task_name)
+    if after is not None:
+        query = query.where(Sale.sale_id > after)
+    query = query.order_by(Sale.sale_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def get_task_summary(db: Session, task_name: str) -> Optional[dict]:
+    """Get summary statistics for a task from its monthly rollup, or None if it has no sales"""
+    row = db.execute(summary_query(task_name)).one()
+
+    if not row.total_sales:
+        return None
+
+    total_revenue = float(row.total_revenue)
+    return {
+        "total_sales": row.total_sales,
+        "total_revenue": round(total_revenue, 2),
+        "average_price": round(total_revenue / row.total_sales, 2),
+        "date_range": {
+            'start': row.start,
+            'end': row.end
+        }
+    }
+
+
+def get_company_breakdown(db: Session, task_name: str) -> List[dict]:
+    """Get sales count and revenue per company for a task"""
+    rows = db.scalars(company_query(task_name)).all()
+
+    return [
+        {
+            'company': _label(row.company),
+            'count': row.sales_count,
+            'total_revenue': round(row.revenue, 2)
+        }
+        for row in rows
+    ]
+
+
+def get_monthly_breakdown(db: Session, task_name: str) -> List[dict]:
+    """Get sales count, revenue and average price per month for a task"""
+    rows = db.scalars(monthly_query(task_name)).all()
+
+    return [
+        {
+            'month': row.month,
+            'count': row.sales_count,
+            'total_revenue': round(row.revenue, 2),
+            'avg_price': round(row.revenue / row.sales_count, 2)
+        }
+        for row in rows
+    ]
+
+
+def get_model_breakdown(db: Session, task_name: str) -> List[dict]:
+    """Get sales count, revenue and price range per car model for a task"""
+    rows = db.scalars(model_query(task_name)).all()
+
+    return [
+        {
+            'car_model': _label(row.car_model),
+            'count': row.sales_count,
+            'total_revenue': round(row.revenue, 2),
+            'min_price': row.price_min,
+            'max_price': row.price_max
+        }
+        for row in rows
+    ]
+
+
+def get_price_distributions(db: Session, task_name: str) -> dict:
+    """Get price quantiles and distinct model and location counts for a task, per company and per month.
+
+    Merged from the task's sketches, so no sales are read.
+    """
+    cells = sketches.load_cells(db, task_name)
+    by_company = defaultdict(list)
+    by_month = defaultdict(list)
+    for cell in cells:
+        by_company[cell.company].append(cell)
+        by_month[cell.month].append(cell)
+
+    return {
+        'summary': sketches.describe(cells),
+        # Sketch cells of sales without a company are keyed '', like the company rollup
+        'company': {_label(company): sketches.describe(group) for company, group in by_company.items()},
+        'month': {month: sketches.describe(group) for month, group in by_month.items()}
+    }
+
+
+def iter_sales_rows(
+    db: Session,
+    task_name: str,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    batch_size: int = 1000
+) -> Iterator[dict]:
+    """Yield a task's sales ordered by sale_id, starting after the given sale_id.
+
+    Uses keyset pagination on the (task_name, sale_id) primary key and fetches
+    from the cursor in batches, so memory stays flat regardless of task size.
+    """
+    result = db.execute(sales_query(task_name, after, limit), execution_options={'yield_per': batch_size}).mappings()
+    for row in result:
+        yield dict(row)
+
+
+def get_sales_rows(db: Session, task_name: str, after: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+    """Get a task's sales as plain dicts"""
+    return list(iter_sales_rows(db, task_name, after, limit))
+
+
+def get_sales_columns(db: Session, task_name: str, after: Optional[str] = None, limit: Optional[int] = None) -> dict:
+    """Get a task's sales as one list per field, smaller and faster to encode than one dict per sale.
+
+    The task name is left out, callers return it once alongside the columns.
+    """
+    result = db.execute(sales_query(task_name, after, limit, include_task_name=False))
+    keys = list(result.keys())
+    columns = list(zip(*result.all())) or [()] * len(keys)
+    return {key: list(values) for key, values in zip(keys, columns)}
@@ -0,0 +1,100 @@
+import logging
+from typing import BinaryIO, Callable, List, Tuple
+
+from sqlalchemy import Column, MetaData, Table, and_, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.models import Sale
+from app.services import catalog, ingest, rollups, sketches
+from app.services.sources import record_sources
+
+logger = logging.getLogger(__name__)
+
+
+def _delta_table() -> Table:
+    """A connection-private table shaped like sales that an append is staged into"""
+    return Table(
+        'sales_delta', MetaData(),
+        *(Column(column.name, column.type, primary_key=column.primary_key) for column in Sale.__table__.columns),
+        # Named explicitly so it is not routed into the task's partition
+        schema='temp',
+        prefixes=['TEMPORARY']
+    )
+
+
+def _touched_cells(db: Session, task_name: str, delta: Table, matched) -> set:
+    """(company, month) sketch cells of the staged sales and of the existing sales they replace"""
+    queries = [
+        select(func.coalesce(delta.c.company, ''), rollups.sale_month(delta.c)).where(delta.c.task_name == task_name),
+        select(func.coalesce(Sale.company, ''), rollups.sale_month()).select_from(matched).where(
+            Sale.task_name == task_name
+        )
+    ]
+    return {tuple(row) for query in queries for row in db.execute(query.distinct())}
+
+
+def append_sources(
+    db: Session,
+    task_name: str,
+    sources: List[Tuple[str, str, BinaryIO]],
+    source_filters: dict = None,
+    chunk_size: int = None,
+    batch_size: int = None,
+    on_chunk: Callable[[int], None] = None
+) -> dict:
+    """Ingest (name, type, file) sources into an existing task within the caller's transaction.
+
+    Sales are deduplicated by sale_id with the last write winning, both within the new
+    sources and against the task's existing sales. Sources whose content was already
+    ingested into the task are skipped. Rows are staged in a temporary table first, so
+    rollups are adjusted by the delta alone instead of being rebuilt from every sale,
+    and only the sketch cells the delta touches are rebuilt.
+    """
+    delta = _delta_table()
+    connection = db.connection()
+    delta.create(connection)
+    try:
+        result = ingest.ingest_sources(
+            db, task_name, sources, source_filters, chunk_size, batch_size,
+            on_duplicate='upsert', on_chunk=on_chunk, target=delta, skip_ingested=True
+        )
+        staged = db.scalar(select(func.count()).select_from(delta))
+
+        if staged:
+            # Existing sales about to be replaced, aggregated before they are overwritten
+            matched = Sale.__table__.join(delta, and_(
+                Sale.task_name == delta.c.task_name, Sale.sale_id == delta.c.sale_id
+            ))
+            replaced = db.scalar(select(func.count()).select_from(matched).where(Sale.task_name == task_name))
+            removed = rollups.aggregate_rollups(db, task_name, join=matched)
+            added = rollups.aggregate_rollups(db, task_name, columns=delta.c)
+            # Sketches are not subtractable, so every cell the delta or the replaced sales fall in is rebuilt
+            cells = _touched_cells(db, task_name, delta, matched)
+
+            names = [column.name for column in delta.columns]
+            stmt = insert(Sale).from_select(names, select(delta).where(delta.c.task_name == task_name))
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=['task_name', 'sale_id'],
+                set_={name: stmt.excluded[name] for name in ingest.SALE_COLUMNS if name != 'sale_id'}
+            ))
+
+            rollups.apply_rollup_delta(db, task_name, added, removed)
+            sketches.refresh_task_sketches(db, task_name, cells)
+            catalog.bump_task_version(db, task_name)
+        else:
+            replaced = 0
+        record_sources(db, task_name, result['source_metadata'])
+    finally:
+        delta.drop(connection)
+
+    result['rows_inserted'] = staged - replaced
+    result['rows_updated'] = replaced
+    result['sources_skipped'] = [
+        metadata['name'] for metadata in result['source_metadata'] if metadata.get('skipped')
+    ]
+    logger.info(
+        f"Appended to task {task_name}: {result['rows_inserted']} inserted, "
+        f"{result['rows_updated']} updated, {len(result['sources_skipped'])} sources skipped"
+    )
+    return result
@@ -0,0 +1,106 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app import config, metrics
+from app.services import encoding
+
+
+class ResponseCache:
+    """LRU cache of serialised responses bounded by entry count, total bytes and TTL"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, body)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, body = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def set(self, key: Hashable, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, body)
+            self._size += len(body)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key: Hashable) -> None:
+        _, body = self._entries.pop(key)
+        self._size -= len(body)
+
+
+response_cache = ResponseCache(
+    max_entries=config.CACHE_MAX_ENTRIES,
+    max_bytes=config.CACHE_MAX_BYTES,
+    ttl=config.CACHE_TTL_SECONDS
+)
+
+
+def make_etag(key: Tuple) -> str:
+    return '"' + hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(',')]
+    return '*' in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def cached_json_response(request: Request, key: Tuple, build: Callable[[], dict]) -> Response:
+    """Serve a JSON payload for a versioned cache key with ETag revalidation.
+
+    The key must include the data version, so entries for stale versions are
+    never served. A matching If-None-Match short-circuits to 304 before the
+    payload is built or looked up.
+    """
+    etag = make_etag(key)
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if _etag_matches(request, etag):
+        metrics.CACHE_REQUESTS.inc(cache='response', result='revalidated')
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(key)
+    metrics.CACHE_REQUESTS.inc(cache='response', result='miss' if body is None else 'hit')
+    if body is None:
+        body = encoding.dumps(build())
+        response_cache.set(key, body)
+    return Response(content=body, media_type='application/json', headers=headers)
+
+
+def invalidate_task(task_name: str) -> None:
+    """Drop cached responses for a task and the task list after it is written"""
+    response_cache.invalidate(
+        lambda key: key[0] == 'tasks' or (len(key) > 1 and key[1] == task_name)
+    )
@@ -0,0 +1,72 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.models import TaskCatalog, TaskMonthRollup
+
+
+def bump_task_version(db: Session, task_name: str) -> None:
+    """Record a write to a task and refresh its record count from the rollups.
+
+    Runs within the caller's transaction, after the task's rollups are refreshed.
+    """
+    now = datetime.utcnow()
+    record_count = db.execute(
+        select(func.coalesce(func.sum(TaskMonthRollup.sales_count), 0)).where(
+            TaskMonthRollup.task_name == task_name
+        )
+    ).scalar_one()
+
+    stmt = insert(TaskCatalog).values(
+        task_name=task_name, data_version=1, record_count=record_count, updated_at=now
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=['task_name'],
+        set_={
+            'data_version': TaskCatalog.data_version + 1,
+            'record_count': record_count,
+            'updated_at': now
+        }
+    ))
+
+
+def task_list_query():
+    """Tasks that hold at least one sale, ordered by name"""
+    return select(TaskCatalog.task_name, TaskCatalog.record_count).where(
+        TaskCatalog.record_count > 0
+    ).order_by(TaskCatalog.task_name)
+
+
+def list_tasks(db: Session) -> list:
+    """Get every task with its record count from the catalog"""
+    return [
+        {
+            "task_name": row.task_name,
+            "record_count": row.record_count
+        }
+        for row in db.execute(task_list_query())
+    ]
+
+
+def get_task_version(db: Session, task_name: str) -> Optional[str]:
+    """Get a token that changes whenever the task's data changes, or None for unknown tasks"""
+    row = db.query(TaskCatalog.data_version, TaskCatalog.updated_at).filter(
+        TaskCatalog.task_name == task_name
+    ).one_or_none()
+    if not row:
+        return None
+    return f"{row.data_version}-{row.updated_at.timestamp():.6f}"
+
+
+def get_catalog_version(db: Session) -> str:
+    """Get a token that changes whenever any task is created or written"""
+    row = db.query(
+        func.count(TaskCatalog.task_name).label('tasks'),
+        func.coalesce(func.sum(TaskCatalog.data_version), 0).label('versions'),
+        func.max(TaskCatalog.updated_at).label('updated_at')
+    ).one()
+    updated_at = row.updated_at.timestamp() if row.updated_at else 0
+    return f"{row.tasks}-{row.versions}-{updated_at:.6f}"
@@ -0,0 +1,32 @@
+import json
+from datetime import date
+from typing import Optional
+
+import numpy as np
+from fastapi import Response
+
+from app import config
+
+
+def _default(value):
+    """Encode the values the standard library cannot: dates and NumPy scalars"""
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload) -> bytes:
+    """Serialise a payload to compact JSON, through orjson when FAST_JSON is set"""
+    if config.FAST_JSON:
+        import orjson
+
+        # Dates and NumPy values are encoded natively, without a per-row conversion pass
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(payload, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """A JSON response serialised by dumps, bypassing FastAPI's jsonable_encoder"""
+    return Response(content=dumps(payload), status_code=status_code, headers=headers, media_type='application/json')
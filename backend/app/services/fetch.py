@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import logging
+from tempfile import SpooledTemporaryFile
+from typing import List
+
+import httpx
+
+from app import config, metrics
+from app.services import source_cache
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying, everything else in the 4xx range fails immediately
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    def __init__(self, url: str, message: str):
+        super().__init__(message)
+        self.url = url
+
+
+async def _download(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    url: str,
+    retries: int,
+    backoff: float
+) -> SpooledTemporaryFile:
+    """Stream a URL into a spooled temporary file, retrying transient failures.
+
+    The file's content_type is the response's, for sources whose URL has no known
+    extension. When the source cache holds the URL's last download, the request is
+    conditional and a 304 Not Modified returns a CachedSource instead of the body.
+    """
+    cached = source_cache.cached_url(url) if source_cache.enabled() else None
+    headers = {}
+    if cached and cached['etag']:
+        headers['If-None-Match'] = cached['etag']
+    if cached and cached['last_modified']:
+        headers['If-Modified-Since'] = cached['last_modified']
+
+    for attempt in range(retries + 1):
+        spool = SpooledTemporaryFile(max_size=config.URL_SPOOL_MAX_SIZE)
+        try:
+            async with semaphore:
+                async with client.stream('GET', url, headers=headers) as response:
+                    if headers:
+                        metrics.CACHE_REQUESTS.inc(
+                            cache='url', result='revalidated' if response.status_code == 304 else 'miss'
+                        )
+                    if response.status_code == 304 and headers:
+                        spool.close()
+                        logger.info(f"{url} is unchanged, using its cached copy")
+                        return source_cache.CachedSource(url, cached['content_hash'], cached.get('content_type'))
+                    response.raise_for_status()
+                    digest = hashlib.sha256()
+                    async for block in response.aiter_bytes():
+                        spool.write(block)
+                        digest.update(block)
+            spool.seek(0)
+            spool.content_type = response.headers.get('content-type')
+            etag, last_modified = response.headers.get('etag'), response.headers.get('last-modified')
+            if source_cache.enabled() and (etag or last_modified):
+                source_cache.remember_url(url, digest.hexdigest(), etag, last_modified, spool.content_type)
+            return spool
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            spool.close()
+            retryable = (
+                isinstance(e, httpx.TransportError)
+                or e.response.status_code in RETRYABLE_STATUS_CODES
+            )
+            if not retryable or attempt == retries:
+                raise FetchError(url, str(e) or type(e).__name__)
+            delay = backoff * (2 ** attempt)
+            logger.warning(f"Fetching {url} failed ({str(e) or type(e).__name__}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        except BaseException:
+            spool.close()
+            raise
+
+
+async def fetch_sources(
+    urls: List[str],
+    concurrency: int = None,
+    timeout: float = None,
+    retries: int = None,
+    backoff: float = None
+) -> List[SpooledTemporaryFile]:
+    """Download URL sources concurrently through one pooled client.
+
+    Returns open spooled files, or CachedSource for unchanged sources, in the
+    same order as urls; the caller closes them.
+    Raises FetchError for the first URL that could not be fetched.
+    """
+    if not urls:
+        return []
+
+    concurrency = concurrency or config.URL_FETCH_CONCURRENCY
+    timeout = timeout or config.URL_FETCH_TIMEOUT
+    retries = config.URL_FETCH_RETRIES if retries is None else retries
+    backoff = config.URL_FETCH_BACKOFF if backoff is None else backoff
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout), limits=limits, follow_redirects=True
+    ) as client:
+        results = await asyncio.gather(
+            *(_download(client, semaphore, url, retries, backoff) for url in urls),
+            return_exceptions=True
+        )
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        for result in results:
+            if not isinstance(result, BaseException):
+                result.close()
+        raise errors[0]
+    return results
@@ -0,0 +1,379 @@
+import re
+from datetime import date
+from typing import Any, List, Union
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, true
+
+# Normalised sale columns by kind, filters may target any of them
+NUMERIC_COLUMNS = ('price', 'manufacturing_year')
+DATE_COLUMNS = ('date_of_sale',)
+STRING_COLUMNS = ('sale_id', 'company', 'car_model', 'sales_location')
+
+# Short and source spellings accepted for column names in filters
+COLUMN_ALIASES = {
+    'saleid': 'sale_id',
+    'model': 'car_model',
+    'year': 'manufacturing_year',
+    'manufacturingyear': 'manufacturing_year',
+    'location': 'sales_location',
+    'saleslocation': 'sales_location',
+    'date': 'date_of_sale',
+    'saledate': 'date_of_sale',
+    'dateofsale': 'date_of_sale'
+}
+
+OPERATORS = (
+    'eq', 'ne', 'in', 'not_in', 'gt', 'gte', 'lt', 'lte',
+    'between', 'prefix', 'regex', 'is_null', 'not_null'
+)
+
+# Operators of the text filter format
+TEXT_OPERATORS = {
+    'not in': 'not_in', 'in': 'in', '>=': 'gte', '<=': 'lte', '!=': 'ne',
+    '^=': 'prefix', '=': 'eq', '>': 'gt', '<': 'lt', '~': 'regex'
+}
+TEXT_CONDITION = re.compile(
+    r"^\s*(?P<column>[A-Za-z_][A-Za-z_ ]*?)\s*"
+    r"(?P<op>not\s+in\b|in\b|>=|<=|!=|\^=|=|>|<|~)\s*(?P<value>.*?)\s*$",
+    re.IGNORECASE
+)
+TEXT_RANGE = re.compile(r"(>=|<=|>|<)\s*([^<>]+)")
+
+
+class FilterError(ValueError):
+    """A filter expression could not be parsed or does not fit its column"""
+
+
+def normalise_column(name: str) -> str:
+    column = name.strip().lower().replace(' ', '_')
+    column = COLUMN_ALIASES.get(column, COLUMN_ALIASES.get(column.replace('_', ''), column))
+    if column not in NUMERIC_COLUMNS + DATE_COLUMNS + STRING_COLUMNS:
+        raise FilterError(f"Unknown filter column '{name}'")
+    return column
+
+
+def _coerce(column: str, value: Any) -> Any:
+    """Convert a filter value to the type of its column"""
+    try:
+        if column in NUMERIC_COLUMNS:
+            return float(value)
+        if column in DATE_COLUMNS:
+            return value if isinstance(value, date) else date.fromisoformat(str(value).strip())
+        return str(value).strip()
+    except (TypeError, ValueError):
+        raise FilterError(f"Invalid value {value!r} for filter column '{column}'")
+
+
+class Condition:
+    """One column predicate, with its value already coerced to the column type"""
+
+    def __init__(self, column: str, op: str, value: Any = None):
+        if op not in OPERATORS:
+            raise FilterError(f"Unknown filter operator '{op}', expected one of {', '.join(OPERATORS)}")
+        self.column = normalise_column(column)
+        self.op = op
+
+        if op in ('gt', 'gte', 'lt', 'lte', 'between') and self.column in STRING_COLUMNS:
+            raise FilterError(f"Filter '{op}' needs a numeric or date column, got '{self.column}'")
+
+        if op in ('is_null', 'not_null'):
+            self.value = None
+        elif op in ('in', 'not_in'):
+            values = value if isinstance(value, (list, tuple)) else [value]
+            self.value = [_coerce(self.column, v) for v in values]
+        elif op == 'between':
+            if not isinstance(value, (list, tuple)) or len(value) != 2:
+                raise FilterError(f"Filter 'between' on '{column}' needs [min, max]")
+            self.value = [_coerce(self.column, v) for v in value]
+        elif op in ('prefix', 'regex'):
+            if self.column not in STRING_COLUMNS:
+                raise FilterError(f"Filter '{op}' needs a text column, got '{self.column}'")
+            self.value = str(value)
+            if op == 'regex':
+                try:
+                    re.compile(self.value)
+                except re.error as e:
+                    raise FilterError(f"Invalid regex {self.value!r}: {e}")
+        else:
+            self.value = _coerce(self.column, value)
+
+    def __repr__(self) -> str:
+        return f"Condition({self.column!r}, {self.op!r}, {self.value!r})"
+
+    @property
+    def cost(self) -> int:
+        """Rough relative cost per row, cheaper conditions are evaluated first"""
+        if self.column not in STRING_COLUMNS or self.op in ('is_null', 'not_null'):
+            return 0
+        return 2 if self.op in ('prefix', 'regex') else 1
+
+    def _values(self, series: pd.Series) -> np.ndarray:
+        """Column values as a NumPy array comparable with the condition value"""
+        if self.column in NUMERIC_COLUMNS:
+            if not pd.api.types.is_numeric_dtype(series.dtype):
+                series = pd.to_numeric(series, errors='coerce')
+            if series.dtype == np.float32:
+                # Compact prices are compared at the cent amounts they were read as
+                return series.to_numpy(dtype='float64').round(2)
+            if isinstance(series.dtype, np.dtype):
+                return series.to_numpy()
+            return series.to_numpy(dtype='float64', na_value=np.nan)
+        if not pd.api.types.is_datetime64_dtype(series.dtype):
+            series = pd.to_datetime(series, errors='coerce')
+        return series.to_numpy(dtype='datetime64[ns]')
+
+    def _bound(self, value: Any) -> Any:
+        return np.datetime64(value, 'ns') if self.column in DATE_COLUMNS else value
+
+    def evaluate(self, series: pd.Series) -> np.ndarray:
+        """Boolean mask of the values in series matching this condition, missing values never match"""
+        if self.op in ('is_null', 'not_null'):
+            isna = series.isna().to_numpy()
+            return isna if self.op == 'is_null' else ~isna
+
+        if self.column in STRING_COLUMNS:
+            return _string_mask(
+                _as_text(series), self._string_predicate,
+                negated=self.op in ('ne', 'not_in'), per_value=self.op in ('prefix', 'regex')
+            )
+
+        values = self._values(series)
+        if self.op in ('in', 'not_in'):
+            matches = np.isin(values, [self._bound(v) for v in self.value])
+            return matches if self.op == 'in' else ~matches & ~pd.isna(values)
+        if self.op == 'between':
+            low, high = (self._bound(v) for v in self.value)
+            matches = values >= low
+            matches &= values <= high
+            return matches
+        bound = self._bound(self.value)
+        if self.op == 'ne':
+            return (values != bound) & ~pd.isna(values)
+        return {
+            'eq': np.equal, 'gt': np.greater, 'gte': np.greater_equal,
+            'lt': np.less, 'lte': np.less_equal
+        }[self.op](values, bound)
+
+    def _string_predicate(self, series: pd.Series) -> np.ndarray:
+        if self.op == 'eq':
+            return (series == self.value).to_numpy(dtype=bool, na_value=False)
+        if self.op == 'ne':
+            return (series != self.value).to_numpy(dtype=bool, na_value=False)
+        if self.op in ('in', 'not_in'):
+            matches = series.isin(self.value).to_numpy(dtype=bool, na_value=False)
+            return matches if self.op == 'in' else ~matches
+        if self.op == 'prefix':
+            return series.str.startswith(self.value, na=False).to_numpy(dtype=bool, na_value=False)
+        return series.str.contains(self.value, regex=True, na=False).to_numpy(dtype=bool, na_value=False)
+
+    def clause(self, columns):
+        """SQL expression for this condition over columns, a model or table column collection"""
+        column = getattr(columns, self.column)
+        if self.op == 'is_null':
+            return column.is_(None)
+        if self.op == 'not_null':
+            return column.isnot(None)
+        if self.op == 'in':
+            return column.in_(self.value)
+        if self.op == 'not_in':
+            return and_(column.isnot(None), column.notin_(self.value))
+        if self.op == 'between':
+            return column.between(*self.value)
+        if self.op == 'prefix':
+            return column.startswith(self.value, autoescape=True)
+        if self.op == 'regex':
+            return column.regexp_match(self.value)
+        return {
+            'eq': column.__eq__, 'ne': column.__ne__, 'gt': column.__gt__,
+            'gte': column.__ge__, 'lt': column.__lt__, 'lte': column.__le__
+        }[self.op](self.value)
+
+
+def _as_text(series: pd.Series) -> pd.Series:
+    """A text column's values as str, as SQLite stores them.
+
+    Numeric sale IDs and model names such as 3 or 6 are read as numbers, so they
+    are converted, once per category for categorical columns.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        if pd.api.types.infer_dtype(categories, skipna=True) in ('string', 'empty'):
+            return series
+        # Distinct categories may share a text form, e.g. 3 and '3'
+        labels, uniques = pd.factorize(categories.astype(str))
+        codes = series.cat.codes.to_numpy()
+        return pd.Series(
+            pd.Categorical.from_codes(np.where(codes >= 0, labels[codes], -1), uniques), index=series.index
+        )
+    if pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+        return series
+    return series.map(str, na_action='ignore')
+
+
+def _string_mask(series: pd.Series, predicate, negated: bool, per_value: bool) -> np.ndarray:
+    """Evaluate a string predicate, once per distinct value for categorical columns.
+
+    Object columns are factorised first when per_value is set, which pays off for
+    per-element Python predicates such as prefix and regex on repetitive columns.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        matches = predicate(pd.Series(series.cat.categories))
+        codes = series.cat.codes.to_numpy()
+        return np.where(codes >= 0, matches[codes], False)
+    if per_value:
+        codes, uniques = pd.factorize(series)
+        matches = predicate(pd.Series(uniques, dtype=object))
+        return np.where(codes >= 0, matches[codes], False)
+    mask = predicate(series)
+    if negated:
+        # Negated comparisons must not match missing values either
+        mask &= series.notna().to_numpy()
+    return mask
+
+
+class CompiledFilter:
+    """A conjunction of conditions, evaluated as one mask or one SQL WHERE clause"""
+
+    def __init__(self, conditions: List[Condition]):
+        # Cheap numeric and date conditions first, so string conditions see fewer rows
+        self.conditions = sorted(conditions, key=lambda condition: condition.cost)
+
+    def __bool__(self) -> bool:
+        return bool(self.conditions)
+
+    def __repr__(self) -> str:
+        return f"CompiledFilter({self.conditions!r})"
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        """Boolean mask of the rows matching every condition.
+
+        Each condition after the first is evaluated only on the rows still
+        selected, taking just its own column, so the frame is never copied.
+        """
+        selected = None  # Positions of rows matching the conditions so far
+        for condition in self.conditions:
+            series = df[condition.column]
+            if selected is None:
+                selected = np.flatnonzero(condition.evaluate(series))
+            else:
+                selected = selected[condition.evaluate(series.take(selected))]
+            if not len(selected):
+                break
+
+        mask = np.zeros(len(df), dtype=bool)
+        mask[selected] = True
+        return mask
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Rows of df matching every condition, df itself when nothing is filtered out"""
+        if not self.conditions:
+            return df
+        mask = self.mask(df)
+        return df if mask.all() else df[mask]
+
+    def where(self, columns):
+        """WHERE clause for the conditions, e.g. query.where(source_filter.where(Sale))"""
+        if not self.conditions:
+            return true()
+        return and_(*(condition.clause(columns) for condition in self.conditions))
+
+
+def _split_unquoted(text: str, separator: str) -> List[str]:
+    """Split text on separator wherever it is outside double quotes, keeping the quotes"""
+    parts, start, quoted = [], 0, False
+    for pos, char in enumerate(text):
+        if char == '"':
+            quoted = not quoted
+        elif char == separator and not quoted:
+            parts.append(text[start:pos])
+            start = pos + 1
+    if quoted:
+        raise FilterError(f"Unterminated quote in filter '{text.strip()}'")
+    parts.append(text[start:])
+    return parts
+
+
+def _unquote(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def parse_text(text: str) -> List[Condition]:
+    """Parse the text filter format, e.g. 'price > 1000 < 5000, company in Toyota|Honda'.
+
+    Values containing a comma or | are double-quoted, e.g. 'location in "Austin, TX"|Dallas'.
+    """
+    conditions = []
+    for part in _split_unquoted(text, ','):
+        if not part.strip():
+            continue
+        match = TEXT_CONDITION.match(part)
+        if not match:
+            raise FilterError(f"Invalid filter '{part.strip()}'")
+        column, value = match.group('column'), match.group('value')
+        symbol = ' '.join(match.group('op').lower().split())
+
+        if symbol in ('>', '<', '>=', '<='):
+            # Chained bounds such as 'price > 1000 < 5000'
+            bounds = symbol + value
+            ranges = TEXT_RANGE.findall(bounds)
+            if ''.join(op + bound for op, bound in ranges).replace(' ', '') != bounds.replace(' ', ''):
+                raise FilterError(f"Invalid range filter '{part.strip()}'")
+            for op, bound in ranges:
+                conditions.append(Condition(column, TEXT_OPERATORS[op], _unquote(bound)))
+        elif symbol in ('in', 'not in'):
+            values = [_unquote(v) for v in _split_unquoted(value, '|') if v.strip()]
+            conditions.append(Condition(column, TEXT_OPERATORS[symbol], values))
+        else:
+            conditions.append(Condition(column, TEXT_OPERATORS[symbol], _unquote(value)))
+    return conditions
+
+
+def _legacy_conditions(filters: dict) -> List[Condition]:
+    """Conditions for the original priceRange/yearRange/model/company/location keys.
+
+    A range may leave out its min or max, which then does not bound it.
+    """
+    conditions = []
+    for key, column in (('priceRange', 'price'), ('yearRange', 'manufacturing_year')):
+        if filters.get(key):
+            if not isinstance(filters[key], dict):
+                raise FilterError(f"Filter '{key}' needs an object with min and/or max")
+            for bound, op in (('min', 'gte'), ('max', 'lte')):
+                if filters[key].get(bound) is not None:
+                    conditions.append(Condition(column, op, filters[key][bound]))
+    for key, column in (('model', 'car_model'), ('company', 'company'), ('location', 'sales_location')):
+        if filters.get(key):
+            conditions.append(Condition(column, 'eq', filters[key]))
+    return conditions
+
+
+def compile_filters(spec: Union[None, str, list, dict, CompiledFilter]) -> CompiledFilter:
+    """Compile a filter spec into a CompiledFilter.
+
+    Accepts the text format, a list of {"column", "op", "value"} conditions,
+    {"conditions": [...]}, or the original priceRange/yearRange/model/company/location dict.
+    """
+    if isinstance(spec, CompiledFilter):
+        return spec
+    if not spec:
+        return CompiledFilter([])
+    if isinstance(spec, str):
+        return CompiledFilter(parse_text(spec))
+    if isinstance(spec, dict):
+        if 'conditions' not in spec:
+            return CompiledFilter(_legacy_conditions(spec))
+        spec = spec['conditions']
+    if not isinstance(spec, list):
+        raise FilterError("Filters must be text, a list of conditions or an object")
+
+    conditions = []
+    for item in spec:
+        if not isinstance(item, dict) or 'column' not in item or 'op' not in item:
+            raise FilterError(f"Invalid filter condition {item!r}")
+        conditions.append(Condition(item['column'], item['op'], item.get('value')))
+    return CompiledFilter(conditions)
@@ -0,0 +1,471 @@
+import logging
+import os
+import shutil
+import time
+from typing import BinaryIO, Callable, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from sqlalchemy import Table, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import config, metrics
+from app.models import Sale
+from app.services import catalog, readers, rollups, sketches, source_cache
+from app.services.filters import FilterError, compile_filters
+from app.services.sources import content_hash, ingested_hashes, record_sources
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_POLICIES = ('skip', 'upsert', 'error')
+
+
+class SourceError(Exception):
+    """A source could not be parsed, normalised or filtered"""
+
+    def __init__(self, name: str, source_type: str, message: str):
+        super().__init__(message)
+        self.name = name
+        self.source_type = source_type
+
+
+class DuplicateSaleError(Exception):
+    """A sale_id already in the task, or repeated within a source, under the 'error' duplicate policy"""
+
+    def __init__(self, task_name: str, sale_id: str):
+        super().__init__(f"Duplicate sale_id '{sale_id}' in task {task_name}")
+        self.task_name = task_name
+        self.sale_id = sale_id
+
+SALE_COLUMNS = [
+    'sale_id', 'company', 'car_model', 'manufacturing_year',
+    'price', 'sales_location', 'date_of_sale'
+]
+
+# Text columns with few distinct values, held as categories after normalisation
+CATEGORY_COLUMNS = ('company', 'car_model', 'sales_location')
+
+
+def _compact_integers(values: pd.Series) -> pd.Series:
+    """Whole numbers in the smallest nullable integer type that holds them, others unchanged"""
+    present = values.dropna()
+    if not present.empty and not (present == present.round()).all():
+        return values
+    low, high = (present.min(), present.max()) if not present.empty else (0, 0)
+    for dtype in ('Int16', 'Int32', 'Int64'):
+        info = np.iinfo(dtype.lower())
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+def _compact_prices(values: pd.Series) -> pd.Series:
+    """Prices as float32 when every value is a whole number of cents that survives the round trip"""
+    as_float32 = values.astype('float32')
+    if np.array_equal(exact_prices(as_float32), values.to_numpy(dtype='float64'), equal_nan=True):
+        return as_float32
+    return values.astype('float64')
+
+
+def exact_prices(values: pd.Series) -> np.ndarray:
+    """Prices as float64, float32 values restored to the cent amount they were read as"""
+    prices = values.to_numpy(dtype='float64', na_value=np.nan)
+    return prices.round(2) if values.dtype == np.float32 else prices
+
+
+def process_data_source(source_data: pd.DataFrame, source_type: str) -> pd.DataFrame:
+    """Process data based on source type and return standardized DataFrame"""
+    try:
+        # Standardize column names
+        source_data.columns = source_data.columns.str.lower().str.replace(' ', '_')
+        
+        # Map common field variations
+        field_mapping = {
+            'saleid': 'sale_id',
+            'manufacturingyear': 'manufacturing_year',
+            'saleslocation': 'sales_location',
+            'dateofsale': 'date_of_sale',
+            'saledate': 'date_of_sale',
+            'date': 'date_of_sale'
+        }
+        
+        # Rename columns based on mapping
+        source_data = source_data.rename(columns=field_mapping)
+        
+        # Ensure required columns exist
+        required_columns = [
+            'sale_id', 'company', 'car_model', 'manufacturing_year',
+            'price', 'sales_location', 'date_of_sale'
+        ]
+        
+        # Add missing columns with default values
+        for col in required_columns:
+            if col not in source_data.columns:
+                if col == 'date_of_sale':
+                    source_data[col] = pd.Timestamp.now().normalize()  # Default to current date
+                else:
+                    source_data[col] = None
+        
+        # Compact dtypes: repeated text as categories, smallest integer years, exact
+        # float32 prices where they fit and datetime64 dates
+        for col in CATEGORY_COLUMNS:
+            source_data[col] = source_data[col].astype('category')
+        source_data['manufacturing_year'] = _compact_integers(
+            pd.to_numeric(source_data['manufacturing_year'], errors='coerce')
+        )
+        source_data['price'] = _compact_prices(pd.to_numeric(source_data['price'], errors='coerce'))
+        
+        # Convert date column, keeping the local calendar date of timezone-aware values
+        dates = pd.to_datetime(source_data['date_of_sale'], errors='coerce')
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        source_data['date_of_sale'] = dates.dt.normalize()
+        
+        return source_data
+        
+    except Exception as e:
+        logger.error(f"Error processing data source: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Error processing data source: {str(e)}")
+
+def normalise_chunk(chunk: pd.DataFrame, source_type: str) -> pd.DataFrame:
+    """process_data_source for one parsed chunk, counting its rows and timing it"""
+    metrics.INGEST_ROWS_PARSED.inc(len(chunk))
+    with metrics.INGEST_STAGE_SECONDS.time(stage='normalise'):
+        return process_data_source(chunk, source_type)
+
+
+def filter_chunk(source_filter, df: pd.DataFrame) -> pd.DataFrame:
+    """Apply a compiled source filter to a chunk, counting the rows it removes and timing it"""
+    with metrics.INGEST_STAGE_SECONDS.time(stage='filter'):
+        filtered = source_filter.apply(df)
+    metrics.INGEST_ROWS_FILTERED.inc(len(df) - len(filtered))
+    return filtered
+
+
+def apply_filters(df: pd.DataFrame, filters) -> pd.DataFrame:
+    """Apply a filter spec to DataFrame, see filters.compile_filters for the accepted forms"""
+    logger.debug(f"filters: {filters}")
+    try:
+        return compile_filters(filters).apply(df)
+        
+    except FilterError as e:
+        logger.error(f"Error applying filters: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Error applying filters: {str(e)}")
+
+
+def validate_duplicate_policy(policy: str) -> None:
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(
+            f"Invalid duplicate policy '{policy}', expected one of {', '.join(DUPLICATE_POLICIES)}"
+        )
+
+
+def _insert_statement(policy: str, table: Table = None):
+    """Build the INSERT statement for the given duplicate policy, into the sales table by default"""
+    stmt = insert(Sale.__table__ if table is None else table)
+    key = ['task_name', 'sale_id']
+
+    if policy == 'skip':
+        return stmt.on_conflict_do_nothing(index_elements=key)
+    if policy == 'upsert':
+        return stmt.on_conflict_do_update(
+            index_elements=key,
+            set_={col: stmt.excluded[col] for col in SALE_COLUMNS if col != 'sale_id'}
+        )
+    return stmt
+
+
+def _to_records(task_name: str, batch: pd.DataFrame) -> list:
+    """Convert a DataFrame batch to insert parameters, mapping NaN/NaT to None"""
+    batch = batch.reindex(columns=SALE_COLUMNS)
+    # Column-wise tolist/zip is much cheaper than DataFrame.to_dict('records')
+    values = []
+    for col in SALE_COLUMNS:
+        column = batch[col]
+        if col == 'price':
+            column = pd.Series(exact_prices(column), index=column.index)
+        elif pd.api.types.is_datetime64_any_dtype(column.dtype):
+            column = column.dt.date
+        values.append(column.astype(object).where(column.notna(), None).tolist())
+    keys = ['task_name'] + SALE_COLUMNS
+    return [dict(zip(keys, (task_name,) + row)) for row in zip(*values)]
+
+
+def _insert_or_report_duplicate(db: Session, stmt, task_name: str, records: list, table: Table = None):
+    """Insert a batch under the 'error' policy, raising DuplicateSaleError with the first conflicting sale_id.
+
+    The batch runs in a savepoint, so a conflict leaves none of its rows behind.
+    """
+    try:
+        with db.begin_nested():
+            return db.execute(stmt, records)
+    except IntegrityError:
+        table = Sale.__table__ if table is None else table
+        sale_ids = [record['sale_id'] for record in records]
+        existing = set()
+        for offset in range(0, len(sale_ids), 500):
+            existing.update(db.scalars(select(table.c.sale_id).where(
+                table.c.task_name == task_name, table.c.sale_id.in_(sale_ids[offset:offset + 500])
+            )))
+        seen = set()
+        for sale_id in sale_ids:
+            if sale_id in existing or sale_id in seen:
+                raise DuplicateSaleError(task_name, sale_id)
+            seen.add(sale_id)
+        raise
+
+
+def bulk_insert_sales(
+    db: Session,
+    task_name: str,
+    df: pd.DataFrame,
+    batch_size: int = None,
+    on_duplicate: str = None,
+    table: Table = None
+) -> dict:
+    """Insert a DataFrame of normalised sales in batches using executemany.
+
+    Rows go to table, a table shaped like sales, when given. The caller owns
+    the transaction; nothing is committed here. Returns ingest statistics
+    including rows/sec.
+    """
+    batch_size = batch_size or config.BULK_INSERT_BATCH_SIZE
+    on_duplicate = on_duplicate or config.DUPLICATE_POLICY
+    validate_duplicate_policy(on_duplicate)
+    if batch_size < 1:
+        raise ValueError("Batch size must be a positive integer")
+
+    stmt = _insert_statement(on_duplicate, table)
+    start_time = time.perf_counter()
+    rows_written = 0
+
+    for offset in range(0, len(df), batch_size):
+        records = _to_records(task_name, df.iloc[offset:offset + batch_size])
+        if on_duplicate == 'error':
+            result = _insert_or_report_duplicate(db, stmt, task_name, records, table)
+        else:
+            result = db.execute(stmt, records)
+        # sqlite3 reports the rows actually changed, so skipped duplicates are not counted
+        rows_written += result.rowcount if result.rowcount >= 0 else len(records)
+
+    elapsed = time.perf_counter() - start_time
+    metrics.INGEST_STAGE_SECONDS.observe(elapsed, stage='insert')
+    metrics.INGEST_ROWS_WRITTEN.inc(rows_written)
+    stats = {
+        'rows_received': len(df),
+        'rows_written': rows_written,
+        'rows_skipped': len(df) - rows_written,
+        'batch_size': batch_size,
+        'on_duplicate': on_duplicate,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(len(df) / elapsed, 1) if elapsed > 0 else None
+    }
+    logger.debug(
+        f"Bulk insert for task {task_name}: {stats['rows_written']} written, "
+        f"{stats['rows_skipped']} skipped in {stats['seconds']}s "
+        f"({stats['rows_per_sec']} rows/sec)"
+    )
+    return stats
+
+
+def merge_stats(total: dict, stats: dict) -> dict:
+    """Accumulate bulk insert statistics across chunks and sources"""
+    merged = dict(total) if total else {
+        'rows_received': 0,
+        'rows_written': 0,
+        'rows_skipped': 0,
+        'batch_size': stats['batch_size'],
+        'on_duplicate': stats['on_duplicate'],
+        'seconds': 0.0
+    }
+    for key in ('rows_received', 'rows_written', 'rows_skipped'):
+        merged[key] += stats[key]
+    merged['seconds'] = round(merged['seconds'] + stats['seconds'], 3)
+    merged['rows_per_sec'] = (
+        round(merged['rows_received'] / merged['seconds'], 1) if merged['seconds'] > 0 else None
+    )
+    return merged
+
+
+def skipped_source_metadata(name: str, source_type: str, digest: str) -> dict:
+    """Metadata of a source left out because its content was already ingested"""
+    return {
+        'name': name,
+        'type': source_type,
+        'records': 0,
+        'columns': [],
+        'memory_bytes': 0,
+        'ingest': None,
+        'content_hash': digest,
+        'skipped': True
+    }
+
+
+def finish_task_write(db: Session, task_name: str, source_metadata: List[dict]) -> None:
+    """Rebuild a task's rollups and sketches and bump its data version after sources were written to it"""
+    # Maintained in the same transaction as its sales
+    with metrics.INGEST_STAGE_SECONDS.time(stage='rollups'):
+        rollups.refresh_task_rollups(db, task_name)
+    with metrics.INGEST_STAGE_SECONDS.time(stage='sketches'):
+        sketches.refresh_task_sketches(db, task_name)
+    catalog.bump_task_version(db, task_name)
+    record_sources(db, task_name, source_metadata)
+
+
+def ingest_source(
+    db: Session,
+    task_name: str,
+    name: str,
+    source_type: str,
+    chunks: Iterable[pd.DataFrame],
+    filters=None,
+    batch_size: int = None,
+    on_duplicate: str = None,
+    on_chunk: Callable[[int], None] = None,
+    table: Table = None,
+    cache_key: str = None
+) -> dict:
+    """Normalise, filter and bulk-write a source one chunk at a time.
+
+    Peak memory is bounded by the chunk size rather than the source size.
+    With a cache_key, normalised chunks are kept in the source cache, or read
+    back from it without touching chunks when the key is already cached.
+    The caller owns the transaction. Returns the source metadata with its
+    insert statistics under 'ingest'.
+    """
+    metadata = {
+        'name': name,
+        'type': source_type,
+        'records': 0,
+        'columns': [],
+        'memory_bytes': 0,
+        'ingest': None
+    }
+
+    # Compile once, every chunk is then filtered with a single vectorised mask
+    source_filter = compile_filters(filters)
+
+    entry = source_cache.lookup(cache_key) if cache_key else None
+    if entry:
+        metadata['columns'] = entry['columns']
+        metadata['memory_bytes'] = entry['memory_bytes']
+        frames = metrics.timed(source_cache.iter_entry(entry), 'cache_read')
+    else:
+        frames = (normalise_chunk(chunk, source_type) for chunk in metrics.timed(chunks, 'parse'))
+    staging = source_cache.staging_dir() if cache_key and not entry else None
+    parts = []
+
+    try:
+        for processed_df in frames:
+            if not entry:
+                # Footprint of the normalised source, as if every chunk were held at once
+                metadata['memory_bytes'] += int(processed_df.memory_usage(deep=True).sum())
+                metadata['columns'] = metadata['columns'] or list(processed_df.columns)
+            if staging:
+                # Cached before filtering, so other filters can reuse the entry
+                parts.append(os.path.join(staging, f"{len(parts)}.arrow"))
+                with metrics.INGEST_STAGE_SECONDS.time(stage='cache_write'):
+                    source_cache.write_part(processed_df[SALE_COLUMNS], parts[-1])
+            if source_filter:
+                processed_df = filter_chunk(source_filter, processed_df)
+
+            metadata['records'] += len(processed_df)
+
+            stats = bulk_insert_sales(db, task_name, processed_df, batch_size, on_duplicate, table)
+            metadata['ingest'] = merge_stats(metadata['ingest'], stats)
+            if on_chunk:
+                on_chunk(stats['rows_written'])
+
+        if staging:
+            source_cache.store(cache_key, parts, metadata['columns'], metadata['memory_bytes'])
+    finally:
+        if staging:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    logger.info(
+        f"Ingested {metadata['records']} records from {source_type} source {name} "
+        f"into task {task_name}{' from the source cache' if entry else ''}"
+    )
+    return metadata
+
+
+def ingest_sources(
+    db: Session,
+    task_name: str,
+    sources: List[Tuple[str, str, BinaryIO]],
+    source_filters: dict = None,
+    chunk_size: int = None,
+    batch_size: int = None,
+    on_duplicate: str = None,
+    on_chunk: Callable[[int], None] = None,
+    target: Table = None,
+    skip_ingested: bool = False
+) -> dict:
+    """Ingest (name, type, file) sources in order within the caller's transaction.
+
+    The task's rollups, data version and source ledger are updated before returning,
+    unless rows are staged into a target table, which leaves that to the caller.
+    With skip_ingested, sources whose content was already ingested into the task are
+    skipped. With SOURCE_CACHE set, sources whose content was seen before, in any
+    task, are read from the source cache instead of being parsed again.
+    Filters are looked up by the source's position. With INGEST_WORKERS set,
+    sources are parsed in worker processes, see parallel.ingest_sources. Raises
+    SourceError when a source cannot be parsed and DuplicateSaleError on a duplicate
+    under the 'error' policy; database errors propagate unchanged.
+    """
+    if config.INGEST_WORKERS > 0:
+        # Imported here, the parallel path builds on this module
+        from app.services import parallel
+        return parallel.ingest_sources(
+            db, task_name, sources, source_filters, chunk_size, batch_size, on_duplicate, on_chunk,
+            target, skip_ingested
+        )
+
+    source_filters = source_filters or {}
+    source_metadata = []
+    ingest_stats = None
+    seen = ingested_hashes(db, task_name) if skip_ingested else set()
+
+    for idx, (name, source_type, fileobj) in enumerate(sources):
+        try:
+            digest = content_hash(fileobj)
+            if digest in seen:
+                source_metadata.append(skipped_source_metadata(name, source_type, digest))
+                continue
+            # URL downloads carry their response's content type
+            content_type = getattr(fileobj, 'content_type', None)
+            chunks = readers.iter_source_chunks(fileobj, name, chunk_size, content_type)
+            metadata = ingest_source(
+                db, task_name, name, source_type, chunks,
+                filters=source_filters.get(str(idx), {}),
+                batch_size=batch_size,
+                on_duplicate=on_duplicate,
+                on_chunk=on_chunk,
+                table=target,
+                cache_key=source_cache.cache_key(digest, name, content_type) if source_cache.enabled() else None
+            )
+        except (SQLAlchemyError, DuplicateSaleError):
+            raise
+        except HTTPException as e:
+            raise SourceError(name, source_type, e.detail)
+        except Exception as e:
+            raise SourceError(name, source_type, str(e))
+
+        metadata['content_hash'] = digest
+        if skip_ingested:
+            seen.add(digest)
+        source_metadata.append(metadata)
+        if metadata['ingest']:
+            ingest_stats = merge_stats(ingest_stats, metadata['ingest'])
+
+    if target is None:
+        finish_task_write(db, task_name, source_metadata)
+
+    return {
+        'source_metadata': source_metadata,
+        'total_records': sum(metadata['records'] for metadata in source_metadata),
+        'ingest': ingest_stats
+    }
@@ -0,0 +1,299 @@
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import config, partitions
+from app.database import SessionLocal
+from app.models import IngestJob
+from app.services import cache, fetch, ingest, retention, snapshots
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+# Rows ingested so far by running jobs; the ingest transaction holds the SQLite
+# write lock, so live progress is kept in memory and persisted on completion.
+_progress = {}
+_progress_lock = threading.Lock()
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Recorded on the jobs this process claims
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _job_dir(job_id: str) -> str:
+    return os.path.join(config.JOB_SPOOL_DIR, job_id)
+
+
+def _lease_path(job_id: str) -> str:
+    return os.path.join(_job_dir(job_id), 'lease')
+
+
+def _renew_lease(job_id: str, stop: threading.Event) -> None:
+    """Touch a running job's lease file until stopped.
+
+    The lease lives beside the job's spooled sources rather than in its row, which
+    cannot be updated while the job's own ingest transaction holds the write lock.
+    """
+    path = _lease_path(job_id)
+    while True:
+        try:
+            with open(path, 'a'):
+                pass
+            os.utime(path)
+        except OSError as e:
+            logger.warning(f"Could not renew the lease of report job {job_id}: {str(e)}")
+        if stop.wait(config.JOB_HEARTBEAT_SECONDS):
+            return
+
+
+def _lease_expired(job_id: str, started_at: Optional[datetime], now: datetime) -> bool:
+    """Whether a running job has gone a lease period without a heartbeat, counting its claim as one"""
+    renewed = [started_at] if started_at else []
+    try:
+        renewed.append(datetime.utcfromtimestamp(os.path.getmtime(_lease_path(job_id))))
+    except OSError:
+        pass
+    return not renewed or (now - max(renewed)).total_seconds() > config.JOB_LEASE_SECONDS
+
+
+def _add_progress(job_id: str, rows: int) -> None:
+    with _progress_lock:
+        _progress[job_id] = _progress.get(job_id, 0) + rows
+
+
+def create_job(
+    db: Session,
+    task_name: str,
+    task_description: str,
+    uploads: List[Tuple[str, BinaryIO]],
+    source_urls: List[str],
+    options: dict
+) -> str:
+    """Spool uploaded sources to disk and record a queued job, returning its id"""
+    active = db.query(IngestJob).filter(IngestJob.status.in_(ACTIVE_STATUSES)).count()
+    if active >= config.JOB_WORKERS + config.JOB_MAX_QUEUED:
+        raise QueueFullError("Too many report jobs queued, try again later")
+
+    job_id = uuid.uuid4().hex
+    directory = _job_dir(job_id)
+    os.makedirs(directory, exist_ok=True)
+
+    sources = []
+    try:
+        for idx, (name, fileobj) in enumerate(uploads):
+            path = os.path.join(directory, f"{idx}.upload")
+            with open(path, 'wb') as out:
+                shutil.copyfileobj(fileobj, out)
+            sources.append({'name': name, 'type': 'file', 'path': path})
+        for url in source_urls:
+            sources.append({'name': url, 'type': 'url', 'url': url})
+
+        job = IngestJob(
+            id=job_id,
+            task_name=task_name,
+            task_description=task_description,
+            status='queued',
+            sources=sources,
+            options=options
+        )
+        db.add(job)
+        db.commit()
+    except Exception:
+        db.rollback()
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+    logger.info(f"Queued report job {job_id} for task {task_name} with {len(sources)} sources")
+    return job_id
+
+
+def _process(db: Session, job: IngestJob) -> dict:
+    """Fetch and ingest a job's sources within the session's transaction"""
+    options = job.options
+    urls = [source['url'] for source in job.sources if source['type'] == 'url']
+    downloads = asyncio.run(fetch.fetch_sources(urls)) if urls else []
+
+    opened = []
+    try:
+        downloads_iter = iter(downloads)
+        for source in job.sources:
+            if source['type'] == 'file':
+                fileobj = open(source['path'], 'rb')
+            else:
+                fileobj = next(downloads_iter)
+            opened.append((source['name'], source['type'], fileobj))
+
+        return ingest.ingest_sources(
+            db, job.task_name, opened,
+            source_filters=options.get('source_filters'),
+            chunk_size=options.get('chunk_size'),
+            batch_size=options.get('batch_size'),
+            on_duplicate=options.get('on_duplicate'),
+            on_chunk=lambda rows: _add_progress(job.id, rows)
+        )
+    finally:
+        for _, _, fileobj in opened:
+            fileobj.close()
+        for download in downloads:
+            download.close()
+
+
+def run_job(job_id: str) -> None:
+    """Claim a queued job and run it to completion or failure"""
+    db = SessionLocal()
+    claimed = 0
+    heartbeat = None
+    stop = threading.Event()
+    try:
+        # Claim atomically so a job is never processed twice
+        claimed = db.query(IngestJob).filter(
+            IngestJob.id == job_id, IngestJob.status == 'queued'
+        ).update(
+            {'status': 'running', 'started_at': datetime.utcnow(), 'worker_id': WORKER_ID},
+            synchronize_session=False
+        )
+        db.commit()
+        if not claimed:
+            return
+        heartbeat = threading.Thread(target=_renew_lease, args=(job_id, stop), daemon=True)
+        heartbeat.start()
+
+        # The job row is shared, so it is updated through the partition session too
+        task_name = db.get(IngestJob, job_id).task_name
+        db.close()
+        db = partitions.open_session(task_name, write=True, create=True)
+        job = db.get(IngestJob, job_id)
+        with _progress_lock:
+            _progress[job_id] = 0
+
+        try:
+            result = _process(db, job)
+            db.commit()
+            cache.invalidate_task(task_name)
+            snapshots.refresh_snapshot(task_name)
+        except Exception as e:
+            db.rollback()
+            if db.info['created']:
+                partitions.drop(task_name)
+            if isinstance(e, ingest.SourceError):
+                kind = 'URL' if e.source_type == 'url' else 'source'
+                error = f"Error processing {kind} {e.name}: {str(e)}"
+            elif isinstance(e, fetch.FetchError):
+                error = f"Error processing URL {e.url}: {str(e)}"
+            else:
+                error = str(e)
+            logger.error(f"Report job {job_id} failed: {error}")
+
+            job = db.get(IngestJob, job_id)
+            job.status = 'failed'
+            job.error = error
+            job.rows_ingested = 0
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            return
+
+        job.status = 'completed'
+        job.rows_ingested = result['ingest']['rows_written'] if result['ingest'] else 0
+        job.source_metadata = result['source_metadata']
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        logger.info(f"Report job {job_id} completed with {job.rows_ingested} rows")
+        db.close()
+        retention.enforce(task_name)
+
+    except Exception as e:
+        logger.error(f"Error running report job {job_id}: {str(e)}")
+    finally:
+        with _progress_lock:
+            _progress.pop(job_id, None)
+        db.close()
+        if heartbeat:
+            stop.set()
+            heartbeat.join()
+        if claimed:
+            shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+
+
+def submit(job_id: str) -> None:
+    if _executor is None:
+        # Workers not started yet, the job is picked up by start()
+        logger.warning(f"Report job {job_id} queued before workers started")
+        return
+    _executor.submit(run_job, job_id)
+
+
+def _job_status(job: IngestJob) -> dict:
+    """Serialise a job, including live progress while it is running"""
+    status = job.to_dict()
+    with _progress_lock:
+        if job.id in _progress:
+            status['rows_ingested'] = _progress[job.id]
+    return status
+
+
+def get_job(db: Session, job_id: str) -> Optional[dict]:
+    job = db.get(IngestJob, job_id)
+    return _job_status(job) if job else None
+
+
+def list_jobs(db: Session, limit: int = 50) -> List[dict]:
+    jobs = db.query(IngestJob).order_by(IngestJob.created_at.desc()).limit(limit).all()
+    return [_job_status(job) for job in jobs]
+
+
+def requeue_abandoned(db: Session) -> int:
+    """Requeue running jobs whose lease has expired, returning how many.
+
+    Jobs still renewing their lease belong to a live worker, such as another
+    server process, and are left running.
+    """
+    now = datetime.utcnow()
+    running = db.query(IngestJob.id, IngestJob.started_at).filter(IngestJob.status == 'running').all()
+    expired = [job_id for job_id, started_at in running if _lease_expired(job_id, started_at, now)]
+    if not expired:
+        return 0
+    requeued = db.query(IngestJob).filter(
+        IngestJob.id.in_(expired), IngestJob.status == 'running'
+    ).update({'status': 'queued', 'started_at': None, 'worker_id': None}, synchronize_session=False)
+    db.commit()
+    return requeued
+
+
+def start() -> None:
+    """Start the worker pool and requeue jobs abandoned by a previous run"""
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=config.JOB_WORKERS, thread_name_prefix='report-job')
+
+    db = SessionLocal()
+    try:
+        interrupted = requeue_abandoned(db)
+        if interrupted:
+            logger.info(f"Requeued {interrupted} interrupted report jobs")
+
+        queued = db.query(IngestJob.id).filter(
+            IngestJob.status == 'queued'
+        ).order_by(IngestJob.created_at).all()
+        for (job_id,) in queued:
+            submit(job_id)
+    finally:
+        db.close()
+
+
+def shutdown() -> None:
+    if _executor:
+        _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,341 @@
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Table
+from sqlalchemy.orm import Session
+
+from app import config, metrics
+from app.services import ingest, readers, source_cache
+from app.services.filters import compile_filters
+from app.services.sources import content_hash, ingested_hashes
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Bytes scanned at a time when looking for CSV record boundaries
+SCAN_BLOCK_SIZE = 1 << 20
+
+# Records parsed after each boundary, within at most this many bytes, to check it starts a record
+PROBE_RECORDS = 4
+PROBE_BYTES = 64 * 1024
+
+# A quote inside an unquoted field, which throws the quote parity off
+STRAY_QUOTE = re.compile(rb'[^,\r\n"]"[^,\r\n"]')
+
+
+def enabled() -> bool:
+    return config.INGEST_WORKERS > 0
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned rather than forked, the server process runs threads
+            _executor = ProcessPoolExecutor(
+                max_workers=config.INGEST_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _starts_records(f, offset: int, fields: int) -> bool:
+    """Whether the records following offset parse with the header's number of fields"""
+    f.seek(offset)
+    data = f.read(PROBE_BYTES)
+    try:
+        records = [record for record in csv.reader(io.StringIO(data.decode('utf-8', errors='replace'))) if record]
+    except csv.Error:
+        return False
+    if len(data) == PROBE_BYTES:
+        # The probe may cut the last record short
+        records = records[:-1]
+    return bool(records) and all(len(record) == fields for record in records[:PROBE_RECORDS])
+
+
+def split_csv(path: str, part_bytes: int) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """Split a CSV file into its header and byte ranges of about part_bytes whole records.
+
+    A newline ends a record only outside quotes, i.e. after an even number of quote
+    characters, so quoted fields spanning lines are never cut. A stray quote inside
+    an unquoted field breaks that count, so when one is seen, or the records after a
+    boundary do not parse with the header's fields, no ranges are returned and the
+    caller parses the file as one unit.
+    """
+    size = os.path.getsize(path)
+    boundaries = []
+    target = 0
+    quotes = 0
+    offset = 0
+    stray = False
+    with open(path, 'rb') as f:
+        while target is not None:
+            block = f.read(SCAN_BLOCK_SIZE)
+            if not block:
+                break
+            if STRAY_QUOTE.search(block):
+                stray = True
+                break
+            pos = max(target - offset, 0)
+            while pos < len(block):
+                newline = block.find(b'\n', pos)
+                if newline < 0:
+                    break
+                if (quotes + block.count(b'"', 0, newline)) % 2:
+                    pos = newline + 1
+                    continue
+                boundaries.append(offset + newline + 1)
+                target = boundaries[-1] + part_bytes
+                if target >= size:
+                    target = None
+                    break
+                pos = target - offset
+            quotes += block.count(b'"')
+            offset += len(block)
+
+        if stray:
+            logger.warning(f"Stray quote in {path}, it is parsed as one unit")
+            return b'', []
+
+        # The first boundary ends the header, the others end a range
+        f.seek(0)
+        header = f.read(boundaries[0] if boundaries else size)
+
+        fields = len(next(csv.reader(io.StringIO(header.decode('utf-8-sig', errors='replace'))), []))
+        if not all(_starts_records(f, start, fields) for start in boundaries[1:]):
+            logger.warning(f"Could not find record boundaries in {path}, it is parsed as one unit")
+            return header, []
+
+    edges = boundaries + [size]
+    return header, [(start, end) for start, end in zip(edges, edges[1:]) if end > start]
+
+
+def _source_units(path: str, name: str, content_type: str = None) -> List[dict]:
+    """Work units for a spooled source: byte ranges of a large uncompressed CSV, or the whole file"""
+    source = {'path': path, 'name': name, 'content_type': content_type}
+    if (
+        readers.source_format(name, content_type) == '.csv'
+        and os.path.getsize(path) > config.INGEST_SPLIT_BYTES
+    ):
+        header, ranges = split_csv(path, config.INGEST_SPLIT_BYTES)
+        if ranges:
+            return [{**source, 'header': header, 'start': start, 'end': end} for start, end in ranges]
+    return [{**source, 'header': None, 'start': None, 'end': None}]
+
+
+def _spool(fileobj: BinaryIO, directory: str, idx: int) -> str:
+    """Path workers can open for a source, copying in-memory or unnamed files to disk"""
+    name = getattr(fileobj, 'name', None)
+    if isinstance(name, str) and os.path.isfile(name) and fileobj.tell() == 0:
+        return name
+    path = os.path.join(directory, f"{idx}.source")
+    with open(path, 'wb') as out:
+        shutil.copyfileobj(fileobj, out)
+    return path
+
+
+def process_unit(unit: dict, source_type: str, filters, chunk_size: int, out_prefix: str) -> dict:
+    """Parse, normalise and filter one unit in a worker process.
+
+    Each chunk is written to an uncompressed Arrow IPC file, which the writer
+    memory-maps instead of receiving the rows pickled through a pipe.
+    """
+    try:
+        if unit['header'] is not None:
+            with open(unit['path'], 'rb') as f:
+                f.seek(unit['start'])
+                fileobj = BytesIO(unit['header'] + f.read(unit['end'] - unit['start']))
+        else:
+            fileobj = open(unit['path'], 'rb')
+
+        result = {'records': 0, 'columns': [], 'memory_bytes': 0, 'parts': []}
+        with fileobj:
+            source_filter = compile_filters(filters)
+            chunks = readers.iter_source_chunks(fileobj, unit['name'], chunk_size, unit['content_type'])
+            for chunk in metrics.timed(chunks, 'parse'):
+                processed_df = ingest.normalise_chunk(chunk, source_type)
+                result['memory_bytes'] += int(processed_df.memory_usage(deep=True).sum())
+                if source_filter:
+                    processed_df = ingest.filter_chunk(source_filter, processed_df)
+                if not result['columns']:
+                    result['columns'] = list(processed_df.columns)
+                result['records'] += len(processed_df)
+
+                # One file per chunk, each with its own categories
+                path = f"{out_prefix}.{len(result['parts'])}.arrow"
+                with metrics.INGEST_STAGE_SECONDS.time(stage='part_write'):
+                    source_cache.write_part(processed_df[ingest.SALE_COLUMNS], path)
+                result['parts'].append(path)
+        # Recorded in this worker, handed to the writer process that exposes them
+        result['metrics'] = metrics.drain()
+        return result
+    except HTTPException as e:
+        # Worker exceptions are pickled back to the writer, so only the message is kept
+        raise ValueError(e.detail)
+
+
+def _unit_result(future, name: str, source_type: str) -> dict:
+    """Wait for a worker unit, raising SourceError if it failed"""
+    try:
+        return future.result()
+    except BrokenProcessPool as e:
+        # A worker died, start a fresh pool for the next ingest
+        shutdown()
+        raise ingest.SourceError(name, source_type, str(e))
+    except Exception as e:
+        raise ingest.SourceError(name, source_type, str(e))
+
+
+def ingest_sources(
+    db: Session,
+    task_name: str,
+    sources: List[Tuple[str, str, BinaryIO]],
+    source_filters: dict = None,
+    chunk_size: int = None,
+    batch_size: int = None,
+    on_duplicate: str = None,
+    on_chunk: Callable[[int], None] = None,
+    target: Table = None,
+    skip_ingested: bool = False
+) -> dict:
+    """ingest.ingest_sources with parsing, normalising and filtering in worker processes.
+
+    Large CSV sources are split into byte ranges so one source can use several
+    workers. Chunks are written by this process alone, in source order, so
+    duplicate handling matches the serial path. Cached sources are read by the
+    writer directly, without a worker.
+    """
+    source_filters = source_filters or {}
+    chunk_size = chunk_size or config.INGEST_CHUNK_SIZE
+    executor = _get_executor()
+    directory = tempfile.mkdtemp(prefix='ingest-', dir=config.INGEST_WORKER_DIR)
+    source_metadata = []
+    ingest_stats = None
+    pending = []
+    seen = ingested_hashes(db, task_name) if skip_ingested else set()
+
+    try:
+        # Queue every unit up front, workers run ahead while chunks are written
+        for idx, (name, source_type, fileobj) in enumerate(sources):
+            source = {'name': name, 'type': source_type, 'filters': source_filters.get(str(idx), {})}
+            try:
+                source['digest'] = content_hash(fileobj)
+                if source['digest'] in seen:
+                    pending.append(source)
+                    continue
+                # URL downloads carry their response's content type
+                content_type = getattr(fileobj, 'content_type', None)
+                if source_cache.enabled():
+                    source['cache_key'] = source_cache.cache_key(source['digest'], name, content_type)
+                    source['entry'] = source_cache.lookup(source['cache_key'])
+                units = [] if source.get('entry') else _source_units(
+                    _spool(fileobj, directory, idx), name, content_type
+                )
+            except (OSError, ValueError) as e:
+                raise ingest.SourceError(name, source_type, str(e))
+            if skip_ingested:
+                seen.add(source['digest'])
+            # Sources about to be cached are filtered by the writer, so the cached chunks are complete
+            worker_filters = {} if source.get('cache_key') else source['filters']
+            source['futures'] = [
+                executor.submit(
+                    process_unit, unit, source_type, worker_filters,
+                    chunk_size, os.path.join(directory, f"{idx}-{number}")
+                )
+                for number, unit in enumerate(units)
+            ]
+            pending.append(source)
+
+        for source in pending:
+            name, source_type, digest = source['name'], source['type'], source['digest']
+            if 'futures' not in source:
+                source_metadata.append(ingest.skipped_source_metadata(name, source_type, digest))
+                continue
+            metadata = {
+                'name': name,
+                'type': source_type,
+                'records': 0,
+                'columns': [],
+                'memory_bytes': 0,
+                'ingest': None,
+                'content_hash': digest
+            }
+            entry = source.get('entry')
+            writer_filter = compile_filters(source['filters']) if source.get('cache_key') else None
+            parts = []
+
+            if entry:
+                metadata['columns'] = entry['columns']
+                metadata['memory_bytes'] = entry['memory_bytes']
+                results = [{'parts': entry['parts']}]
+            else:
+                results = (_unit_result(future, name, source_type) for future in source['futures'])
+
+            for result in results:
+                if not entry:
+                    metadata['memory_bytes'] += result['memory_bytes']
+                    metadata['columns'] = metadata['columns'] or result['columns']
+                metrics.merge(result.get('metrics', {}))
+                for path in result['parts']:
+                    with metrics.INGEST_STAGE_SECONDS.time(stage='cache_read' if entry else 'part_read'):
+                        df = source_cache.read_part(path)
+                    if writer_filter:
+                        df = ingest.filter_chunk(writer_filter, df)
+                    metadata['records'] += len(df)
+                    stats = ingest.bulk_insert_sales(db, task_name, df, batch_size, on_duplicate, target)
+                    if entry is None:
+                        # Kept for the source cache, otherwise removed once written
+                        if source.get('cache_key'):
+                            parts.append(path)
+                        else:
+                            os.remove(path)
+                    metadata['ingest'] = ingest.merge_stats(metadata['ingest'], stats)
+                    if on_chunk:
+                        on_chunk(stats['rows_written'])
+
+            if parts:
+                source_cache.store(source['cache_key'], parts, metadata['columns'], metadata['memory_bytes'])
+            logger.info(
+                f"Ingested {metadata['records']} records from {source_type} source {name} "
+                f"into task {task_name} "
+                + ('from the source cache' if entry else f"using {len(source['futures'])} worker units")
+            )
+            source_metadata.append(metadata)
+            if metadata['ingest']:
+                ingest_stats = ingest.merge_stats(ingest_stats, metadata['ingest'])
+    finally:
+        for source in pending:
+            for future in source.get('futures', []):
+                future.cancel()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if target is None:
+        ingest.finish_task_write(db, task_name, source_metadata)
+
+    return {
+        'source_metadata': source_metadata,
+        'total_records': sum(metadata['records'] for metadata in source_metadata),
+        'ingest': ingest_stats
+    }
@@ -0,0 +1,115 @@
+from typing import List, Optional
+
+from sqlalchemy import Integer, String, cast, func, literal, select
+from sqlalchemy.orm import Session
+
+from app.models import Sale
+from app.services.filters import compile_filters
+from app.services.rollups import sale_date
+
+DATE_GRANULARITIES = ('day', 'week', 'month', 'quarter', 'year')
+
+COLUMN_DIMENSIONS = ('company', 'car_model', 'sales_location', 'manufacturing_year')
+
+MEASURES = ('count', 'sum_price', 'avg_price', 'min_price', 'max_price')
+
+
+class QueryError(ValueError):
+    """A dimension, measure or limit in a query is not supported"""
+
+
+def date_bucket(granularity: str):
+    """Start of the date bucket containing each sale, as an ISO string ('2024-03', '2024-Q1', ...)"""
+    day = sale_date()
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        # Monday of the sale's week
+        return func.date(day, 'weekday 0', '-6 days')
+    if granularity == 'month':
+        return func.strftime('%Y-%m', day)
+    if granularity == 'quarter':
+        quarter = (cast(func.strftime('%m', day), Integer) + 2) // 3
+        return func.strftime('%Y', day) + literal('-Q') + cast(quarter, String)
+    if granularity == 'year':
+        return func.strftime('%Y', day)
+    raise QueryError(f"Invalid granularity '{granularity}', expected one of {', '.join(DATE_GRANULARITIES)}")
+
+
+def dimension_expression(name: str):
+    """SQL expression for a dimension: a sale column or sale_<granularity> date bucket"""
+    if name in COLUMN_DIMENSIONS:
+        return getattr(Sale, name)
+    if name.startswith('sale_') and name[len('sale_'):] in DATE_GRANULARITIES:
+        return date_bucket(name[len('sale_'):])
+    dimensions = list(COLUMN_DIMENSIONS) + [f"sale_{granularity}" for granularity in DATE_GRANULARITIES]
+    raise QueryError(f"Invalid dimension '{name}', expected one of {', '.join(dimensions)}")
+
+
+def measure_expression(name: str):
+    # Average over every sale, as in the analytics summary and breakdowns
+    revenue = func.coalesce(func.sum(Sale.price), 0.0)
+    expressions = {
+        'count': func.count(),
+        'sum_price': revenue,
+        'avg_price': revenue / func.count(),
+        'min_price': func.min(Sale.price),
+        'max_price': func.max(Sale.price)
+    }
+    if name not in expressions:
+        raise QueryError(f"Invalid measure '{name}', expected one of {', '.join(MEASURES)}")
+    return expressions[name]
+
+
+def validate_query(dimensions: List[str], measures: List[str]) -> None:
+    """Raise QueryError unless the dimensions and measures form a valid query"""
+    if not measures:
+        raise QueryError("At least one measure is required")
+    if len(set(dimensions)) != len(dimensions) or len(set(measures)) != len(measures):
+        raise QueryError("Dimensions and measures must not repeat")
+    for name in dimensions:
+        dimension_expression(name)
+    for name in measures:
+        measure_expression(name)
+
+
+def build_query(task_name: str, dimensions: List[str], measures: List[str], filters=None, limit: Optional[int] = None):
+    """GROUP BY query over a task's sales returning one row per cell, ordered by the dimensions"""
+    validate_query(dimensions, measures)
+    keys = [dimension_expression(name).label(name) for name in dimensions]
+    values = [measure_expression(name).label(name) for name in measures]
+    query = select(*keys, *values).where(
+        Sale.task_name == task_name, compile_filters(filters).where(Sale)
+    )
+    if keys:
+        query = query.group_by(*keys).order_by(*keys)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def run_query(
+    db: Session,
+    task_name: str,
+    dimensions: List[str],
+    measures: List[str],
+    filters=None,
+    max_cells: int = None
+) -> dict:
+    """Aggregate a task's sales into cells, at most max_cells of them"""
+    query = build_query(
+        task_name, dimensions, measures, filters, limit=max_cells + 1 if max_cells else None
+    )
+    cells = []
+    for row in db.execute(query).mappings():
+        cell = dict(row)
+        for name in ('sum_price', 'avg_price'):
+            if cell.get(name) is not None:
+                cell[name] = round(cell[name], 2)
+        cells.append(cell)
+
+    truncated = bool(max_cells) and len(cells) > max_cells
+    return {
+        'cells': cells[:max_cells] if truncated else cells,
+        'truncated': truncated
+    }
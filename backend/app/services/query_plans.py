@@ -0,0 +1,107 @@
+import re
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models import Sale, TaskCompanyRollup, TaskMonthRollup, TaskModelRollup, TaskSketch
+from app.services import analytics, queries, rollups, sketches
+
+# Tables that grow with task data and must only be read through an index
+INDEXED_TABLES = {
+    Sale.__tablename__,
+    TaskCompanyRollup.__tablename__,
+    TaskMonthRollup.__tablename__,
+    TaskModelRollup.__tablename__,
+    TaskSketch.__tablename__
+}
+
+# The index each analytics query must search, and the columns that search must be
+# constrained on. Every index leads with task_name, which has a single value in a
+# task's partition, so a search on task_name alone reads the whole table through
+# the index. Queries reading a whole task instead rely on a covering index.
+EXPECTED_PLANS: Dict[str, Tuple[str, List[str]]] = {
+    'summary': ('sqlite_autoindex_task_month_rollup_1', []),
+    'company_breakdown': ('sqlite_autoindex_task_company_rollup_1', []),
+    'monthly_breakdown': ('sqlite_autoindex_task_month_rollup_1', []),
+    'model_breakdown': ('sqlite_autoindex_task_model_rollup_1', []),
+    'sales_page': ('sqlite_autoindex_sales_1', ['sale_id']),
+    'query_company_month': ('ix_sales_task_company', []),
+    'query_location': ('ix_sales_task_location', []),
+    'sketch_cells': ('sqlite_autoindex_task_sketches_1', ['company', 'month']),
+    'refresh_task_sketches': ('ix_sales_task_company', ['company']),
+    'refresh_task_company_rollup': ('ix_sales_task_company', []),
+    'refresh_task_month_rollup': ('ix_sales_task_date', []),
+    'refresh_task_model_rollup': ('ix_sales_task_model', [])
+}
+
+PLAN_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\S+)(?: \((.*)\))?')
+
+
+def analytics_queries(task_name: str = 'task') -> Dict[str, object]:
+    """Every query on the ingest and analytics hot paths, keyed by a readable name"""
+    plans = {
+        'summary': analytics.summary_query(task_name),
+        'company_breakdown': analytics.company_query(task_name),
+        'monthly_breakdown': analytics.monthly_query(task_name),
+        'model_breakdown': analytics.model_query(task_name),
+        'sales_page': analytics.sales_query(task_name, after='sale', limit=1000),
+        'query_company_month': queries.build_query(
+            task_name, ['company', 'sale_month'], ['count', 'avg_price'], 'price > 1000'
+        ),
+        'query_location': queries.build_query(task_name, ['sales_location'], ['count', 'max_price']),
+        'sketch_cells': sketches.cells_query(task_name, ['company'], '2024-01', '2024-12'),
+        'refresh_task_sketches': sketches.sketch_query(task_name, {'company', ''})
+    }
+    for rollup, query in rollups.rollup_queries(task_name).items():
+        plans[f"refresh_{rollup.__tablename__}"] = query
+    return plans
+
+
+def explain(db: Session, query) -> List[str]:
+    """Get the EXPLAIN QUERY PLAN detail lines for a query"""
+    # Textual SQL skips the session's schema translation, so render it into the statement
+    schema_translate_map = db.connection().get_execution_options().get('schema_translate_map')
+    sql = str(query.compile(
+        dialect=db.get_bind().dialect,
+        schema_translate_map=schema_translate_map,
+        render_schema_translate=schema_translate_map is not None,
+        compile_kwargs={'literal_binds': True}
+    ))
+    return [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def find_full_scans(db: Session) -> Dict[str, List[str]]:
+    """Get the plan lines of each analytics query that scans a data table without an index search"""
+    full_scans = {}
+    for name, query in analytics_queries().items():
+        scans = [
+            detail for detail in explain(db, query)
+            # Tables in the task's partition are named schema.table
+            if detail.startswith('SCAN ') and detail.split()[1].split('.')[-1] in INDEXED_TABLES
+        ]
+        if scans:
+            full_scans[name] = scans
+    return full_scans
+
+
+def find_unexpected_plans(db: Session) -> Dict[str, List[str]]:
+    """Get the plan lines of each analytics query whose data table searches miss its expected index or filter columns"""
+    unexpected = {}
+    for name, query in analytics_queries().items():
+        details = explain(db, query)
+        if name not in EXPECTED_PLANS:
+            unexpected[name] = ['no expected plan declared'] + details
+            continue
+        index, columns = EXPECTED_PLANS[name]
+        searches = [
+            PLAN_INDEX.search(detail) for detail in details
+            if detail.startswith('SEARCH ') and detail.split()[1].split('.')[-1] in INDEXED_TABLES
+        ]
+        if not searches or not all(
+            match and match.group(1) == index
+            and set(columns) <= set(re.findall(r'(\w+)[=<>]', match.group(2) or ''))
+            for match in searches
+        ):
+            unexpected[name] = details
+    return unexpected
@@ -0,0 +1,305 @@
+import codecs
+import gzip
+import json
+import os
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+from app import config
+
+# Bytes read from the source per iteration when parsing JSON incrementally
+JSON_READ_BLOCK_SIZE = 1 << 16
+
+# Characters a single JSON record may span, so a malformed or oversized record
+# fails instead of being re-decoded from its start on every block until the end
+JSON_MAX_RECORD_SIZE = 1 << 20
+
+# A decode error this close to the end of the buffer may just be a truncated
+# token (e.g. "tru" or "1e"), further back it is a syntax error
+JSON_TRUNCATED_TAIL = 16
+
+# Bytes pyarrow parses per block of a CSV, column types are inferred from the first
+CSV_READ_BLOCK_SIZE = 1 << 23
+
+Reader = Callable[[BinaryIO, int], Iterator[pd.DataFrame]]
+
+
+def iter_pandas_csv_chunks(fileobj: BinaryIO, chunk_size: int, skiprows=None) -> Iterator[pd.DataFrame]:
+    """Read a CSV file in DataFrames of at most chunk_size rows with the pandas parser"""
+    with pd.read_csv(fileobj, chunksize=chunk_size, encoding='utf-8', skiprows=skiprows) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def iter_csv_chunks(fileobj: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Read a CSV file in DataFrames of at most chunk_size rows.
+
+    Uses pyarrow's streaming reader when it is installed, which parses blocks in
+    native threads. Its column types are inferred from the first block, so when a
+    later value does not fit them (e.g. text in a numeric column) the rest of a
+    seekable file is read with pandas, which coerces such values in normalisation.
+    """
+    try:
+        import pyarrow as pa
+        from pyarrow import csv
+    except ImportError:
+        yield from iter_pandas_csv_chunks(fileobj, chunk_size)
+        return
+
+    start = fileobj.tell() if fileobj.seekable() else None
+    rows = 0
+    try:
+        reader = csv.open_csv(
+            fileobj,
+            read_options=csv.ReadOptions(block_size=CSV_READ_BLOCK_SIZE),
+            # Empty strings are missing as with pandas, timestamps stay text so
+            # normalisation keeps their local date; plain dates are still parsed
+            convert_options=csv.ConvertOptions(strings_can_be_null=True, timestamp_parsers=['%Y-%m-%d'])
+        )
+        for batch in reader:
+            for offset in range(0, batch.num_rows, chunk_size):
+                chunk = batch.slice(offset, chunk_size).to_pandas(date_as_object=False)
+                rows += len(chunk)
+                yield chunk
+    except pa.ArrowInvalid:
+        if start is None:
+            raise
+        fileobj.seek(start)
+        yield from iter_pandas_csv_chunks(fileobj, chunk_size, skiprows=range(1, rows + 1))
+
+
+def iter_json_records(
+    fileobj: BinaryIO,
+    block_size: int = JSON_READ_BLOCK_SIZE,
+    max_record_size: int = JSON_MAX_RECORD_SIZE
+) -> Iterator[dict]:
+    """Incrementally decode the records of a top-level JSON array.
+
+    Only the current block and the record being decoded are held in memory.
+    A top-level object is treated as a single record. Raises ValueError on a
+    syntax error or a record longer than max_record_size characters.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    pos = 0
+    eof = False
+    in_array = None
+
+    def fill():
+        nonlocal buffer, pos, eof
+        block = fileobj.read(block_size)
+        if not block:
+            eof = True
+            buffer = buffer[pos:] + text_decoder.decode(b'', final=True)
+        else:
+            buffer = buffer[pos:] + text_decoder.decode(block)
+        pos = 0
+
+    def grow():
+        # Read another block for the record at pos, which is incomplete so far
+        if len(buffer) - pos > max_record_size:
+            raise ValueError(f"JSON record at character {pos} is larger than {max_record_size} characters")
+        fill()
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if pos >= len(buffer):
+        return
+    if buffer[pos] == '[':
+        in_array = True
+        pos += 1
+    elif buffer[pos] != '{':
+        raise ValueError("Expected a JSON array or object")
+
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            if in_array:
+                raise ValueError("Unexpected end of JSON array")
+            return
+        if in_array and buffer[pos] == ']':
+            return
+        if in_array and buffer[pos] == ',':
+            pos += 1
+            continue
+
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            truncated = e.msg.startswith('Unterminated string') or len(buffer) - e.pos <= JSON_TRUNCATED_TAIL
+            if eof or not truncated:
+                raise
+            grow()
+            continue
+        # A value ending exactly at the buffer boundary may be truncated (e.g. a number)
+        if end == len(buffer) and not eof:
+            grow()
+            continue
+
+        pos = end
+        yield record
+        if not in_array:
+            return
+
+
+def iter_json_chunks(fileobj: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Read a JSON array of records in DataFrames of at most chunk_size rows"""
+    records = []
+    for record in iter_json_records(fileobj):
+        records.append(record)
+        if len(records) >= chunk_size:
+            yield pd.DataFrame(records)
+            records = []
+    if records:
+        yield pd.DataFrame(records)
+
+
+def _excel_value(value):
+    # As pandas reads openpyxl cells: whole floats as ints, blank cells as missing
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return None if value == '' else value
+
+
+def iter_excel_chunks(fileobj: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Read the first sheet of a workbook in DataFrames of at most chunk_size rows.
+
+    The workbook is opened read-only, so rows are parsed from the sheet's XML as
+    they are consumed rather than loading every cell first. Blank rows are
+    skipped, as pandas.read_excel does.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True, keep_links=False)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+        records = []
+        for row in rows:
+            values = [_excel_value(value) for value in row[:len(columns)]]
+            if all(value is None for value in values):
+                continue
+            records.append(values)
+            if len(records) >= chunk_size:
+                yield pd.DataFrame.from_records(records, columns=columns)
+                records = []
+        if records:
+            yield pd.DataFrame.from_records(records, columns=columns)
+    finally:
+        workbook.close()
+
+
+def iter_parquet_chunks(fileobj: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Read a Parquet file in DataFrames of at most chunk_size rows, one row group at a time"""
+    from pyarrow import parquet
+
+    for batch in parquet.ParquetFile(fileobj).iter_batches(batch_size=chunk_size):
+        yield batch.to_pandas(date_as_object=False)
+
+
+def _zstd_stream(fileobj: BinaryIO) -> BinaryIO:
+    import pyarrow as pa
+
+    return pa.CompressedInputStream(fileobj, 'zstd')
+
+
+# Reader per source format, keyed by file extension
+READERS: Dict[str, Reader] = {
+    '.csv': iter_csv_chunks,
+    '.json': iter_json_chunks,
+    '.xlsx': iter_excel_chunks,
+    '.parquet': iter_parquet_chunks
+}
+
+# Formats of URL sources whose name has no known extension, keyed by media type
+CONTENT_TYPES: Dict[str, str] = {
+    'text/csv': '.csv',
+    'application/csv': '.csv',
+    'application/json': '.json',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': '.xlsx',
+    'application/vnd.apache.parquet': '.parquet',
+    'application/x-parquet': '.parquet'
+}
+
+# Decompressing streams for compressed text sources, keyed by the extension after the format's
+COMPRESSIONS: Dict[str, Callable[[BinaryIO], BinaryIO]] = {
+    '.gz': lambda fileobj: gzip.GzipFile(fileobj=fileobj, mode='rb'),
+    '.zst': _zstd_stream
+}
+COMPRESSION_ALIASES = {'.gzip': '.gz', '.zstd': '.zst'}
+
+# Formats parsed front to back, the only ones that can be read through a decompressing stream
+STREAMED_FORMATS = {'.csv', '.json'}
+
+
+def register_reader(extension: str, reader: Reader, content_types: Iterable[str] = (), streamed: bool = False) -> None:
+    """Add or replace the reader of a source format.
+
+    A streamed reader only reads its file front to back, so sources in the format
+    may also be gzip or zstd compressed.
+    """
+    extension = extension.lower()
+    READERS[extension] = reader
+    for content_type in content_types:
+        CONTENT_TYPES[content_type.lower()] = extension
+    if streamed:
+        STREAMED_FORMATS.add(extension)
+
+
+def _split_format(filename: str) -> Tuple[str, Optional[str]]:
+    """A name's format and compression extensions, a URL's query and fragment are ignored"""
+    path = urlsplit(filename).path if '://' in filename else filename
+    stem, ext = os.path.splitext(path.lower())
+    compression = COMPRESSION_ALIASES.get(ext, ext)
+    if compression in COMPRESSIONS:
+        return os.path.splitext(stem)[1], compression
+    return ext, None
+
+
+def _resolve(filename: str, content_type: str = None) -> Tuple[str, Optional[str]]:
+    file_ext, compression = _split_format(filename)
+    if file_ext not in READERS and content_type:
+        file_ext = CONTENT_TYPES.get(content_type.split(';')[0].strip().lower(), file_ext)
+    if file_ext not in READERS or (compression and file_ext not in STREAMED_FORMATS):
+        raise ValueError(f"Unsupported file format: {filename}")
+    return file_ext, compression
+
+
+def source_format(filename: str, content_type: str = None) -> str:
+    """The format a source is parsed as, e.g. '.csv' or '.json.gz', from its name or else its content type.
+
+    Raises ValueError for formats without a reader.
+    """
+    file_ext, compression = _resolve(filename, content_type)
+    return file_ext + (compression or '')
+
+
+def iter_source_chunks(
+    fileobj: BinaryIO,
+    filename: str,
+    chunk_size: int = None,
+    content_type: str = None
+) -> Iterator[pd.DataFrame]:
+    """Parse a source file into DataFrame chunks based on its extension, or else its content type.
+
+    Compressed sources are decompressed as they are read, never in full.
+    """
+    chunk_size = chunk_size or config.INGEST_CHUNK_SIZE
+    file_ext, compression = _resolve(filename, content_type)
+    if compression:
+        fileobj = COMPRESSIONS[compression](fileobj)
+    return READERS[file_ext](fileobj, chunk_size)
@@ -0,0 +1,76 @@
+import logging
+from typing import List
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app import config, partitions
+from app.database import SessionLocal
+from app.models import TaskCatalog
+from app.services import cache, snapshots
+
+logger = logging.getLogger(__name__)
+
+
+def enabled() -> bool:
+    return config.TASK_RETENTION_MAX_TASKS > 0 or config.TASK_RETENTION_MAX_BYTES > 0
+
+
+def drop_tasks(db: Session, task_names: List[str]) -> None:
+    """Remove tasks from the catalog and delete their partitions, whatever their size, then commit.
+
+    The files go before the commit while the session still holds the write
+    connection, so a write recreating one of the tasks cannot start in between.
+    """
+    db.execute(delete(TaskCatalog).where(TaskCatalog.task_name.in_(task_names)))
+    for task_name in task_names:
+        partitions.drop(task_name)
+    db.commit()
+    for task_name in task_names:
+        snapshots.remove_snapshot(task_name)
+        cache.invalidate_task(task_name)
+
+
+def _within_limits(count: int, total_bytes: int) -> bool:
+    return (
+        (not config.TASK_RETENTION_MAX_TASKS or count <= config.TASK_RETENTION_MAX_TASKS)
+        and (not config.TASK_RETENTION_MAX_BYTES or total_bytes <= config.TASK_RETENTION_MAX_BYTES)
+    )
+
+
+def enforce(keep: str = None) -> List[str]:
+    """Evict the least recently viewed tasks until the rest fit the retention limits, and return their names.
+
+    Tasks are ordered by the mtime of their partition, which every view and write
+    touches. keep, usually the task just written, is never evicted but still counts.
+    """
+    if not enabled():
+        return []
+
+    db = SessionLocal()
+    try:
+        tasks = [
+            (partitions.last_used(task_name), partitions.partition_bytes(task_name), task_name)
+            for task_name in db.scalars(select(TaskCatalog.task_name))
+        ]
+        count = len(tasks)
+        total_bytes = sum(size for _, size, _ in tasks)
+        evicted = []
+        for _, size, task_name in sorted(tasks):
+            if _within_limits(count, total_bytes):
+                break
+            if task_name == keep:
+                continue
+            evicted.append(task_name)
+            count -= 1
+            total_bytes -= size
+
+        if evicted:
+            drop_tasks(db, evicted)
+            logger.info(f"Evicted {len(evicted)} least recently viewed tasks: {', '.join(evicted)}")
+        return evicted
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,171 @@
+import logging
+from typing import List
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models import Sale, TaskCompanyRollup, TaskMonthRollup, TaskModelRollup
+from app.services import catalog
+
+logger = logging.getLogger(__name__)
+
+# Rollup key of sales without a company or car model, the key columns are not nullable
+MISSING_KEY = ''
+
+
+def sale_date(columns=Sale):
+    """Date of sale as an ISO string, defaulting to today when missing"""
+    return func.coalesce(func.date(columns.date_of_sale), func.date('now'))
+
+
+def sale_month(columns=Sale):
+    return func.strftime('%Y-%m', sale_date(columns))
+
+
+def _measures(columns) -> dict:
+    """Measures shared by every rollup, keyed by rollup column"""
+    return {
+        'sales_count': func.count(),
+        'revenue': func.coalesce(func.sum(columns.price), 0.0),
+        'price_min': func.min(columns.price),
+        'price_max': func.max(columns.price)
+    }
+
+
+def _rollup_keys(columns) -> dict:
+    """Each rollup's key column and expression, with any measures beyond the shared ones"""
+    return {
+        TaskCompanyRollup: ('company', columns.company, {}),
+        TaskMonthRollup: ('month', sale_month(columns), {
+            'date_min': func.min(sale_date(columns)),
+            'date_max': func.max(sale_date(columns))
+        }),
+        TaskModelRollup: ('car_model', columns.car_model, {})
+    }
+
+
+def _rollup_query(task_name: str, name: str, key, extra: dict, columns=Sale):
+    """GROUP BY over a task's sales, or another table of sale columns, producing rollup rows"""
+    # Sales missing a company or model are kept together under MISSING_KEY, as the
+    # original analytics kept sales without a company under a None company
+    key = func.coalesce(key, MISSING_KEY)
+    selected = {'task_name': columns.task_name, name: key, **_measures(columns), **extra}
+    return select(*(expr.label(label) for label, expr in selected.items())).where(
+        columns.task_name == task_name
+    ).group_by(columns.task_name, key)
+
+
+def rollup_queries(task_name: str) -> dict:
+    """The GROUP BY queries used to fill each rollup table, keyed by rollup model"""
+    return {
+        rollup: _rollup_query(task_name, name, key, extra)
+        for rollup, (name, key, extra) in _rollup_keys(Sale).items()
+    }
+
+
+def refresh_task_rollups(db: Session, task_name: str) -> None:
+    """Rebuild the company, month and car model rollups of a task.
+
+    Runs inside the caller's transaction, so rollups commit together with the sales.
+    """
+    for rollup, query in rollup_queries(task_name).items():
+        db.execute(delete(rollup).where(rollup.task_name == task_name))
+        db.execute(insert(rollup).from_select(
+            [column.name for column in query.selected_columns], query
+        ))
+    logger.debug(f"Refreshed rollups for task {task_name}")
+
+
+def aggregate_rollups(db: Session, task_name: str, columns=Sale, join=None) -> dict:
+    """Rollup rows of a task's sales, or another table of sale columns, by rollup model and key.
+
+    join, when given, is the FROM clause, e.g. to aggregate only sales matching a staging table.
+    """
+    aggregates = {}
+    for rollup, (name, key, extra) in _rollup_keys(columns).items():
+        query = _rollup_query(task_name, name, key, extra, columns)
+        if join is not None:
+            query = query.select_from(join)
+        aggregates[rollup] = {row._mapping[name]: row._mapping for row in db.execute(query)}
+    return aggregates
+
+
+def _combine(a, b, pick):
+    return b if a is None else a if b is None else pick(a, b)
+
+
+def _may_hold_extreme(removed, current) -> bool:
+    """Whether removed sales may have held a key's min or max, which then has to be regrouped"""
+    bounds = [('price_min', 'price_max'), ('date_min', 'date_max')]
+    for low, high in bounds:
+        if low not in removed:
+            continue
+        if removed[low] is not None and (current[low] is None or removed[low] <= current[low]):
+            return True
+        if removed[high] is not None and (current[high] is None or removed[high] >= current[high]):
+            return True
+    return False
+
+
+def apply_rollup_delta(db: Session, task_name: str, added: dict, removed: dict) -> None:
+    """Fold added sales into a task's rollups and take out the removed sales they replaced.
+
+    added and removed are aggregate_rollups results. Counts and revenue are adjusted in
+    place, so only the keys the delta touches are written. A key whose removed sales may
+    have held its min or max is regrouped from sales, so call this once the new rows are
+    in the sales table. Runs inside the caller's transaction.
+    """
+    for rollup, (name, key, extra) in _rollup_keys(Sale).items():
+        table = rollup.__table__
+        touched = set(added[rollup]) | set(removed[rollup])
+        if not touched:
+            continue
+
+        current = {
+            row._mapping[name]: row._mapping
+            for row in db.execute(select(table).where(table.c.task_name == task_name, table.c[name].in_(touched)))
+        }
+        merged = []
+        regroup = []
+        for value in touched:
+            row, new, old = current.get(value), added[rollup].get(value), removed[rollup].get(value)
+            if old is not None and (row is None or _may_hold_extreme(old, row)):
+                regroup.append(value)
+                continue
+
+            cell = dict(row) if row is not None else {
+                **{column.name: None for column in table.columns},
+                'task_name': task_name, name: value, 'sales_count': 0, 'revenue': 0.0
+            }
+            if new is not None:
+                cell['sales_count'] += new['sales_count']
+                cell['revenue'] += new['revenue']
+                for column in table.columns:
+                    if column.name.endswith('_min'):
+                        cell[column.name] = _combine(cell[column.name], new[column.name], min)
+                    elif column.name.endswith('_max'):
+                        cell[column.name] = _combine(cell[column.name], new[column.name], max)
+            if old is not None:
+                cell['sales_count'] -= old['sales_count']
+                cell['revenue'] -= old['revenue']
+            if cell['sales_count'] > 0:
+                merged.append(cell)
+
+        db.execute(delete(table).where(table.c.task_name == task_name, table.c[name].in_(touched)))
+        if merged:
+            db.execute(insert(table), merged)
+        if regroup:
+            query = _rollup_query(task_name, name, key, extra).where(func.coalesce(key, MISSING_KEY).in_(regroup))
+            db.execute(insert(table).from_select([column.name for column in query.selected_columns], query))
+    logger.debug(f"Applied rollup delta to task {task_name}")
+
+
+def rebuild_rollups(db: Session, task_names: List[str] = None) -> List[str]:
+    """Rebuild rollups and catalog entries for the given tasks, or for every task in the sales table"""
+    if not task_names:
+        task_names = [row.task_name for row in db.query(Sale.task_name).distinct()]
+
+    for task_name in task_names:
+        refresh_task_rollups(db, task_name)
+        catalog.bump_task_version(db, task_name)
+    return task_names
@@ -0,0 +1,265 @@
+import logging
+import math
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, insert, select, tuple_, union_all
+from sqlalchemy.orm import Session
+
+from app.models import Sale, TaskSketch
+from app.services import rollups
+
+logger = logging.getLogger(__name__)
+
+# t-digest compression: a digest keeps about half this many centroids, more of them
+# near the tails, so p99 stays accurate while p50 tolerates wider centroids
+DIGEST_COMPRESSION = 100
+
+# HyperLogLog precision: 2**12 one-byte registers, about 1.6% standard error. Stored
+# sketches are only mergeable at the same precision, so changing it means a rebuild
+HLL_PRECISION = 12
+
+# Sales read per batch when building sketches
+BATCH_ROWS = 100000
+
+# Quantiles reported when none are asked for
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class TDigest:
+    """Mergeable price quantile sketch: weighted centroids sorted by mean, plus the exact extremes"""
+
+    def __init__(self, means: np.ndarray, weights: np.ndarray, low: float, high: float):
+        self.means = means
+        self.weights = weights
+        self.low = low
+        self.high = high
+
+    @property
+    def count(self) -> int:
+        return int(self.weights.sum())
+
+    @staticmethod
+    def _compress(means: np.ndarray, weights: np.ndarray, compression: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Merge neighbouring centroids that fall within one unit of the k1 scale function"""
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+        if len(means) <= compression // 2:
+            return means, weights
+        q = (np.cumsum(weights) - weights / 2) / weights.sum()
+        k = compression / (2 * math.pi) * np.arcsin(2 * q - 1)
+        groups = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        merged = np.add.reduceat(weights, starts)
+        return np.add.reduceat(means * weights, starts) / merged, merged
+
+    @classmethod
+    def from_values(cls, values: np.ndarray, compression: int = DIGEST_COMPRESSION) -> Optional['TDigest']:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return None
+        # Identical prices are common, so start from one centroid per distinct value
+        means, weights = np.unique(values, return_counts=True)
+        return cls(*cls._compress(means, weights.astype(np.float64), compression), means[0], means[-1])
+
+    @classmethod
+    def merge(cls, digests: Iterable['TDigest'], compression: int = DIGEST_COMPRESSION) -> Optional['TDigest']:
+        digests = [digest for digest in digests if digest is not None]
+        if not digests:
+            return None
+        means, weights = cls._compress(
+            np.concatenate([digest.means for digest in digests]),
+            np.concatenate([digest.weights for digest in digests]),
+            compression
+        )
+        return cls(means, weights, min(digest.low for digest in digests), max(digest.high for digest in digests))
+
+    def quantiles(self, qs: Iterable[float]) -> List[float]:
+        """Interpolate between centroid midpoints, anchored at the exact minimum and maximum"""
+        total = self.weights.sum()
+        positions = np.r_[0.0, np.cumsum(self.weights) - self.weights / 2, total]
+        values = np.r_[self.low, self.means, self.high]
+        return [float(value) for value in np.interp(np.asarray(list(qs)) * total, positions, values)]
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(np.r_[self.low, self.high, self.means, self.weights].astype('<f8').tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TDigest':
+        values = np.frombuffer(zlib.decompress(data), dtype='<f8')
+        size = (len(values) - 2) // 2
+        return cls(values[2:2 + size], values[2 + size:], float(values[0]), float(values[1]))
+
+
+class HyperLogLog:
+    """Mergeable distinct count sketch over text values"""
+
+    def __init__(self, registers: np.ndarray = None):
+        self.registers = np.zeros(1 << HLL_PRECISION, dtype=np.uint8) if registers is None else registers
+
+    @classmethod
+    def from_values(cls, values) -> 'HyperLogLog':
+        sketch = cls()
+        values = pd.unique(pd.Series(values, dtype=object).dropna().astype(str))
+        if len(values):
+            hashes = pd.util.hash_array(np.asarray(values, dtype=object))
+            index = (hashes >> np.uint64(64 - HLL_PRECISION)).astype(np.int64)
+            rest = hashes << np.uint64(HLL_PRECISION)
+            # Rank is the position of the first set bit in the remaining hash bits
+            _, exponent = np.frexp(rest.astype(np.float64))
+            rank = np.where(rest == 0, 64 - HLL_PRECISION + 1, 65 - exponent).astype(np.uint8)
+            np.maximum.at(sketch.registers, index, rank)
+        return sketch
+
+    @classmethod
+    def merge(cls, sketches: Iterable['HyperLogLog']) -> 'HyperLogLog':
+        merged = cls()
+        for sketch in sketches:
+            np.maximum(merged.registers, sketch.registers, out=merged.registers)
+        return merged
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Linear counting is far more accurate while few registers are set
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        return cls(np.frombuffer(zlib.decompress(data), dtype=np.uint8).copy())
+
+
+def _cell_rows(task_name: str, frame: pd.DataFrame) -> List[dict]:
+    """One task_sketches row per (company, month) in a frame of sales"""
+    rows = []
+    for (company, month), group in frame.groupby(['company', 'month'], sort=False):
+        digest = TDigest.from_values(group['price'].to_numpy(dtype=np.float64, na_value=np.nan))
+        rows.append({
+            'task_name': task_name,
+            'company': company,
+            'month': month,
+            'sales_count': len(group),
+            'price_digest': digest.to_bytes() if digest is not None else None,
+            'model_hll': HyperLogLog.from_values(group['car_model']).to_bytes(),
+            'location_hll': HyperLogLog.from_values(group['sales_location']).to_bytes()
+        })
+    return rows
+
+
+def _merge_rows(rows: List[dict]) -> dict:
+    """Combine rows of the same cell built from different batches"""
+    if len(rows) == 1:
+        return rows[0]
+    digest = TDigest.merge(TDigest.from_bytes(row['price_digest']) for row in rows if row['price_digest'])
+    return {
+        **rows[0],
+        'sales_count': sum(row['sales_count'] for row in rows),
+        'price_digest': digest.to_bytes() if digest is not None else None,
+        'model_hll': HyperLogLog.merge(HyperLogLog.from_bytes(row['model_hll']) for row in rows).to_bytes(),
+        'location_hll': HyperLogLog.merge(HyperLogLog.from_bytes(row['location_hll']) for row in rows).to_bytes()
+    }
+
+
+def sketch_query(task_name: str, companies: Set[str] = None):
+    """A task's sales reduced to the columns sketches are built from, optionally for some companies"""
+    query = select(
+        Sale.company, rollups.sale_month().label('month'), Sale.car_model, Sale.sales_location, Sale.price
+    ).where(Sale.task_name == task_name)
+    if companies is None:
+        return query
+    # One search of the company index per branch, SQLite cannot search it for IN ... OR IS NULL
+    named = [company for company in companies if company]
+    branches = [query.where(Sale.company.in_(named))] if named else []
+    if '' in companies:
+        branches.append(query.where(Sale.company.is_(None)))
+    return union_all(*branches) if len(branches) > 1 else branches[0]
+
+
+def refresh_task_sketches(db: Session, task_name: str, cells: Set[Tuple[str, str]] = None) -> int:
+    """Rebuild a task's sketches, or only its (company, month) cells given, from its sales.
+
+    Sales are read in batches, so memory is bounded by the batch and the number of
+    cells rather than the task size. Runs inside the caller's transaction and
+    returns the number of cells written.
+    """
+    if cells is not None and not cells:
+        return 0
+    companies = None if cells is None else {company for company, _ in cells}
+    result = db.execute(sketch_query(task_name, companies), execution_options={'yield_per': BATCH_ROWS})
+
+    built: Dict[Tuple[str, str], List[dict]] = {}
+    for batch in result.partitions():
+        frame = pd.DataFrame(batch, columns=['company', 'month', 'car_model', 'sales_location', 'price'])
+        frame['company'] = frame['company'].fillna('')
+        for row in _cell_rows(task_name, frame):
+            key = (row['company'], row['month'])
+            if cells is None or key in cells:
+                built.setdefault(key, []).append(row)
+
+    stmt = delete(TaskSketch).where(TaskSketch.task_name == task_name)
+    if cells is not None:
+        stmt = stmt.where(tuple_(TaskSketch.company, TaskSketch.month).in_(list(cells)))
+    db.execute(stmt)
+    if built:
+        db.execute(insert(TaskSketch), [_merge_rows(rows) for rows in built.values()])
+    logger.debug(f"Refreshed {len(built)} sketch cells for task {task_name}")
+    return len(built)
+
+
+def rebuild_sketches(db: Session, task_names: List[str] = None) -> List[str]:
+    """Rebuild sketches for the given tasks, or for every task in the sales table"""
+    if not task_names:
+        task_names = [row.task_name for row in db.query(Sale.task_name).distinct()]
+
+    for task_name in task_names:
+        refresh_task_sketches(db, task_name)
+    return task_names
+
+
+def cells_query(task_name: str, companies: List[str] = None, start_month: str = None, end_month: str = None):
+    query = select(TaskSketch).where(TaskSketch.task_name == task_name)
+    if companies:
+        query = query.where(TaskSketch.company.in_(companies))
+    if start_month:
+        query = query.where(TaskSketch.month >= start_month)
+    if end_month:
+        query = query.where(TaskSketch.month <= end_month)
+    return query
+
+
+def load_cells(
+    db: Session,
+    task_name: str,
+    companies: List[str] = None,
+    start_month: str = None,
+    end_month: str = None
+) -> List[TaskSketch]:
+    """A task's sketch cells, optionally limited to some companies and an inclusive month range"""
+    return db.scalars(cells_query(task_name, companies, start_month, end_month)).all()
+
+
+def quantile_label(q: float) -> str:
+    return f"p{q * 100:g}"
+
+
+def describe(cells: List[TaskSketch], quantiles: Iterable[float] = DEFAULT_QUANTILES) -> dict:
+    """Price quantiles and distinct model and location counts over any set of cells, merged from their sketches"""
+    digest = TDigest.merge(TDigest.from_bytes(cell.price_digest) for cell in cells if cell.price_digest)
+    quantiles = list(quantiles)
+    values = digest.quantiles(quantiles) if digest is not None else [None] * len(quantiles)
+    return {
+        'price_quantiles': {
+            quantile_label(q): round(value, 2) if value is not None else None for q, value in zip(quantiles, values)
+        },
+        'distinct_models': HyperLogLog.merge(HyperLogLog.from_bytes(cell.model_hll) for cell in cells).estimate(),
+        'distinct_locations': HyperLogLog.merge(HyperLogLog.from_bytes(cell.location_hll) for cell in cells).estimate()
+    }
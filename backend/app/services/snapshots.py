@@ -0,0 +1,234 @@
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from app import config, partitions
+from app.models import Sale
+from app.services import catalog
+from app.services.filters import compile_filters
+from app.services.queries import DATE_GRANULARITIES, QueryError, validate_query
+
+logger = logging.getLogger(__name__)
+
+# Low-cardinality text columns stored dictionary-encoded
+DICTIONARY_COLUMNS = ('company', 'car_model', 'sales_location')
+
+VERSION_KEY = b'data_version'
+
+
+def enabled() -> bool:
+    return config.COLUMNAR_SNAPSHOTS
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('sale_id', pa.string()),
+        ('company', pa.dictionary(pa.int32(), pa.string())),
+        ('car_model', pa.dictionary(pa.int32(), pa.string())),
+        ('manufacturing_year', pa.int32()),
+        ('price', pa.float64()),
+        ('sales_location', pa.dictionary(pa.int32(), pa.string())),
+        ('date_of_sale', pa.date32())
+    ])
+
+
+def snapshot_path(task_name: str) -> str:
+    digest = hashlib.sha1(task_name.encode('utf-8')).hexdigest()
+    return os.path.join(config.SNAPSHOT_DIR, f"{digest}.arrow")
+
+
+def _dictionary_array(values: list, categories: pd.Index):
+    """Dictionary-encode values against the categories seen so far, growing them in place of a replacement"""
+    import pyarrow as pa
+
+    new_values = pd.Index(pd.unique(pd.Series(values, dtype=object).dropna())).difference(categories, sort=False)
+    categories = categories.append(new_values) if len(new_values) else categories
+    codes = pd.Categorical(values, categories=categories).codes
+    indices = pa.array(codes, type=pa.int32(), mask=codes < 0)
+    return pa.DictionaryArray.from_arrays(indices, pa.array(categories, type=pa.string())), categories
+
+
+def write_snapshot(task_name: str, batch_size: int = 100000) -> Optional[str]:
+    """Write a task's committed sales to an Arrow IPC file tagged with its data version"""
+    import pyarrow as pa
+
+    schema = _schema()
+    path = snapshot_path(task_name)
+    os.makedirs(config.SNAPSHOT_DIR, exist_ok=True)
+
+    db = partitions.open_session(task_name)
+    try:
+        # One read transaction, so the rows and the version tag come from the same snapshot
+        version = catalog.get_task_version(db, task_name)
+        if not version:
+            return None
+
+        fd, tmp_path = tempfile.mkstemp(dir=config.SNAPSHOT_DIR, suffix='.tmp')
+        os.close(fd)
+        try:
+            options = pa.ipc.IpcWriteOptions(
+                compression=None if config.SNAPSHOT_COMPRESSION == 'uncompressed' else config.SNAPSHOT_COMPRESSION,
+                emit_dictionary_deltas=True
+            )
+            schema = schema.with_metadata({VERSION_KEY: version.encode('utf-8')})
+            categories = {name: pd.Index([], dtype=object) for name in DICTIONARY_COLUMNS}
+            query = select(*(getattr(Sale, field.name) for field in schema)).where(
+                Sale.task_name == task_name
+            ).order_by(Sale.sale_id)
+            rows = 0
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, schema, options=options) as writer:
+                result = db.execute(query, execution_options={'yield_per': batch_size})
+                for partition in result.partitions():
+                    arrays = []
+                    for field, values in zip(schema, zip(*partition)):
+                        if field.name in DICTIONARY_COLUMNS:
+                            array, categories[field.name] = _dictionary_array(values, categories[field.name])
+                            arrays.append(array)
+                        else:
+                            arrays.append(pa.array(values, type=field.type))
+                    writer.write_batch(pa.record_batch(arrays, schema=schema))
+                    rows += len(partition)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    finally:
+        db.close()
+
+    logger.info(f"Wrote columnar snapshot of task {task_name} with {rows} rows")
+    return path
+
+
+def refresh_snapshot(task_name: str) -> None:
+    """Rewrite a task's snapshot after a write, when snapshots are enabled; failures only log"""
+    if not enabled():
+        return
+    try:
+        write_snapshot(task_name)
+    except Exception as e:
+        logger.error(f"Error writing snapshot for task {task_name}: {str(e)}")
+
+
+def remove_snapshot(task_name: str) -> None:
+    try:
+        os.remove(snapshot_path(task_name))
+    except FileNotFoundError:
+        pass
+
+
+def read_columns(task_name: str, version: str, columns: List[str]) -> Optional[pd.DataFrame]:
+    """Read only the given columns of a current snapshot through a memory map, None if missing or stale"""
+    import pyarrow as pa
+
+    path = snapshot_path(task_name)
+    if not os.path.exists(path):
+        return None
+
+    # Buffers of uncompressed columns point into the map, which stays open while they are referenced
+    source = pa.memory_map(path)
+    schema = pa.ipc.open_file(source).schema
+    if (schema.metadata or {}).get(VERSION_KEY) != version.encode('utf-8'):
+        return None
+    options = pa.ipc.IpcReadOptions(
+        included_fields=[schema.get_field_index(column) for column in columns]
+    )
+    table = pa.ipc.open_file(source, options=options).read_all()
+    return table.to_pandas(date_as_object=False)
+
+
+def date_bucket(dates: pd.Series, granularity: str) -> pd.Categorical:
+    """Date bucket labels matching queries.date_bucket, formatted once per distinct bucket"""
+    # Missing dates fall on today, as in the rollups
+    days = dates.fillna(pd.Timestamp(datetime.utcnow().date())).to_numpy().astype('datetime64[D]')
+    if granularity == 'day':
+        keys, fmt = days, lambda key: str(key)
+    elif granularity == 'week':
+        # Day 0 was a Thursday, so (day + 3) % 7 is days since Monday
+        keys = days - (days.astype('int64') + 3) % 7
+        fmt = lambda key: str(key)
+    elif granularity == 'month':
+        keys, fmt = days.astype('datetime64[M]'), lambda key: str(key)
+    elif granularity == 'quarter':
+        months = days.astype('datetime64[M]').astype('int64')
+        keys = months - months % 3
+        fmt = lambda key: f"{1970 + key // 12}-Q{key % 12 // 3 + 1}"
+    elif granularity == 'year':
+        keys, fmt = days.astype('datetime64[Y]'), lambda key: str(key)
+    else:
+        raise QueryError(f"Invalid granularity '{granularity}', expected one of {', '.join(DATE_GRANULARITIES)}")
+
+    uniques, codes = np.unique(keys, return_inverse=True)
+    return pd.Categorical.from_codes(codes, [fmt(key) for key in uniques])
+
+
+def run_query(
+    task_name: str,
+    version: str,
+    dimensions: List[str],
+    measures: List[str],
+    filters=None,
+    max_cells: int = None
+) -> Optional[dict]:
+    """queries.run_query over the task's snapshot, None when there is no current snapshot"""
+    validate_query(dimensions, measures)
+    source_filter = compile_filters(filters)
+    granularities = {
+        name: name[len('sale_'):] for name in dimensions
+        if name.startswith('sale_') and name[len('sale_'):] in DATE_GRANULARITIES
+    }
+
+    columns = {'price'} | {name for name in dimensions if name not in granularities}
+    columns |= {condition.column for condition in source_filter.conditions}
+    if granularities:
+        columns.add('date_of_sale')
+    df = read_columns(task_name, version, sorted(columns))
+    if df is None:
+        return None
+
+    if source_filter:
+        df = source_filter.apply(df)
+    for name, granularity in granularities.items():
+        df[name] = date_bucket(df['date_of_sale'], granularity)
+    for name in dimensions:
+        if isinstance(df[name].dtype, pd.CategoricalDtype) and name not in granularities:
+            # Dictionaries are in first-seen order, cells are ordered by value like SQL
+            df[name] = df[name].cat.reorder_categories(sorted(df[name].cat.categories))
+
+    if dimensions:
+        grouped = df.groupby(dimensions, observed=True, dropna=False, sort=True)['price']
+        cells = pd.DataFrame({'count': grouped.size(), 'sum_price': grouped.sum(min_count=0)})
+        cells['min_price'], cells['max_price'] = grouped.min(), grouped.max()
+        cells = cells.reset_index()
+        # SQLite orders missing keys first
+        cells = cells.sort_values(dimensions, na_position='first', kind='stable')
+    else:
+        prices = df['price']
+        cells = pd.DataFrame({
+            'count': [len(prices)], 'sum_price': [prices.sum(min_count=0)],
+            'min_price': [prices.min()], 'max_price': [prices.max()]
+        })
+    cells['avg_price'] = cells['sum_price'] / cells['count']
+
+    truncated = bool(max_cells) and len(cells) > max_cells
+    if truncated:
+        cells = cells.head(max_cells)
+
+    records = cells[dimensions + measures].astype(object).where(cells[dimensions + measures].notna(), None)
+    result = []
+    for cell in records.to_dict('records'):
+        for name in ('sum_price', 'avg_price'):
+            if cell.get(name) is not None:
+                cell[name] = round(cell[name], 2)
+        if cell.get('manufacturing_year') is not None:
+            cell['manufacturing_year'] = int(cell['manufacturing_year'])
+        result.append(cell)
+    return {'cells': result, 'truncated': truncated}
@@ -0,0 +1,239 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+from app import config, metrics
+from app.services import readers
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever normalisation changes, so older entries are no longer matched
+FORMAT_VERSION = 2
+
+MANIFEST = 'manifest.json'
+
+_evict_lock = threading.Lock()
+
+
+class CachedSource(io.RawIOBase):
+    """Stands in for a URL source the server reported unchanged, whose normalised chunks are cached"""
+
+    def __init__(self, url: str, digest: str, content_type: str = None):
+        super().__init__()
+        self.url = url
+        self.content_hash = digest
+        self.content_type = content_type
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        # Only reached when the entry was evicted between the fetch and the ingest;
+        # forgetting the URL makes the next fetch download it in full
+        forget_url(self.url)
+        raise OSError("Cached copy of the source was evicted, fetch it again")
+
+    def tell(self) -> int:
+        # Not seekable, so readers read it straight through without rewinding
+        return 0
+
+
+def enabled() -> bool:
+    return config.SOURCE_CACHE
+
+
+def cache_key(digest: str, name: str, content_type: str = None) -> str:
+    """Key of a source's normalised chunks: its content hash and the format it is parsed as"""
+    return f"v{FORMAT_VERSION}-{digest}{readers.source_format(name, content_type)}"
+
+
+def _entry_dir(key: str) -> str:
+    return os.path.join(config.SOURCE_CACHE_DIR, 'entries', key)
+
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Stringify non-text values in text columns, which Arrow cannot hold mixed.
+
+    The sales table stores these columns as TEXT, so the written values are unchanged.
+    """
+    df = df.copy(deep=False)
+    for col in df.columns:
+        series = df[col]
+        categorical = isinstance(series.dtype, pd.CategoricalDtype)
+        if not categorical and series.dtype != object:
+            continue
+        values = series.cat.categories if categorical else series
+        if pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+            continue
+        text = series.astype(object).map(lambda value: value if pd.isna(value) else str(value))
+        df[col] = text.astype('category') if categorical else text
+    return df
+
+
+def write_part(df: pd.DataFrame, path: str) -> None:
+    """Write a chunk of normalised sales to an uncompressed Arrow IPC file"""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(_arrow_safe(df), preserve_index=False)
+    with pa.ipc.new_file(path, table.schema) as writer:
+        writer.write_table(table)
+
+
+def read_part(path: str) -> pd.DataFrame:
+    """Load a chunk written by write_part, its buffers are mapped rather than read"""
+    import pyarrow as pa
+
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def lookup(key: str) -> Optional[dict]:
+    """The manifest of a cached source, with the paths of its parts, or None on a miss.
+
+    A hit marks the entry as recently used.
+    """
+    directory = _entry_dir(key)
+    manifest_path = os.path.join(directory, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            entry = json.load(f)
+        os.utime(manifest_path)
+    except (OSError, ValueError):
+        metrics.CACHE_REQUESTS.inc(cache='source', result='miss')
+        return None
+    metrics.CACHE_REQUESTS.inc(cache='source', result='hit')
+    entry['parts'] = [os.path.join(directory, part) for part in entry['parts']]
+    return entry
+
+
+def iter_entry(entry: dict) -> Iterator[pd.DataFrame]:
+    """The normalised chunks of a cached source, in the order they were parsed"""
+    for path in entry['parts']:
+        yield read_part(path)
+
+
+def staging_dir() -> str:
+    """A fresh directory for parts about to be stored, on the same filesystem as the entries"""
+    directory = os.path.join(config.SOURCE_CACHE_DIR, 'staging')
+    os.makedirs(directory, exist_ok=True)
+    return tempfile.mkdtemp(dir=directory)
+
+
+def store(key: str, paths: List[str], columns: List[str], memory_bytes: int) -> None:
+    """Move a source's part files into the cache under key, then evict down to the disk budget.
+
+    The parts are moved, not copied, so the caller no longer owns them. Failures are
+    logged rather than raised, a source that could not be cached is simply parsed again.
+    """
+    staging = None
+    try:
+        staging = staging_dir()
+        parts = []
+        for number, path in enumerate(paths):
+            parts.append(f"{number}.arrow")
+            shutil.move(path, os.path.join(staging, parts[-1]))
+        size = sum(os.path.getsize(os.path.join(staging, part)) for part in parts)
+        if size > config.SOURCE_CACHE_MAX_BYTES:
+            logger.info(f"Not caching source {key}, its {size} bytes exceed the cache budget")
+            return
+
+        with open(os.path.join(staging, MANIFEST), 'w') as f:
+            json.dump({'parts': parts, 'columns': columns, 'memory_bytes': memory_bytes, 'bytes': size}, f)
+        os.makedirs(os.path.dirname(_entry_dir(key)), exist_ok=True)
+        try:
+            os.rename(staging, _entry_dir(key))
+            staging = None
+        except OSError:
+            # Another ingest cached the same source first
+            return
+        logger.debug(f"Cached normalised source {key} ({size} bytes)")
+        evict()
+    except Exception as e:
+        logger.warning(f"Could not cache source {key}: {str(e)}")
+    finally:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        if staging:
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def evict(max_bytes: int = None) -> int:
+    """Remove least recently used entries until the cache fits max_bytes, returning how many went"""
+    max_bytes = config.SOURCE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    root = os.path.join(config.SOURCE_CACHE_DIR, 'entries')
+    with _evict_lock:
+        entries = []
+        for key in os.listdir(root) if os.path.isdir(root) else []:
+            manifest_path = os.path.join(root, key, MANIFEST)
+            try:
+                with open(manifest_path) as f:
+                    size = json.load(f)['bytes']
+                entries.append((os.path.getmtime(manifest_path), size, key))
+            except (OSError, ValueError, KeyError):
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, key in sorted(entries):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(os.path.join(root, key), ignore_errors=True)
+            total -= size
+            evicted += 1
+    if evicted:
+        logger.info(f"Evicted {evicted} cached sources, {total} bytes remain")
+    return evicted
+
+
+def _url_path(url: str) -> str:
+    return os.path.join(config.SOURCE_CACHE_DIR, 'urls', hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+
+def cached_url(url: str) -> Optional[dict]:
+    """Validators and content hash of a URL's last download, when its normalised chunks are still cached"""
+    try:
+        with open(_url_path(url)) as f:
+            validators = json.load(f)
+        key = cache_key(validators['content_hash'], url, validators.get('content_type'))
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(os.path.join(_entry_dir(key), MANIFEST)):
+        return None
+    return validators
+
+
+def remember_url(
+    url: str,
+    digest: str,
+    etag: Optional[str],
+    last_modified: Optional[str],
+    content_type: Optional[str] = None
+) -> None:
+    """Keep a downloaded URL's validators, for a conditional GET the next time it is fetched"""
+    path = _url_path(url)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({
+                'content_hash': digest, 'etag': etag, 'last_modified': last_modified, 'content_type': content_type
+            }, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not remember validators of {url}: {str(e)}")
+
+
+def forget_url(url: str) -> None:
+    try:
+        os.remove(_url_path(url))
+    except OSError:
+        pass
@@ -0,0 +1,53 @@
+import hashlib
+from datetime import datetime
+from typing import BinaryIO, List, Set
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app import metrics
+from app.models import TaskSource
+from app.services.source_cache import CachedSource
+
+# Bytes hashed per read
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def content_hash(fileobj: BinaryIO) -> str:
+    """SHA-256 of a source's bytes, leaving the file positioned at its start"""
+    if isinstance(fileobj, CachedSource):
+        return fileobj.content_hash
+    digest = hashlib.sha256()
+    size = 0
+    with metrics.INGEST_STAGE_SECONDS.time(stage='hash'):
+        fileobj.seek(0)
+        for block in iter(lambda: fileobj.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+            size += len(block)
+        fileobj.seek(0)
+    metrics.INGEST_BYTES_READ.inc(size)
+    return digest.hexdigest()
+
+
+def ingested_hashes(db: Session, task_name: str) -> Set[str]:
+    """Content hashes of every source already ingested into a task"""
+    return set(db.scalars(select(TaskSource.content_hash).where(TaskSource.task_name == task_name)))
+
+
+def record_sources(db: Session, task_name: str, source_metadata: List[dict]) -> None:
+    """Remember the content hash of each ingested source, within the caller's transaction"""
+    now = datetime.utcnow()
+    rows = [
+        {
+            'task_name': task_name,
+            'content_hash': metadata['content_hash'],
+            'source_name': metadata['name'],
+            'records': metadata['records'],
+            'ingested_at': now
+        }
+        for metadata in source_metadata
+        if metadata.get('content_hash') and not metadata.get('skipped')
+    ]
+    if rows:
+        db.execute(insert(TaskSource).on_conflict_do_nothing(), rows)
@@ -0,0 +1,120 @@
+from datetime import date
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models import Sale
+from app.services.filters import compile_filters
+from app.services.queries import QueryError, date_bucket, measure_expression
+from app.services.rollups import sale_date
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+SERIES_MEASURES = ('count', 'sum_price', 'avg_price', 'min_price', 'max_price')
+
+
+def series_query(
+    task_name: str,
+    granularity: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    filters=None
+):
+    """One row per date bucket with every measure and the bucket's first sale date, in date order"""
+    bucket = date_bucket(granularity).label('bucket')
+    query = select(
+        bucket,
+        func.min(sale_date()).label('first_date'),
+        *(measure_expression(name).label(name) for name in SERIES_MEASURES)
+    ).where(Sale.task_name == task_name, compile_filters(filters).where(Sale))
+
+    # Range on the stored column so the (task_name, date_of_sale) index is used
+    if start is not None:
+        query = query.where(Sale.date_of_sale >= start)
+    if end is not None:
+        query = query.where(Sale.date_of_sale <= end)
+    return query.group_by(bucket).order_by(bucket)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # First and last points are always kept, the rest are split into threshold - 2 buckets
+    edges = np.append(np.linspace(1, n - 1, threshold - 1).astype(int), n)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_x = x[edges[i + 1]:edges[i + 2]].mean()
+        next_y = y[edges[i + 1]:edges[i + 2]].mean()
+        # Twice the triangle area between the last kept point, each candidate and the next bucket's mean
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the lowest and highest point in each of threshold // 2 equal-width bins"""
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+
+    bins = np.arange(n) * (threshold // 2) // n
+    order = np.lexsort((y, bins))
+    sorted_bins = bins[order]
+    first = np.flatnonzero(np.r_[True, sorted_bins[1:] != sorted_bins[:-1]])
+    last = np.r_[first[1:] - 1, n - 1]
+    return np.unique(np.concatenate([order[first], order[last]]))
+
+
+def get_series(
+    db: Session,
+    task_name: str,
+    granularity: str = 'month',
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    filters=None,
+    max_points: Optional[int] = None,
+    measure: str = 'avg_price',
+    downsample: str = 'lttb'
+) -> dict:
+    """Get a task's sales bucketed by date, downsampled to max_points on the given measure"""
+    if measure not in SERIES_MEASURES:
+        raise QueryError(f"Invalid measure '{measure}', expected one of {', '.join(SERIES_MEASURES)}")
+    if downsample not in DOWNSAMPLE_METHODS:
+        raise QueryError(f"Invalid downsample method '{downsample}', expected one of {', '.join(DOWNSAMPLE_METHODS)}")
+
+    rows = db.execute(series_query(task_name, granularity, start, end, filters)).all()
+    points = []
+    for row in rows:
+        point = {'bucket': row.bucket}
+        for name in SERIES_MEASURES:
+            value = getattr(row, name)
+            point[name] = round(value, 2) if name in ('sum_price', 'avg_price') and value is not None else value
+        points.append(point)
+
+    downsampled = bool(max_points) and len(points) > max_points
+    if downsampled:
+        y = np.array([getattr(row, measure) for row in rows], dtype=float)
+        y = np.nan_to_num(y, nan=0.0)
+        if downsample == 'lttb':
+            x = np.array([row.first_date for row in rows], dtype='datetime64[D]').astype(float)
+            keep = lttb(x, y, max_points)
+        else:
+            keep = minmax(y, max_points)
+        points = [points[i] for i in keep]
+
+    return {
+        'granularity': granularity,
+        'measure': measure,
+        'buckets': len(rows),
+        'downsampled': downsampled,
+        'points': points
+    }
@@ -0,0 +1,134 @@
+"""Benchmark: compiled source filters against the original apply_filters.
+
+Builds a normalised sales frame in memory and times the original
+copy-then-slice-per-key filter, the compiled filter on the same frame and
+the compiled filter on a frame with categorical text columns. Prints
+seconds per filter as JSON.
+
+    python benchmarks/filters.py --rows 10000000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.filters import compile_filters  # noqa: E402
+
+COMPANIES = ['Toyota', 'Honda', 'Ford', 'BMW', 'Audi', 'Kia', 'Tesla', 'Volvo']
+MODELS = [f"Model {i}" for i in range(40)]
+LOCATIONS = ['San Jose', 'San Diego', 'Seattle', 'Austin', 'Boston', 'Denver']
+
+
+def original_apply_filters(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
+    """apply_filters as it was before compiled filters"""
+    filtered_df = df.copy()
+    if filters.get('priceRange'):
+        min_price = filters['priceRange']['min']
+        max_price = filters['priceRange']['max']
+        filtered_df = filtered_df[
+            (filtered_df['price'] >= min_price) &
+            (filtered_df['price'] <= max_price)
+        ]
+    if filters.get('model'):
+        filtered_df = filtered_df[filtered_df['car_model'] == filters['model']]
+    if filters.get('yearRange'):
+        min_year = filters['yearRange']['min']
+        max_year = filters['yearRange']['max']
+        filtered_df = filtered_df[
+            (filtered_df['manufacturing_year'] >= min_year) &
+            (filtered_df['manufacturing_year'] <= max_year)
+        ]
+    if filters.get('company'):
+        filtered_df = filtered_df[filtered_df['company'] == filters['company']]
+    if filters.get('location'):
+        filtered_df = filtered_df[filtered_df['sales_location'] == filters['location']]
+    return filtered_df
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+
+    def text(values):
+        # Shared string objects, as produced by parsing a source with repeated values
+        return pd.Categorical.from_codes(rng.integers(0, len(values), rows), values).astype(object)
+
+    return pd.DataFrame({
+        'sale_id': pd.RangeIndex(rows).astype(str),
+        'company': text(COMPANIES),
+        'car_model': text(MODELS),
+        'manufacturing_year': rng.integers(2005, 2025, rows),
+        'price': rng.uniform(5000, 150000, rows).round(2),
+        'sales_location': text(LOCATIONS),
+        'date_of_sale': pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 1095, rows), unit='D')
+    })
+
+
+def best_of(repeat: int, fn) -> tuple:
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return round(min(times), 4), result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compiled filter benchmark")
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    categorical = df.astype({column: 'category' for column in ('company', 'car_model', 'sales_location')})
+
+    legacy_cases = {
+        'price_range': {'priceRange': {'min': 20000, 'max': 80000}},
+        'company': {'company': 'Toyota'},
+        'all_keys': {
+            'priceRange': {'min': 20000, 'max': 80000}, 'yearRange': {'min': 2010, 'max': 2020},
+            'model': 'Model 7', 'company': 'Toyota', 'location': 'Seattle'
+        }
+    }
+    text_cases = {
+        'in_and_range': 'company in Toyota|Honda|Kia, price >= 20000 < 80000',
+        'not_in': 'sales_location not in Seattle|Austin',
+        'prefix': 'sales_location ^= San',
+        'regex': 'car_model ~ ^Model [1-3]$',
+        'date_range': 'date >= 2023-01-01 < 2023-07-01'
+    }
+
+    results = {'rows': args.rows, 'seconds': {}}
+    for name, spec in legacy_cases.items():
+        original, expected = best_of(args.repeat, lambda: original_apply_filters(df, spec))
+        source_filter = compile_filters(spec)
+        compiled, actual = best_of(args.repeat, lambda: source_filter.apply(df))
+        compiled_categorical, _ = best_of(args.repeat, lambda: source_filter.apply(categorical))
+        assert len(actual) == len(expected)
+        results['seconds'][name] = {
+            'original': original,
+            'compiled': compiled,
+            'compiled_categorical': compiled_categorical,
+            'matched': len(actual)
+        }
+    for name, spec in text_cases.items():
+        source_filter = compile_filters(spec)
+        compiled, actual = best_of(args.repeat, lambda: source_filter.apply(df))
+        compiled_categorical, _ = best_of(args.repeat, lambda: source_filter.apply(categorical))
+        results['seconds'][name] = {
+            'compiled': compiled,
+            'compiled_categorical': compiled_categorical,
+            'matched': len(actual)
+        }
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,135 @@
+"""Synthetic dealer feeds in the schemas of frontend/dealer1.csv and dealer2.json.
+
+Writes CSV or JSON feeds of any size in bounded memory, with the field
+spellings dealers actually send (saleId, dateOfSale, Sale ID, ...) and
+controllable cardinality of companies, models, locations and sale dates.
+The same seed always produces the same feed.
+
+    python benchmarks/generate_data.py feed.csv --rows 1000000 --spelling camel
+    python benchmarks/generate_data.py feed.json --rows 100000 --companies 8 --models 40
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Column names per spelling, in the order the sample feeds use
+SPELLINGS = {
+    'snake': ['sale_id', 'company', 'car_model', 'manufacturing_year', 'date_of_sale', 'price', 'sales_location'],
+    # As in the sample feeds: camelCase except company and car_model
+    'camel': ['saleId', 'company', 'car_model', 'manufacturingYear', 'dateOfSale', 'price', 'salesLocation'],
+    'title': ['Sale ID', 'Company', 'Car Model', 'Manufacturing Year', 'Date of Sale', 'Price', 'Sales Location'],
+    'lower': ['saleid', 'company', 'car_model', 'manufacturingyear', 'saledate', 'price', 'saleslocation'],
+    'short': ['SaleId', 'Company', 'Car_Model', 'ManufacturingYear', 'Date', 'Price', 'SalesLocation']
+}
+
+COMPANIES = [
+    'Toyota', 'Honda', 'Ford', 'BMW', 'Audi', 'Tesla', 'Kia', 'Hyundai', 'Volvo', 'Mazda',
+    'Subaru', 'Lexus', 'Nissan', 'Porsche', 'Jeep', 'Chevrolet', 'Genesis', 'Rivian'
+]
+LOCATIONS = [
+    'San Diego', 'Houston', 'Dallas', 'Washington DC', 'Seattle', 'Boston', 'Austin',
+    'Denver', 'Chicago', 'Miami', 'Phoenix', 'San Jose', 'Atlanta', 'Portland'
+]
+
+
+def _names(pool: list, count: int, prefix: str) -> np.ndarray:
+    """count distinct names, from pool first and then numbered"""
+    return np.array(pool[:count] + [f"{prefix} {i}" for i in range(len(pool), count)], dtype=object)
+
+
+def generate_chunks(
+    rows: int,
+    seed: int = 0,
+    companies: int = 10,
+    models: int = 50,
+    locations: int = 12,
+    days: int = 730,
+    start_date: str = '2023-01-01',
+    id_prefix: str = 'SA',
+    duplicate_fraction: float = 0.0,
+    chunk_rows: int = 100000
+):
+    """Yield DataFrames of synthetic sales with snake_case columns, chunk_rows at a time.
+
+    Models belong to a company, so a model name always comes with the same make.
+    duplicate_fraction of the rows reuse an earlier sale id, to exercise duplicate handling.
+    """
+    rng = np.random.default_rng(seed)
+    company_names = _names(COMPANIES, companies, 'Make')
+    location_names = _names(LOCATIONS, locations, 'Location')
+    model_company = rng.integers(0, companies, models)
+    model_names = np.array([f"{company_names[c]} M{i}" for i, c in enumerate(model_company)], dtype=object)
+    start = np.datetime64(start_date)
+
+    for offset in range(0, rows, chunk_rows):
+        n = min(chunk_rows, rows - offset)
+        ids = np.arange(offset, offset + n)
+        if duplicate_fraction > 0 and offset + n > 1:
+            repeat = rng.random(n) < duplicate_fraction
+            ids[repeat] = rng.integers(0, np.maximum(ids[repeat], 1))
+        model = rng.integers(0, models, n)
+        yield pd.DataFrame({
+            'sale_id': f"{id_prefix}-" + pd.Series(ids + 10001).astype(str),
+            'company': company_names[model_company[model]],
+            'car_model': model_names[model],
+            'manufacturing_year': rng.integers(2005, 2025, n),
+            'date_of_sale': (start + rng.integers(0, days, n)).astype(str),
+            'price': rng.integers(5000, 200000, n),
+            'sales_location': location_names[rng.integers(0, locations, n)]
+        })
+
+
+def write_feed(path: str, rows: int, spelling: str = 'camel', **options) -> int:
+    """Write a CSV or JSON feed (chosen by extension) and return its size in bytes.
+
+    JSON feeds are a single top-level array, like dealer2.json, streamed out chunk by chunk.
+    """
+    fmt = os.path.splitext(path)[1].lower()
+    if fmt not in ('.csv', '.json'):
+        raise ValueError(f"Unsupported feed format: {fmt}")
+    columns = dict(zip(SPELLINGS['snake'], SPELLINGS[spelling]))
+
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if fmt == '.json':
+            f.write('[')
+        for number, chunk in enumerate(generate_chunks(rows, **options)):
+            chunk = chunk.rename(columns=columns)
+            if fmt == '.csv':
+                chunk.to_csv(f, index=False, header=number == 0)
+            else:
+                records = chunk.to_json(orient='records', indent=None)[1:-1]
+                f.write((',\n' if number else '\n') + records.replace('},{', '},\n{'))
+        if fmt == '.json':
+            f.write('\n]\n')
+    return os.path.getsize(path)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Synthetic dealer feed generator")
+    parser.add_argument('path', help="Output file, .csv or .json")
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--spelling', choices=sorted(SPELLINGS), default='camel', help="Field name spelling")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--companies', type=int, default=10, help="Distinct companies")
+    parser.add_argument('--models', type=int, default=50, help="Distinct car models")
+    parser.add_argument('--locations', type=int, default=12, help="Distinct sales locations")
+    parser.add_argument('--days', type=int, default=730, help="Distinct sale dates, from --start-date")
+    parser.add_argument('--start-date', default='2023-01-01')
+    parser.add_argument('--id-prefix', default='SA', help="Sale id prefix, distinct per dealer avoids collisions")
+    parser.add_argument('--duplicate-fraction', type=float, default=0.0, help="Share of rows reusing a sale id")
+    args = parser.parse_args()
+
+    size = write_feed(
+        args.path, args.rows, args.spelling, seed=args.seed, companies=args.companies,
+        models=args.models, locations=args.locations, days=args.days, start_date=args.start_date,
+        id_prefix=args.id_prefix, duplicate_fraction=args.duplicate_fraction
+    )
+    print(json.dumps({'path': args.path, 'rows': args.rows, 'bytes': size}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,118 @@
+"""Benchmark: serial against worker-process ingestion of several CSV sources.
+
+Writes synthetic dealer CSV files, then ingests them into a scratch
+database with INGEST_WORKERS set to each given count (0 is the serial
+path). Also times the worker stage alone, parsing into Arrow chunks
+without writing, since the single writer bounds the end-to-end rate.
+Prints seconds and rows/sec per worker count as JSON.
+
+    python benchmarks/parallel_ingest.py --sources 8 --rows 250000 --workers 0 1 2 4
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_source(path: str, rows: int, seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        'Sale ID': [f"D{seed}-{i}" for i in range(rows)],
+        'Company': rng.choice(['Toyota', 'Honda', 'Ford', 'BMW', 'Audi', 'Kia'], rows),
+        'Car Model': rng.choice([f"Model {i}" for i in range(40)], rows),
+        'Manufacturing Year': rng.integers(2005, 2025, rows),
+        'Price': rng.uniform(5000, 120000, rows).round(2),
+        'Sales Location': rng.choice(['San Jose', 'Seattle', 'Austin', 'Boston'], rows),
+        'Date of Sale': (np.datetime64('2021-01-01') + rng.integers(0, 1095, rows)).astype(str)
+    }).to_csv(path, index=False)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Parallel ingestion benchmark")
+    parser.add_argument('--sources', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=250000, help="Rows per source")
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-ingest-')
+    try:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        os.environ['TASK_PARTITION_DIR'] = os.path.join(workdir, 'partitions')
+        sys.path.insert(0, BACKEND_DIR)
+
+        from app import config, migrations, partitions
+        from app.services import ingest, parallel
+
+        migrations.migrate()
+        paths = []
+        for idx in range(args.sources):
+            paths.append(os.path.join(workdir, f"dealer{idx}.csv"))
+            write_source(paths[-1], args.rows, idx)
+        total_rows = args.sources * args.rows
+
+        results = []
+        for workers in args.workers:
+            config.INGEST_WORKERS = workers
+            parallel.shutdown()
+            entry = {'workers': workers}
+
+            if workers:
+                # Worker stage alone, after a warm-up that starts the processes
+                executor = parallel._get_executor()
+                list(executor.map(abs, range(workers)))
+                out_dir = tempfile.mkdtemp(dir=workdir)
+                start = time.perf_counter()
+                units = [unit for path in paths for unit in parallel._source_units(path, os.path.basename(path))]
+                futures = [
+                    executor.submit(parallel.process_unit, unit, 'file', {}, config.INGEST_CHUNK_SIZE,
+                                    os.path.join(out_dir, str(number)))
+                    for number, unit in enumerate(units)
+                ]
+                parsed = sum(future.result()['records'] for future in futures)
+                elapsed = time.perf_counter() - start
+                shutil.rmtree(out_dir)
+                entry['units'] = len(units)
+                entry['parse_seconds'] = round(elapsed, 2)
+                entry['parse_rows_per_sec'] = round(parsed / elapsed)
+
+            task_name = f"bench_{workers}"
+            files = [open(path, 'rb') for path in paths]
+            db = partitions.open_session(task_name, write=True, create=True)
+            try:
+                start = time.perf_counter()
+                result = ingest.ingest_sources(
+                    db, task_name, [(os.path.basename(path), 'file', f) for path, f in zip(paths, files)]
+                )
+                db.commit()
+                elapsed = time.perf_counter() - start
+            finally:
+                db.close()
+                for f in files:
+                    f.close()
+            assert result['total_records'] == total_rows
+            entry['ingest_seconds'] = round(elapsed, 2)
+            entry['ingest_rows_per_sec'] = round(total_rows / elapsed)
+            results.append(entry)
+        parallel.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps({
+        'sources': args.sources,
+        'rows_per_source': args.rows,
+        'cpus': os.cpu_count(),
+        'results': results
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,126 @@
+"""Load test: analytics read latency while a large report is being ingested.
+
+Runs the app in-process against a scratch database, measures read latency
+with no writes, then again while POST /generate-report ingests a large CSV,
+and prints p50/p99/max for both phases as JSON.
+
+    python benchmarks/read_latency.py --rows 500000 --readers 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_csv(path: str, rows: int) -> None:
+    rng = np.random.default_rng(0)
+    pd.DataFrame({
+        'sale_id': [f"S{i}" for i in range(rows)],
+        'company': rng.choice(['Toyota', 'Honda', 'Ford', 'BMW', 'Audi'], rows),
+        'car_model': rng.choice(['A', 'B', 'C', 'D'], rows),
+        'manufacturing_year': rng.integers(2010, 2025, rows),
+        'price': rng.uniform(5000, 150000, rows).round(2),
+        'sales_location': rng.choice(['North', 'South', 'East', 'West'], rows),
+        'date_of_sale': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 730, rows), unit='D')
+    }).to_csv(path, index=False)
+
+
+def summarise(latencies: list) -> dict:
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'p50_ms': round(statistics.median(ordered) * 1000, 2),
+        'p99_ms': round(ordered[int(len(ordered) * 0.99) - 1] * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2)
+    }
+
+
+async def read_until(client, stop: asyncio.Event, latencies: list) -> None:
+    paths = ['/tasks', '/tasks/baseline/analytics', '/tasks/baseline/sales?limit=100']
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get(paths[i % len(paths)])
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+        i += 1
+
+
+async def run(args, workdir: str) -> dict:
+    import httpx
+    import main
+
+    main.limiter.enabled = False
+    seed_csv = os.path.join(workdir, 'seed.csv')
+    big_csv = os.path.join(workdir, 'big.csv')
+    write_csv(seed_csv, 10000)
+    write_csv(big_csv, args.rows)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        async def post_report(task_name: str, path: str):
+            with open(path, 'rb') as f:
+                response = await client.post('/generate-report', data={
+                    'task_name': task_name, 'task_description': 'load test'
+                }, files=[('sources', (os.path.basename(path), f, 'text/csv'))])
+            assert response.status_code == 200, response.text
+            return response.json()
+
+        await post_report('baseline', seed_csv)
+
+        # Idle phase: reads only
+        idle, stop = [], asyncio.Event()
+        readers = [asyncio.create_task(read_until(client, stop, idle)) for _ in range(args.readers)]
+        await asyncio.sleep(args.idle_seconds)
+        stop.set()
+        await asyncio.gather(*readers)
+
+        # Ingest phase: the same reads while a large report is written
+        during, stop = [], asyncio.Event()
+        readers = [asyncio.create_task(read_until(client, stop, during)) for _ in range(args.readers)]
+        start = time.perf_counter()
+        report = await post_report('bulk', big_csv)
+        ingest_seconds = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*readers)
+
+    return {
+        'rows': args.rows,
+        'readers': args.readers,
+        'ingest_seconds': round(ingest_seconds, 2),
+        'rows_written': report['ingest']['rows_written'],
+        'idle': summarise(idle),
+        'during_ingest': summarise(during)
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Read latency during ingest")
+    parser.add_argument('--rows', type=int, default=500000, help="Rows in the ingested report")
+    parser.add_argument('--readers', type=int, default=8, help="Concurrent read loops")
+    parser.add_argument('--idle-seconds', type=float, default=5, help="Length of the read-only phase")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Scratch database and no response cache, so every read hits SQLite
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        os.environ['CACHE_MAX_ENTRIES'] = '0'
+        os.environ['JOB_SPOOL_DIR'] = os.path.join(workdir, 'job_spool')
+        sys.path.insert(0, BACKEND_DIR)
+
+        result = asyncio.run(run(args, workdir))
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,152 @@
+"""Benchmark: dimension queries over columnar snapshots against SQLite.
+
+Loads synthetic tasks into a scratch database, writes their Arrow
+snapshots with each compression and times the same dimension queries
+through SQLite and every snapshot. Prints load/snapshot times, file sizes,
+full column read times and seconds per query as JSON.
+
+    python benchmarks/snapshots.py --rows 1000000 10000000 --compression uncompressed lz4
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUERIES = {
+    'total': ([], ['count', 'sum_price', 'avg_price', 'min_price', 'max_price'], None),
+    'by_company': (['company'], ['count', 'avg_price'], None),
+    'company_by_month_filtered': (['company', 'sale_month'], ['count', 'sum_price'], 'price >= 20000 < 80000'),
+    'location_by_year_prefix': (['sales_location', 'manufacturing_year'], ['max_price'], 'location ^= San')
+}
+
+# Every column a snapshot holds, for the full read
+SNAPSHOT_COLUMNS = [
+    'company', 'car_model', 'manufacturing_year', 'price', 'sales_location', 'date_of_sale'
+]
+
+
+def load_task(db, task_name: str, rows: int, chunk_size: int = 500000) -> None:
+    """Insert synthetic sales into a partition session straight through the driver, bypassing parsing"""
+    rng = np.random.default_rng(0)
+    companies = np.array([f"Company {i}" for i in range(30)], dtype=object)
+    models = np.array([f"Model {i}" for i in range(300)], dtype=object)
+    locations = np.array(['San Jose', 'San Diego', 'Seattle', 'Austin', 'Boston', 'Denver'] * 5, dtype=object)
+    start = np.datetime64('2018-01-01')
+
+    # Within the session's write transaction, committed by the caller
+    cursor = db.connection().connection.driver_connection.cursor()
+    try:
+        for offset in range(0, rows, chunk_size):
+            n = min(chunk_size, rows - offset)
+            dates = (start + rng.integers(0, 2190, n)).astype(str)
+            cursor.executemany(
+                "INSERT INTO task.sales (task_name, sale_id, company, car_model, manufacturing_year, "
+                "price, sales_location, date_of_sale) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                zip(
+                    [task_name] * n, (f"S{i:09d}" for i in range(offset, offset + n)),
+                    companies[rng.integers(0, len(companies), n)], models[rng.integers(0, len(models), n)],
+                    rng.integers(2005, 2025, n).tolist(), rng.uniform(5000, 150000, n).round(2).tolist(),
+                    locations[rng.integers(0, len(locations), n)], dates
+                )
+            )
+    finally:
+        cursor.close()
+
+
+def best_of(repeat: int, fn) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return round(min(times), 4)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Columnar snapshot benchmark")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--compression', nargs='+', default=['uncompressed', 'lz4', 'zstd'], help="lz4, zstd or uncompressed"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'bench.db')
+        os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+        os.environ['SNAPSHOT_DIR'] = os.path.join(workdir, 'snapshots')
+        os.environ['TASK_PARTITION_DIR'] = os.path.join(workdir, 'partitions')
+        sys.path.insert(0, BACKEND_DIR)
+
+        from app import config, migrations, partitions
+        from app.services import catalog, queries, rollups, snapshots
+
+        migrations.migrate()
+        results = []
+        for rows in args.rows:
+            task_name = f"bench_{rows}"
+            start = time.perf_counter()
+            db = partitions.open_session(task_name, write=True, create=True)
+            load_task(db, task_name, rows)
+            rollups.rebuild_rollups(db, [task_name])
+            db.commit()
+            db.close()
+            load_seconds = time.perf_counter() - start
+
+            db = partitions.open_session(task_name)
+            version = catalog.get_task_version(db, task_name)
+            sqlite_timings = {
+                name: best_of(args.repeat, lambda: queries.run_query(db, task_name, dimensions, measures, filters))
+                for name, (dimensions, measures, filters) in QUERIES.items()
+            }
+            cells = {
+                name: len(queries.run_query(db, task_name, dimensions, measures, filters)['cells'])
+                for name, (dimensions, measures, filters) in QUERIES.items()
+            }
+            db.close()
+
+            # Compressed buffers are decoded on every read, uncompressed ones are used in place
+            snapshot_results = {}
+            for compression in args.compression:
+                config.SNAPSHOT_COMPRESSION = compression
+                start = time.perf_counter()
+                path = snapshots.write_snapshot(task_name)
+                snapshot_seconds = time.perf_counter() - start
+
+                timings = {}
+                for name, (dimensions, measures, filters) in QUERIES.items():
+                    columnar = snapshots.run_query(task_name, version, dimensions, measures, filters)
+                    assert len(columnar['cells']) == cells[name]
+                    timings[name] = best_of(
+                        args.repeat, lambda: snapshots.run_query(task_name, version, dimensions, measures, filters)
+                    )
+                snapshot_results[compression] = {
+                    'write_seconds': round(snapshot_seconds, 2),
+                    'mb': round(os.path.getsize(path) / 2 ** 20, 1),
+                    'read_all_columns_seconds': best_of(
+                        args.repeat, lambda: snapshots.read_columns(task_name, version, SNAPSHOT_COLUMNS)
+                    ),
+                    'queries': timings
+                }
+
+            results.append({
+                'rows': rows,
+                'load_seconds': round(load_seconds, 2),
+                'sqlite_db_mb': round(os.path.getsize(partitions.partition_path(task_name)) / 2 ** 20, 1),
+                'sqlite_queries': sqlite_timings,
+                'cells': cells,
+                'snapshots': snapshot_results
+            })
+
+    print(json.dumps({'results': results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
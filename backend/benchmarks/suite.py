@@ -0,0 +1,205 @@
+"""Benchmark suite: ingest and read performance at a given scale, comparable between commits.
+
+Generates synthetic dealer feeds (see generate_data.py) and drives the app
+in-process against a scratch database: POST /generate-report ingests the
+feeds, then GET /tasks and GET /tasks/{task_name}/analytics are each
+requested repeatedly. Writes throughput, p50/p99 latency and peak RSS per
+scenario to a JSON file, and with --compare prints the change against an
+earlier run.
+
+    python benchmarks/suite.py --rows 1000000 --output before.json
+    python benchmarks/suite.py --rows 1000000 --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from generate_data import SPELLINGS, write_feed
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Metrics compared by --compare, and whether a higher value is better
+COMPARED = {
+    'rows_per_sec': True,
+    'requests_per_sec': True,
+    'p50_ms': False,
+    'p99_ms': False,
+    'peak_rss_mb': False
+}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (worker processes are not included)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def summarise(latencies: list, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'requests_per_sec': round(len(ordered) / elapsed, 1),
+        'p50_ms': round(statistics.median(ordered) * 1000, 2),
+        'p99_ms': round(ordered[max(int(len(ordered) * 0.99) - 1, 0)] * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_feeds(args, workdir: str) -> list:
+    """One feed per source, alternating CSV and JSON and cycling through the field spellings"""
+    spellings = sorted(SPELLINGS)
+    paths = []
+    for idx in range(args.sources):
+        rows = args.rows // args.sources + (1 if idx < args.rows % args.sources else 0)
+        path = os.path.join(workdir, f"dealer{idx + 1}.{'json' if idx % 2 else 'csv'}")
+        write_feed(
+            path, rows, spellings[idx % len(spellings)], seed=args.seed + idx, companies=args.companies,
+            models=args.models, locations=args.locations, days=args.days, id_prefix=f"D{idx + 1}"
+        )
+        paths.append(path)
+    return paths
+
+
+async def timed_requests(client, path: str, count: int, concurrency: int) -> dict:
+    """Issue count GET requests with at most concurrency in flight"""
+    latencies = []
+    queue = iter(range(count))
+
+    async def worker():
+        for _ in queue:
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarise(latencies, time.perf_counter() - start)
+
+
+async def run(args, paths: list) -> dict:
+    import httpx
+    import main
+
+    main.limiter.enabled = False
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        files = [open(path, 'rb') for path in paths]
+        try:
+            start = time.perf_counter()
+            response = await client.post('/generate-report', data={
+                'task_name': 'bench', 'task_description': 'benchmark suite'
+            }, files=[('sources', (os.path.basename(path), f, 'application/octet-stream')) for path, f in zip(paths, files)])
+            elapsed = time.perf_counter() - start
+        finally:
+            for f in files:
+                f.close()
+        assert response.status_code == 200, response.text
+        report = response.json()
+        source_bytes = sum(os.path.getsize(path) for path in paths)
+        results['generate_report'] = {
+            'rows': report['total_records'],
+            'seconds': round(elapsed, 2),
+            'rows_per_sec': round(report['total_records'] / elapsed),
+            'mb_per_sec': round(source_bytes / elapsed / (1024 * 1024), 2),
+            'peak_rss_mb': peak_rss_mb()
+        }
+
+        results['tasks'] = await timed_requests(client, '/tasks', args.requests, args.concurrency)
+        results['analytics'] = await timed_requests(
+            client, '/tasks/bench/analytics', args.requests, args.concurrency
+        )
+    return results
+
+
+def compare(results: dict, baseline: dict) -> dict:
+    """Change of each compared metric from a baseline run, positive when it got better"""
+    changes = {}
+    for scenario, metrics in results.items():
+        before = baseline.get('results', {}).get(scenario, {})
+        for metric, higher_is_better in COMPARED.items():
+            if metric in metrics and before.get(metric):
+                change = (metrics[metric] - before[metric]) / before[metric] * 100
+                changes[f"{scenario}.{metric}"] = {
+                    'before': before[metric],
+                    'after': metrics[metric],
+                    'improvement_pct': round(change if higher_is_better else -change, 1)
+                }
+    return changes
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ingest and analytics benchmark suite")
+    parser.add_argument('--rows', type=int, default=100000, help="Total rows across all feeds")
+    parser.add_argument('--sources', type=int, default=2, help="Feeds per report")
+    parser.add_argument('--companies', type=int, default=10)
+    parser.add_argument('--models', type=int, default=50)
+    parser.add_argument('--locations', type=int, default=12)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=200, help="Requests per read scenario")
+    parser.add_argument('--concurrency', type=int, default=4, help="Requests in flight per read scenario")
+    parser.add_argument('--cache', action='store_true', help="Keep the response cache on for reads")
+    parser.add_argument('--output', default='benchmark.json', help="JSON file the results are written to")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench-suite-') as workdir:
+        # Scratch database and spool directories; without the response cache every read hits SQLite
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        os.environ['JOB_SPOOL_DIR'] = os.path.join(workdir, 'job_spool')
+        os.environ['SNAPSHOT_DIR'] = os.path.join(workdir, 'snapshots')
+        os.environ['SOURCE_CACHE_DIR'] = os.path.join(workdir, 'source_cache')
+        os.environ['TASK_PARTITION_DIR'] = os.path.join(workdir, 'partitions')
+        if not args.cache:
+            os.environ['CACHE_MAX_ENTRIES'] = '0'
+        sys.path.insert(0, BACKEND_DIR)
+
+        start = time.perf_counter()
+        paths = write_feeds(args, workdir)
+        generate_seconds = time.perf_counter() - start
+        results = asyncio.run(run(args, paths))
+
+    output = {
+        'commit': git_commit(),
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'generate_seconds': round(generate_seconds, 2),
+        'results': results
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            output['compared_to'] = args.compare
+            output['changes'] = compare(results, json.load(f))
+
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(json.dumps(output, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,56 +1,28 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Date, PrimaryKeyConstraint, text
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
 import logging
 
+from app import migrations
+from app.database import engine
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create the database engine
-SQLALCHEMY_DATABASE_URL = "sqlite:///car_sales.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Create the base class
-Base = declarative_base()
-
-# Define the Sale model
-class Sale(Base):
-    __tablename__ = "sales"
-    
-    # Define composite primary key
-    __table_args__ = (
-        PrimaryKeyConstraint('task_name', 'sale_id', name='pk_sale'),
-    )
-    
-    task_name = Column(String, nullable=False)
-    sale_id = Column(String, nullable=False)
-    company = Column(String)
-    car_model = Column(String)
-    manufacturing_year = Column(Integer)
-    price = Column(Float)
-    sales_location = Column(String)
-    date_of_sale = Column(Date)
-
 def create_tables():
     try:
-        # Drop all existing tables
-        Base.metadata.drop_all(bind=engine)
-        logger.info("Dropped existing tables")
-        
-        # Create all tables
-        Base.metadata.create_all(bind=engine)
-        logger.info("Created sales table successfully")
+        # Apply pending migrations, existing tables and data are kept
+        applied = migrations.migrate()
+        logger.info(f"Applied {len(applied)} migrations")
         
         # Verify table creation
         with engine.connect() as conn:
-            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='sales'"))
+            # Sales live in per-task partitions, the shared database holds the task catalog
+            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='task_catalog'"))
             if result.fetchone():
-                logger.info("Verified sales table exists")
+                logger.info("Verified task_catalog table exists")
                 return True
             else:
-                logger.error("Sales table was not created")
+                logger.error("Task catalog table was not created")
                 return False
                 
     except Exception as e:
@@ -62,4 +34,4 @@ if __name__ == "__main__":
     if success:
         print("Table creation successful!")
     else:
-        print("Table creation failed!") 
\ No newline at end of file
+        print("Table creation failed!") 
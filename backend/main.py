@@ -1,17 +1,23 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 import pandas as pd
 import json
-import requests
-from io import StringIO
 import os
-from datetime import datetime
-from app.models import Sale, Base
-from app.database import SessionLocal, engine
+from datetime import date, datetime
+from app.models import Sale
+from app.database import SessionLocal, ReadSessionLocal
+from app import migrations
+from app import config, metrics, partitions
+from app.compression import CompressionMiddleware
+from app.profiling import ProfilingMiddleware
+from app.services import analytics, append, cache, catalog, encoding, fetch, ingest, jobs, parallel, queries, readers, retention, sketches, snapshots, timeseries
+from app.services.filters import FilterError, compile_filters
 from sqlalchemy.orm import Session
 from sqlalchemy import func, distinct
+from sqlalchemy.exc import SQLAlchemyError
 import logging
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
@@ -21,17 +27,28 @@ from slowapi.errors import RateLimitExceeded
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create database tables
+# Apply pending schema migrations, existing tasks are kept across restarts
 try:
-    Base.metadata.drop_all(bind=engine)  # Drop all tables first
-    Base.metadata.create_all(bind=engine)  # Create tables with new schema
-    logger.info("Database tables created successfully")
+    migrations.migrate()
+    logger.info("Database schema is up to date")
 except Exception as e:
-    logger.error(f"Error creating database tables: {str(e)}")
+    logger.error(f"Error migrating database schema: {str(e)}")
     raise
 
 app = FastAPI()
 
+@app.on_event("startup")
+def start_job_workers():
+    jobs.start()
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    jobs.shutdown()
+
+@app.on_event("shutdown")
+def stop_ingest_workers():
+    parallel.shutdown()
+
 # Configure rate limiting
 limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
@@ -42,10 +59,23 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5500", "http://127.0.0.1:5500"],  # Add your frontend URLs
     allow_credentials=True,
-    allow_methods=["GET", "POST"],  # Specify allowed methods
+    allow_methods=["GET", "POST", "DELETE"],  # Specify allowed methods
     allow_headers=["*"],
 )
 
+# Compress larger responses for clients that accept brotli or gzip
+if config.RESPONSE_COMPRESSION_MIN_SIZE > 0:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=config.RESPONSE_COMPRESSION_MIN_SIZE,
+        gzip_level=config.RESPONSE_GZIP_LEVEL,
+        brotli_quality=config.RESPONSE_BROTLI_QUALITY
+    )
+
+# Return a sampling profile for requests that ask for one
+if config.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, interval=config.PROFILE_SAMPLE_INTERVAL)
+
 # Request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
@@ -53,6 +83,14 @@ async def log_requests(request: Request, call_next):
     response = await call_next(request)
     end_time = datetime.now()
     
+    # Labelled by route template rather than path, so task names do not multiply the series
+    route = request.scope.get('route')
+    metrics.HTTP_REQUEST_SECONDS.observe(
+        (end_time - start_time).total_seconds(),
+        endpoint=route.path if route else 'unmatched',
+        method=request.method,
+        status=response.status_code
+    )
     logger.info(
         f"Path: {request.url.path} "
         f"Method: {request.method} "
@@ -63,6 +101,10 @@ async def log_requests(request: Request, call_next):
     
     return response
 
+# Page sizes for raw sales pagination
+DEFAULT_SALES_PAGE_SIZE = 1000
+MAX_SALES_PAGE_SIZE = 10000
+
 # Input validation function
 def validate_task_input(task_name: str, task_description: str) -> None:
     if not task_name or len(task_name) > 100:
@@ -71,101 +113,26 @@ def validate_task_input(task_name: str, task_description: str) -> None:
         raise HTTPException(status_code=400, detail="Invalid task description")
 
 def validate_file_type(filename: str) -> None:
-    allowed_extensions = {'.csv', '.xlsx', '.json'}
-    file_ext = os.path.splitext(filename)[1].lower()
-    if file_ext not in allowed_extensions:
-        raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_ext}")
-
-def process_data_source(source_data: pd.DataFrame, source_type: str) -> pd.DataFrame:
-    """Process data based on source type and return standardized DataFrame"""
+    # Any format with a reader, e.g. .csv, .json, .xlsx, .parquet or a gzip/zstd compressed .csv or .json
     try:
-        # Standardize column names
-        source_data.columns = source_data.columns.str.lower().str.replace(' ', '_')
-        
-        # Map common field variations
-        field_mapping = {
-            'saleid': 'sale_id',
-            'manufacturingyear': 'manufacturing_year',
-            'saleslocation': 'sales_location',
-            'dateofsale': 'date_of_sale',
-            'saledate': 'date_of_sale',
-            'date': 'date_of_sale'
-        }
-        
-        # Rename columns based on mapping
-        source_data = source_data.rename(columns=field_mapping)
-        
-        # Ensure required columns exist
-        required_columns = [
-            'sale_id', 'company', 'car_model', 'manufacturing_year',
-            'price', 'sales_location', 'date_of_sale'
-        ]
-        
-        # Add missing columns with default values
-        for col in required_columns:
-            if col not in source_data.columns:
-                if col == 'date_of_sale':
-                    source_data[col] = pd.Timestamp.now().date()  # Default to current date
-                else:
-                    source_data[col] = None
-        
-        # Convert numeric columns
-        numeric_columns = ['price', 'manufacturing_year']
-        for col in numeric_columns:
-            if col in source_data.columns:
-                source_data[col] = pd.to_numeric(source_data[col], errors='coerce')
-        
-        # Convert date column
-        if 'date_of_sale' in source_data.columns:
-            source_data['date_of_sale'] = pd.to_datetime(source_data['date_of_sale'], errors='coerce').dt.date
-        
-        return source_data
-        
-    except Exception as e:
-        logger.error(f"Error processing data source: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Error processing data source: {str(e)}")
+        readers.source_format(filename)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {os.path.splitext(filename)[1].lower()}")
 
-def apply_filters(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
-    """Apply filters to DataFrame"""
-    print(f"filters: {filters}")
-    try:
-        filtered_df = df.copy()
-        
-        # Apply price range filter
-        if filters.get('priceRange'):
-            min_price = filters['priceRange']['min']
-            max_price = filters['priceRange']['max']
-            filtered_df = filtered_df[
-                (filtered_df['price'] >= min_price) &
-                (filtered_df['price'] <= max_price)
-            ]
-        
-        # Apply model filter
-        if filters.get('model'):
-            filtered_df = filtered_df[filtered_df['car_model'] == filters['model']]
-        
-        # Apply year range filter
-        if filters.get('yearRange'):
-            min_year = filters['yearRange']['min']
-            max_year = filters['yearRange']['max']
-            filtered_df = filtered_df[
-                (filtered_df['manufacturing_year'] >= min_year) &
-                (filtered_df['manufacturing_year'] <= max_year)
-            ]
-        
-        # Apply company filter
-        if filters.get('company'):
-            filtered_df = filtered_df[filtered_df['company'] == filters['company']]
-        
-        # Apply location filter
-        if filters.get('location'):
-            filtered_df = filtered_df[filtered_df['sales_location'] == filters['location']]
-        
-        return filtered_df
-        
-    except Exception as e:
-        logger.error(f"Error applying filters: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Error applying filters: {str(e)}")
+def validate_ingest_options(
+    batch_size: Optional[int],
+    on_duplicate: Optional[str],
+    chunk_size: Optional[int]
+) -> None:
+    if batch_size is not None and batch_size < 1:
+        raise HTTPException(status_code=400, detail="Invalid batch size")
+    if chunk_size is not None and chunk_size < 1:
+        raise HTTPException(status_code=400, detail="Invalid chunk size")
+    if on_duplicate is not None:
+        try:
+            ingest.validate_duplicate_policy(on_duplicate)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/generate-report")
 @limiter.limit("5/minute")  # Rate limit: 5 requests per minute
@@ -175,12 +142,17 @@ async def generate_report(
     task_description: str = Form(...),
     sources: List[UploadFile] = File(...),
     source_urls: List[str] = Form([]),
-    source_filters: str = Form(None)  # JSON string containing filters for each source
+    source_filters: str = Form(None),  # JSON string containing filters for each source
+    batch_size: Optional[int] = Form(None),  # Rows per insert batch
+    on_duplicate: Optional[str] = Form(None),  # skip, upsert or error on duplicate sale_id
+    chunk_size: Optional[int] = Form(None),  # Rows parsed and written per chunk
+    async_job: bool = Form(False)  # Queue the report and return a job id immediately
 ):
     """Generate a report by processing multiple data sources"""
     try:
         # Validate inputs
         validate_task_input(task_name, task_description)
+        validate_ingest_options(batch_size, on_duplicate, chunk_size)
         
         # Validate file types
         for source in sources:
@@ -189,295 +161,627 @@ async def generate_report(
         # Parse source filters if provided
         source_filters_dict = json.loads(source_filters) if source_filters else {}
         
-        # Process file sources
-        processed_sources = []
-        source_metadata = []
+        # Compile filters up front so a bad expression fails before any source is read
+        try:
+            for spec in source_filters_dict.values():
+                compile_filters(spec)
+        except FilterError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid source filters: {str(e)}")
         
-        # Process uploaded files
-        for idx, source in enumerate(sources):
-            try:
-                content = await source.read()
-                if source.filename.endswith('.csv'):
-                    df = pd.read_csv(StringIO(content.decode('utf-8')))
-                elif source.filename.endswith('.xlsx'):
-                    df = pd.read_excel(StringIO(content.decode('utf-8')))
-                elif source.filename.endswith('.json'):
-                    json_data = json.loads(content.decode('utf-8'))
-                    if isinstance(json_data, list):
-                        df = pd.DataFrame(json_data)
-                    else:
-                        df = pd.DataFrame([json_data])
-                else:
-                    raise HTTPException(status_code=400, detail=f"Unsupported file format: {source.filename}")
-                
-                # Process the data source
-                processed_df = process_data_source(df, 'file')
-                
-                # Apply source-specific filters if any
-                current_filters = source_filters_dict.get(str(idx), {})
-                if current_filters:
-                    processed_df = apply_filters(processed_df, current_filters)
-                
-                processed_sources.append(processed_df)
-                source_metadata.append({
-                    'name': source.filename,
-                    'type': 'file',
-                    'records': len(processed_df),
-                    'columns': list(processed_df.columns)
-                })
-            except Exception as e:
-                logger.error(f"Error processing source {source.filename}: {str(e)}")
-                raise HTTPException(status_code=400, detail=f"Error processing source {source.filename}: {str(e)}")
+        if not sources and not source_urls:
+            raise HTTPException(status_code=400, detail="No valid data sources provided")
+        
+        options = {
+            'source_filters': source_filters_dict,
+            'chunk_size': chunk_size,
+            'batch_size': batch_size,
+            'on_duplicate': on_duplicate
+        }
         
-        # Process URL sources
-        for idx, url in enumerate(source_urls):
+        # Spool the sources and hand the report to the background workers
+        if async_job:
+            db = SessionLocal()
             try:
-                response = requests.get(url)
-                response.raise_for_status()
-                
-                if url.endswith('.csv'):
-                    df = pd.read_csv(StringIO(response.text))
-                elif url.endswith('.xlsx'):
-                    df = pd.read_excel(StringIO(response.content))
-                elif url.endswith('.json'):
-                    json_data = response.json()
-                    if isinstance(json_data, list):
-                        df = pd.DataFrame(json_data)
-                    else:
-                        df = pd.DataFrame([json_data])
-        else:
-                    raise HTTPException(status_code=400, detail=f"Unsupported URL format: {url}")
-                
-                # Process the data source
-                processed_df = process_data_source(df, 'url')
-                
-                # Apply source-specific filters if any
-                current_filters = source_filters_dict.get(str(len(sources) + idx), {})
-                if current_filters:
-                    processed_df = apply_filters(processed_df, current_filters)
-                
-                processed_sources.append(processed_df)
-                source_metadata.append({
-                    'name': url,
-                    'type': 'url',
-                    'records': len(processed_df),
-                    'columns': list(processed_df.columns)
-                })
-            except Exception as e:
-                logger.error(f"Error processing URL {url}: {str(e)}")
-                raise HTTPException(status_code=400, detail=f"Error processing URL {url}: {str(e)}")
+                job_id = await run_in_threadpool(
+                    jobs.create_job, db, task_name, task_description,
+                    [(source.filename, source.file) for source in sources],
+                    source_urls, options
+                )
+            except jobs.QueueFullError as e:
+                raise HTTPException(status_code=503, detail=str(e))
+            finally:
+                db.close()
+            jobs.submit(job_id)
+            
+            return JSONResponse({
+                "message": "Report job queued",
+                "job_id": job_id,
+                "task_name": task_name,
+                "status": "queued",
+                "status_url": f"/jobs/{job_id}"
+            }, status_code=202)
         
-        # Combine all processed sources
-        if not processed_sources:
-            raise HTTPException(status_code=400, detail="No valid data sources provided")
+        # Download URL sources concurrently before touching the database
+        try:
+            downloads = await fetch.fetch_sources(source_urls)
+        except fetch.FetchError as e:
+            logger.error(f"Error processing URL {e.url}: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Error processing URL {e.url}: {str(e)}")
         
-        combined_df = pd.concat(processed_sources, ignore_index=True)
+        def write_report():
+            # Session on the task's partition, every source is written in one transaction
+            db = partitions.open_session(task_name, write=True, create=True)
+            try:
+                result = ingest.ingest_sources(
+                    db, task_name,
+                    [(source.filename, 'file', source.file) for source in sources]
+                    + [(url, 'url', download) for url, download in zip(source_urls, downloads)],
+                    **options
+                )
+                db.commit()
+                return result
+            except Exception:
+                db.rollback()
+                # Leave no empty partition behind for a task that was never written
+                if db.info['created']:
+                    partitions.drop(task_name)
+                raise
+            finally:
+                db.close()
         
-        # Create database session
-        db = SessionLocal()
+        # Parsing and inserting block, so they run off the event loop
         try:
-            # Save to database
-            for _, row in combined_df.iterrows():
-                sale = Sale(
-                    task_name=task_name,
-                    sale_id=row.get('sale_id'),
-                    company=row.get('company'),
-                    car_model=row.get('car_model'),
-                    manufacturing_year=row.get('manufacturing_year'),
-                    price=row.get('price'),
-                    sales_location=row.get('sales_location'),
-                    date_of_sale=row.get('date_of_sale')
-                )
-                db.add(sale)
-            db.commit()
-        except Exception as e:
-            db.rollback()
+            result = await run_in_threadpool(write_report)
+            cache.invalidate_task(task_name)
+            await run_in_threadpool(snapshots.refresh_snapshot, task_name)
+            await run_in_threadpool(retention.enforce, task_name)
+        except ingest.SourceError as e:
+            kind = 'URL' if e.source_type == 'url' else 'source'
+            logger.error(f"Error processing {kind} {e.name}: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Error processing {kind} {e.name}: {str(e)}")
+        except ingest.DuplicateSaleError as e:
+            # Rejected by the 'error' duplicate policy, the whole write was rolled back
+            logger.error(str(e))
+            raise HTTPException(status_code=409, detail=str(e))
+        except SQLAlchemyError as e:
             logger.error(f"Database error: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
         finally:
-            db.close()
+            for download in downloads:
+                download.close()
         
         return JSONResponse({
             "message": "Report generated successfully",
             "task_name": task_name,
-            "sources_processed": len(source_metadata),
-            "total_records": len(combined_df),
-            "source_metadata": source_metadata
+            "sources_processed": len(result['source_metadata']),
+            "total_records": result['total_records'],
+            "source_metadata": result['source_metadata'],
+            "ingest": result['ingest']
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating report: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating report: {str(e)}")
 
+@app.post("/tasks/{task_name}/append")
+@limiter.limit("5/minute")  # Rate limit: 5 requests per minute
+async def append_to_task(
+    request: Request,  # Required for rate limiting
+    task_name: str,
+    sources: List[UploadFile] = File([]),
+    source_urls: List[str] = Form([]),
+    source_filters: str = Form(None),  # JSON string containing filters for each source
+    batch_size: Optional[int] = Form(None),  # Rows per insert batch
+    chunk_size: Optional[int] = Form(None)  # Rows parsed and written per chunk
+):
+    """Append new sources to an existing task, replacing sales whose sale_id already exists"""
+    try:
+        if not task_name or len(task_name) > 100:
+            raise HTTPException(status_code=400, detail="Invalid task name")
+        validate_ingest_options(batch_size, None, chunk_size)
+        
+        for source in sources:
+            validate_file_type(source.filename)
+        
+        source_filters_dict = json.loads(source_filters) if source_filters else {}
+        try:
+            for spec in source_filters_dict.values():
+                compile_filters(spec)
+        except FilterError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid source filters: {str(e)}")
+        
+        if not sources and not source_urls:
+            raise HTTPException(status_code=400, detail="No valid data sources provided")
+        
+        try:
+            downloads = await fetch.fetch_sources(source_urls)
+        except fetch.FetchError as e:
+            logger.error(f"Error processing URL {e.url}: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Error processing URL {e.url}: {str(e)}")
+        
+        def write_append():
+            db = partitions.open_session(task_name, write=True)
+            try:
+                if not catalog.get_task_version(db, task_name):
+                    raise HTTPException(status_code=404, detail="Task not found")
+                result = append.append_sources(
+                    db, task_name,
+                    [(source.filename, 'file', source.file) for source in sources]
+                    + [(url, 'url', download) for url, download in zip(source_urls, downloads)],
+                    source_filters=source_filters_dict,
+                    chunk_size=chunk_size,
+                    batch_size=batch_size
+                )
+                db.commit()
+                return result
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+        
+        try:
+            result = await run_in_threadpool(write_append)
+            # Nothing changes when every source was already ingested
+            if result['rows_inserted'] or result['rows_updated']:
+                cache.invalidate_task(task_name)
+                await run_in_threadpool(snapshots.refresh_snapshot, task_name)
+                await run_in_threadpool(retention.enforce, task_name)
+        except ingest.SourceError as e:
+            kind = 'URL' if e.source_type == 'url' else 'source'
+            logger.error(f"Error processing {kind} {e.name}: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Error processing {kind} {e.name}: {str(e)}")
+        except SQLAlchemyError as e:
+            logger.error(f"Database error: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        finally:
+            for download in downloads:
+                download.close()
+        
+        return JSONResponse({
+            "message": "Sources appended successfully",
+            "task_name": task_name,
+            "sources_processed": len(result['source_metadata']) - len(result['sources_skipped']),
+            "sources_skipped": result['sources_skipped'],
+            "total_records": result['total_records'],
+            "rows_inserted": result['rows_inserted'],
+            "rows_updated": result['rows_updated'],
+            "source_metadata": result['source_metadata'],
+            "ingest": result['ingest']
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error appending to task: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error appending to task: {str(e)}")
+
 @app.get("/tasks/{task_name}")
 @limiter.limit("10/minute")  # Rate limit: 10 requests per minute
-async def get_task(request: Request, task_name: str):
-    """Get a specific task by name"""
+def get_task(request: Request, task_name: str, columnar: bool = False):
+    """Get a specific task by name, with its sales as rows or as one array per field"""
     try:
         if not task_name or len(task_name) > 100:
             raise HTTPException(status_code=400, detail="Invalid task name")
             
-        db = SessionLocal()
+        db = partitions.open_session(task_name)
         try:
+            # A task without a catalog entry has no partition to read
+            if not catalog.get_task_version(db, task_name):
+                raise HTTPException(status_code=404, detail="Task not found")
+            
             # Get all sales for this task
-            sales = db.query(Sale).filter(Sale.task_name == task_name).all()
+            if columnar:
+                sales_data = analytics.get_sales_columns(db, task_name)
+                found = bool(sales_data['sale_id'])
+            else:
+                sales_data = analytics.get_sales_rows(db, task_name)
+                found = bool(sales_data)
             
-            if not sales:
+            if not found:
                 raise HTTPException(status_code=404, detail="Task not found")
             
-            # Convert to dict format
-            sales_data = [sale.__dict__ for sale in sales]
-            for sale in sales_data:
-                sale.pop('_sa_instance_state', None)  # Remove SQLAlchemy internal state
-            
-            return {
+            return encoding.json_response({
                 "task_name": task_name,
                 "sales": sales_data
-            }
+            })
             
         finally:
             db.close()
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting task {task_name}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/tasks")
 @limiter.limit("10/minute")  # Rate limit: 10 requests per minute
-async def get_tasks(request: Request):
-    """Get all unique task names from the sales table"""
+def get_tasks(request: Request):
+    """Get all task names with their record counts"""
     try:
-        db = SessionLocal()
+        db = ReadSessionLocal()
         try:
-            # Get unique task names with their record counts
-            tasks = db.query(
-                Sale.task_name,
-                func.count(Sale.sale_id).label('record_count')
-            ).group_by(Sale.task_name).all()
-            
-            return {
-                "tasks": [
-                    {
-                        "task_name": task.task_name,
-                        "record_count": task.record_count
-                    }
-                    for task in tasks
-                ]
-            }
+            def build():
+                # Get task names with their record counts from the catalog
+                return {"tasks": catalog.list_tasks(db)}
+            
+            key = ('tasks', catalog.get_catalog_version(db))
+            return cache.cached_json_response(request, key, build)
             
         finally:
             db.close()
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting tasks: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/tasks/{task_name}/analytics")
 @limiter.limit("10/minute")  # Rate limit: 10 requests per minute
-async def show_analytics(request: Request, task_name: str):
-    """Get analytics data for a specific task"""
+def show_analytics(request: Request, task_name: str, include_sales: bool = False, columnar: bool = False):
+    """Get analytics data for a specific task, raw rows are only included on request"""
     try:
         if not task_name or len(task_name) > 100:
             raise HTTPException(status_code=400, detail="Invalid task name")
             
-        db = SessionLocal()
+        db = partitions.open_session(task_name)
         try:
-            # Get all sales for this task
-            sales = db.query(Sale).filter(Sale.task_name == task_name).all()
+            version = catalog.get_task_version(db, task_name)
             
-            if not sales:
+            if not version:
                 raise HTTPException(status_code=404, detail="No data found for this task")
             
-            # Convert to dict format and remove SQLAlchemy internal state
-            sales_data = []
-            for sale in sales:
-                sale_dict = sale.__dict__
-                sale_dict.pop('_sa_instance_state', None)
-                # Convert date to string format
-                if sale_dict.get('date_of_sale'):
-                    sale_dict['date_of_sale'] = sale_dict['date_of_sale'].isoformat()
-                sales_data.append(sale_dict)
-            
-            # Calculate summary statistics
-            total_sales = len(sales_data)
-            total_revenue = sum(float(sale.get('price', 0)) for sale in sales_data)
-            avg_price = total_revenue / total_sales if total_sales > 0 else 0
-            
-            # Get date range
-            dates = [pd.to_datetime(sale.get('date_of_sale', pd.Timestamp.now().date())) for sale in sales_data]
-            date_range = {
-                'start': min(dates).strftime('%Y-%m-%d'),
-                'end': max(dates).strftime('%Y-%m-%d')
-            }
-            
-            # Aggregate data for company bar chart
-            company_aggregation = {}
-            for sale in sales_data:
-                company = sale.get('company', 'Unknown')
-                if company not in company_aggregation:
-                    company_aggregation[company] = {
-                        'count': 0,
-                        'total_revenue': 0
-                    }
-                company_aggregation[company]['count'] += 1
-                company_aggregation[company]['total_revenue'] += float(sale.get('price', 0))
-            
-            # Convert company aggregation to list format for D3.js
-            company_chart_data = [
-                {
-                    'company': company,
-                    'count': data['count'],
-                    'total_revenue': round(data['total_revenue'], 2)
-                }
-                for company, data in company_aggregation.items()
-            ]
-            
-            # Aggregate data by month and year
-            monthly_aggregation = {}
-            for sale in sales_data:
-                date = pd.to_datetime(sale.get('date_of_sale', pd.Timestamp.now().date()))
-                month_key = date.strftime('%Y-%m')
-                if month_key not in monthly_aggregation:
-                    monthly_aggregation[month_key] = {
-                        'count': 0,
-                        'total_revenue': 0,
-                        'avg_price': 0
-                    }
-                monthly_aggregation[month_key]['count'] += 1
-                monthly_aggregation[month_key]['total_revenue'] += float(sale.get('price', 0))
-                monthly_aggregation[month_key]['avg_price'] = monthly_aggregation[month_key]['total_revenue'] / monthly_aggregation[month_key]['count']
-            
-            # Convert monthly aggregation to list format for D3.js
-            monthly_chart_data = [
-                {
-                    'month': month,
-                    'count': data['count'],
-                    'total_revenue': round(data['total_revenue'], 2),
-                    'avg_price': round(data['avg_price'], 2)
+            def build():
+                # Read summary, company, monthly and model aggregates from the task rollups
+                summary = analytics.get_task_summary(db, task_name)
+                if not summary:
+                    raise HTTPException(status_code=404, detail="No data found for this task")
+                
+                company_chart_data = analytics.get_company_breakdown(db, task_name)
+                monthly_chart_data = analytics.get_monthly_breakdown(db, task_name)
+                model_chart_data = analytics.get_model_breakdown(db, task_name)
+                
+                # Price quantiles and distinct counts, merged from the task's sketches
+                distributions = analytics.get_price_distributions(db, task_name)
+                summary.update(distributions['summary'])
+                for entry in company_chart_data:
+                    entry.update(distributions['company'].get(entry['company'], {}))
+                for entry in monthly_chart_data:
+                    entry.update(distributions['month'].get(entry['month'], {}))
+                
+                payload = {
+                    "task_name": task_name,
+                    "summary": summary,
+                    "company_chart_data": company_chart_data,
+                    "monthly_chart_data": monthly_chart_data,
+                    "model_chart_data": model_chart_data
                 }
-                for month, data in sorted(monthly_aggregation.items())
-            ]
+                if include_sales:
+                    payload["sales_data"] = (
+                        analytics.get_sales_columns(db, task_name) if columnar
+                        else analytics.get_sales_rows(db, task_name)
+                    )
+                return payload
             
-            return {
-                "task_name": task_name,
-                "summary": {
-                    "total_sales": total_sales,
-                    "total_revenue": round(total_revenue, 2),
-                    "average_price": round(avg_price, 2),
-                    "date_range": date_range
-                },
-                "company_chart_data": company_chart_data,
-                "monthly_chart_data": monthly_chart_data,
-                "sales_data": sales_data
-            }
+            # Cached per task data version, revalidated with ETag/If-None-Match
+            key = ('analytics', task_name, version, include_sales, include_sales and columnar)
+            return cache.cached_json_response(request, key, build)
             
         finally:
             db.close()
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting analytics for task {task_name}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/tasks/{task_name}/query")
+@limiter.limit("60/minute")  # Rate limit: 60 requests per minute, charts re-query as filters change
+def query_task(
+    request: Request,
+    task_name: str,
+    dimensions: List[str] = Query([]),  # Group by these, e.g. company, sale_month
+    measures: List[str] = Query(['count']),  # count, sum_price, avg_price, min_price, max_price
+    filters: Optional[str] = None  # Text filter format, or a JSON list of conditions
+):
+    """Aggregate a task's sales by dimensions into measures, returning only the cells"""
+    try:
+        if not task_name or len(task_name) > 100:
+            raise HTTPException(status_code=400, detail="Invalid task name")
+        
+        try:
+            filter_spec = json.loads(filters) if filters and filters.lstrip()[:1] in ('[', '{') else filters
+            compile_filters(filter_spec)
+        except (ValueError, FilterError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid filters: {str(e)}")
+        
+        db = partitions.open_session(task_name)
+        try:
+            version = catalog.get_task_version(db, task_name)
+            
+            if not version:
+                raise HTTPException(status_code=404, detail="Task not found")
+            
+            def build():
+                # Scan the task's columnar snapshot when there is a current one
+                result = None
+                if snapshots.enabled():
+                    result = snapshots.run_query(
+                        task_name, version, dimensions, measures, filter_spec, config.QUERY_MAX_CELLS
+                    )
+                if result is None:
+                    result = queries.run_query(
+                        db, task_name, dimensions, measures, filter_spec, config.QUERY_MAX_CELLS
+                    )
+                return {
+                    "task_name": task_name,
+                    "dimensions": dimensions,
+                    "measures": measures,
+                    **result
+                }
+            
+            # Cached per task data version like analytics
+            key = ('query', task_name, version, tuple(dimensions), tuple(measures), filters)
+            return cache.cached_json_response(request, key, build)
+            
+        finally:
+            db.close()
+            
+    except HTTPException:
+        raise
+    except queries.QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error querying task {task_name}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/tasks/{task_name}/timeseries")
+@limiter.limit("60/minute")  # Rate limit: 60 requests per minute, charts re-query as the range changes
+def get_task_timeseries(
+    request: Request,
+    task_name: str,
+    granularity: str = 'month',  # day, week, month, quarter or year
+    start: Optional[date] = None,  # First sale date to include
+    end: Optional[date] = None,  # Last sale date to include
+    max_points: Optional[int] = None,  # Downsample to at most this many points
+    measure: str = 'avg_price',  # Measure the downsampling preserves
+    downsample: str = 'lttb',  # lttb or minmax
+    filters: Optional[str] = None  # Text filter format, or a JSON list of conditions
+):
+    """Get a task's sales as a date-bucketed, optionally downsampled time series"""
+    try:
+        if not task_name or len(task_name) > 100:
+            raise HTTPException(status_code=400, detail="Invalid task name")
+        if granularity not in queries.DATE_GRANULARITIES:
+            raise HTTPException(status_code=400, detail=f"Invalid granularity: {granularity}")
+        if max_points is not None and max_points < 3:
+            raise HTTPException(status_code=400, detail="max_points must be at least 3")
+        if start and end and start > end:
+            raise HTTPException(status_code=400, detail="start must not be after end")
+        
+        try:
+            filter_spec = json.loads(filters) if filters and filters.lstrip()[:1] in ('[', '{') else filters
+            compile_filters(filter_spec)
+        except (ValueError, FilterError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid filters: {str(e)}")
+        
+        db = partitions.open_session(task_name)
+        try:
+            version = catalog.get_task_version(db, task_name)
+            
+            if not version:
+                raise HTTPException(status_code=404, detail="Task not found")
+            
+            def build():
+                series = timeseries.get_series(
+                    db, task_name, granularity, start, end, filter_spec,
+                    max_points, measure, downsample
+                )
+                return {"task_name": task_name, **series}
+            
+            # Cached per task data version like analytics
+            key = (
+                'timeseries', task_name, version, granularity, start, end,
+                max_points, measure, downsample, filters
+            )
+            return cache.cached_json_response(request, key, build)
+            
+        finally:
+            db.close()
+            
+    except HTTPException:
+        raise
+    except queries.QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting time series for task {task_name}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/tasks/{task_name}/distribution")
+@limiter.limit("60/minute")  # Rate limit: 60 requests per minute, charts re-query as filters change
+def get_task_distribution(
+    request: Request,
+    task_name: str,
+    company: List[str] = Query([]),  # Companies to include, may be repeated (default: all)
+    start_month: Optional[str] = None,  # First month to include, YYYY-MM
+    end_month: Optional[str] = None,  # Last month to include, YYYY-MM
+    quantiles: List[float] = Query(list(sketches.DEFAULT_QUANTILES))  # Price quantiles, between 0 and 1
+):
+    """Get price quantiles and distinct model and location counts over any companies and months of a task"""
+    try:
+        if not task_name or len(task_name) > 100:
+            raise HTTPException(status_code=400, detail="Invalid task name")
+        for month in (start_month, end_month):
+            if month is not None and not (len(month) == 7 and month[4] == '-' and month.replace('-', '', 1).isdigit()):
+                raise HTTPException(status_code=400, detail=f"Invalid month: {month}, expected YYYY-MM")
+        if start_month and end_month and start_month > end_month:
+            raise HTTPException(status_code=400, detail="start_month must not be after end_month")
+        if not quantiles or len(quantiles) > 20 or any(not 0 <= q <= 1 for q in quantiles):
+            raise HTTPException(status_code=400, detail="quantiles must be 1 to 20 values between 0 and 1")
+        
+        db = partitions.open_session(task_name)
+        try:
+            version = catalog.get_task_version(db, task_name)
+            
+            if not version:
+                raise HTTPException(status_code=404, detail="Task not found")
+            
+            def build():
+                # Merges the sketches of the matching (company, month) cells, no sales are read
+                cells = sketches.load_cells(db, task_name, company, start_month, end_month)
+                return {
+                    "task_name": task_name,
+                    "companies": company,
+                    "start_month": start_month,
+                    "end_month": end_month,
+                    "total_sales": sum(cell.sales_count for cell in cells),
+                    **sketches.describe(cells, quantiles)
+                }
+            
+            # Cached per task data version like analytics
+            key = ('distribution', task_name, version, tuple(company), start_month, end_month, tuple(quantiles))
+            return cache.cached_json_response(request, key, build)
+            
+        finally:
+            db.close()
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting distribution for task {task_name}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/tasks/{task_name}/sales")
+@limiter.limit("60/minute")  # Rate limit: 60 requests per minute, pages are fetched in sequence
+def get_task_sales(
+    request: Request,
+    task_name: str,
+    after: Optional[str] = None,  # Return sales with sale_id greater than this cursor
+    limit: Optional[int] = None,
+    format: str = 'json',  # json for a page, ndjson to stream rows as they are read
+    columnar: bool = False  # json pages only: one array per field instead of one object per sale
+):
+    """Get a task's raw sales ordered by sale_id using keyset pagination"""
+    try:
+        if not task_name or len(task_name) > 100:
+            raise HTTPException(status_code=400, detail="Invalid task name")
+        if format not in ('json', 'ndjson'):
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+        if columnar and format != 'json':
+            raise HTTPException(status_code=400, detail="Columnar output is only available for json pages")
+        if limit is not None and (limit < 1 or limit > MAX_SALES_PAGE_SIZE):
+            raise HTTPException(status_code=400, detail="Invalid limit")
+        
+        db = partitions.open_session(task_name)
+        try:
+            if not catalog.get_task_version(db, task_name):
+                raise HTTPException(status_code=404, detail="Task not found")
+            
+            if format == 'json':
+                limit = limit or DEFAULT_SALES_PAGE_SIZE
+                if columnar:
+                    sales = analytics.get_sales_columns(db, task_name, after, limit)
+                    sale_ids = sales['sale_id']
+                else:
+                    sales = analytics.get_sales_rows(db, task_name, after, limit)
+                    sale_ids = [sale['sale_id'] for sale in sales]
+                return encoding.json_response({
+                    "task_name": task_name,
+                    "sales": sales,
+                    "next_after": sale_ids[-1] if len(sale_ids) == limit else None
+                })
+        finally:
+            db.close()
+        
+        def stream_rows():
+            # The generator outlives the handler, so it owns its session
+            stream_db = partitions.open_session(task_name)
+            try:
+                for sale in analytics.iter_sales_rows(stream_db, task_name, after, limit):
+                    yield encoding.dumps(sale) + b"\n"
+            finally:
+                stream_db.close()
+        
+        return StreamingResponse(stream_rows(), media_type="application/x-ndjson")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting sales for task {task_name}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/tasks/{task_name}")
+@limiter.limit("5/minute")  # Rate limit: 5 requests per minute
+def delete_task(request: Request, task_name: str):
+    """Delete a task with its sales, rollups and sketches by dropping its partition"""
+    try:
+        if not task_name or len(task_name) > 100:
+            raise HTTPException(status_code=400, detail="Invalid task name")
+
+        db = SessionLocal()
+        try:
+            if not catalog.get_task_version(db, task_name):
+                raise HTTPException(status_code=404, detail="Task not found")
+            retention.drop_tasks(db, [task_name])
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        return {"message": "Task deleted successfully", "task_name": task_name}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting task {task_name}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/jobs")
+@limiter.limit("30/minute")  # Rate limit: 30 requests per minute
+def get_jobs(request: Request, limit: int = 50):
+    """Get the most recent report jobs"""
+    try:
+        if limit < 1 or limit > 500:
+            raise HTTPException(status_code=400, detail="Invalid limit")
+        
+        db = ReadSessionLocal()
+        try:
+            return {"jobs": jobs.list_jobs(db, limit)}
+        finally:
+            db.close()
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting jobs: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/jobs/{job_id}")
+@limiter.limit("60/minute")  # Rate limit: 60 requests per minute, jobs are polled
+def get_job(request: Request, job_id: str):
+    """Get status, progress, source metadata and errors of a report job"""
+    db = ReadSessionLocal()
+    try:
+        job = jobs.get_job(db, job_id)
+    finally:
+        db.close()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/metrics")
+@limiter.limit("60/minute")  # Rate limit: 60 requests per minute
+def get_metrics(request: Request):
+    """Ingestion stage timings, row and byte counters, cache lookups and request latency for Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001) 
\ No newline at end of file
@@ -0,0 +1,96 @@
+import argparse
+import logging
+
+from sqlalchemy import select
+
+from app import migrations, partitions
+from app.database import SessionLocal
+from app.models import TaskCatalog
+from app.services import query_plans, rollups, sketches
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate(args) -> int:
+    """Apply pending schema migrations"""
+    applied = migrations.migrate()
+    logger.info(f"Applied {len(applied)} migrations")
+    return 0
+
+
+def rebuild_rollups(args) -> int:
+    """Rebuild the per-task rollup and sketch tables from each task's sales"""
+    migrations.migrate()
+
+    db = SessionLocal()
+    try:
+        task_names = args.task or list(db.scalars(select(TaskCatalog.task_name)))
+    finally:
+        db.close()
+
+    for task_name in task_names:
+        db = partitions.open_session(task_name, write=True)
+        try:
+            rollups.rebuild_rollups(db, [task_name])
+            sketches.rebuild_sketches(db, [task_name])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error rebuilding rollups of task {task_name}: {str(e)}")
+            return 1
+        finally:
+            db.close()
+    logger.info(f"Rebuilt rollups for {len(task_names)} tasks")
+    return 0
+
+
+def check_query_plans(args) -> int:
+    """Fail if any analytics query plan falls back to a full table scan or misses its expected index"""
+    migrations.migrate()
+
+    # Plans are read against the tables of an empty scratch partition
+    scratch = '__query_plans__'
+    db = partitions.open_session(scratch, write=True, create=True)
+    try:
+        for name, query in query_plans.analytics_queries().items():
+            for detail in query_plans.explain(db, query):
+                logger.info(f"{name}: {detail}")
+
+        full_scans = query_plans.find_full_scans(db)
+        for name, details in full_scans.items():
+            logger.error(f"Query {name} scans a full table: {'; '.join(details)}")
+        unexpected = query_plans.find_unexpected_plans(db)
+        for name, details in unexpected.items():
+            index, columns = query_plans.EXPECTED_PLANS.get(name, (None, []))
+            logger.error(
+                f"Query {name} does not search index {index} on {', '.join(columns) or 'task_name'}: "
+                f"{'; '.join(details)}"
+            )
+        return 1 if full_scans or unexpected else 0
+    finally:
+        db.close()
+        partitions.drop(scratch)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="DVisuli backend admin commands")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = subparsers.add_parser('migrate', help="Apply pending schema migrations")
+    migrate_parser.set_defaults(func=migrate)
+
+    rebuild = subparsers.add_parser('rebuild-rollups', help="Rebuild per-task rollup and sketch tables")
+    rebuild.add_argument('--task', action='append', help="Task to rebuild, may be repeated (default: all)")
+    rebuild.set_defaults(func=rebuild_rollups)
+
+    plans = subparsers.add_parser('check-query-plans', help="Fail if an analytics query does a full table scan or misses its index")
+    plans.set_defaults(func=check_query_plans)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
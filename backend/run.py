@@ -1,9 +1,8 @@
 import uvicorn
-from app.models import Base
-from app.database import engine
+from app import migrations
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Apply pending schema migrations
+migrations.migrate()
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True) 
\ No newline at end of file
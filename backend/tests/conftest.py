@@ -0,0 +1,43 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Point the app at scratch storage before any app module reads its settings
+_workdir = tempfile.mkdtemp(prefix='dvisuli-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ['TASK_PARTITION_DIR'] = os.path.join(_workdir, 'partitions')
+os.environ['JOB_SPOOL_DIR'] = os.path.join(_workdir, 'job_spool')
+os.environ['SNAPSHOT_DIR'] = os.path.join(_workdir, 'snapshots')
+os.environ['SOURCE_CACHE_DIR'] = os.path.join(_workdir, 'source_cache')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app():
+    import main
+
+    main.limiter.enabled = False
+    return main.app
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+
+    async def with_client_address(scope, receive, send):
+        # The request log reads the client address, which the test transport leaves out
+        if scope['type'] == 'http':
+            scope['client'] = ('127.0.0.1', 50000)
+        await app(scope, receive, send)
+
+    with TestClient(with_client_address) as test_client:
+        yield test_client
+
+
+def csv_source(rows, name='dealer.csv'):
+    """An upload tuple for a CSV of (sale_id, company, price, date) rows"""
+    lines = ['Sale ID,Company,Car Model,Manufacturing Year,Price,Sales Location,Date of Sale']
+    lines += [f"{sale_id},{company},M1,2020,{price},Austin,{sale_date}" for sale_id, company, price, sale_date in rows]
+    return ('sources', (name, ('\n'.join(lines) + '\n').encode('utf-8'), 'text/csv'))
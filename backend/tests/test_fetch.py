@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import csv_source
+from app import config
+from app.services import fetch, source_cache
+
+FEED = (
+    "Sale ID,Company,Car Model,Manufacturing Year,Price,Sales Location,Date of Sale\n"
+    "U1,Ford,F-150,2021,41000,Austin,2024-02-01\n"
+    "U2,BMW,X5,2022,65000,Boston,2024-03-05\n"
+).encode('utf-8')
+
+
+class Feeds(BaseHTTPRequestHandler):
+    """Stand-in dealer server; every path misbehaves in its own way"""
+
+    calls = {}
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b'', headers: dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        with Feeds.lock:
+            Feeds.calls[path] = Feeds.calls.get(path, 0) + 1
+            calls = Feeds.calls[path]
+            Feeds.in_flight += 1
+            Feeds.max_in_flight = max(Feeds.max_in_flight, Feeds.in_flight)
+        try:
+            if path.startswith('/slow'):
+                time.sleep(0.3)
+                self._send(200, FEED)
+            elif path == '/flaky':
+                self._send(503 if calls <= 2 else 200, FEED)
+            elif path == '/missing':
+                self._send(404)
+            elif path == '/hang':
+                time.sleep(2)
+                self._send(200, FEED)
+            elif path == '/etag.csv':
+                if self.headers.get('If-None-Match') == '"v1"':
+                    self._send(304, headers={'ETag': '"v1"'})
+                else:
+                    self._send(200, FEED, {'ETag': '"v1"', 'Content-Type': 'text/csv'})
+            else:
+                self._send(404)
+        finally:
+            with Feeds.lock:
+                Feeds.in_flight -= 1
+
+
+class QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-response on purpose
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = QuietServer(('127.0.0.1', 0), Feeds)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def reset_counters():
+    Feeds.calls = {}
+    Feeds.max_in_flight = 0
+
+
+def fetch_all(urls, **options):
+    downloads = asyncio.run(fetch.fetch_sources(urls, **options))
+    try:
+        return [download.read() for download in downloads]
+    finally:
+        for download in downloads:
+            download.close()
+
+
+def test_downloads_run_concurrently(server):
+    urls = [f"{server}/slow{idx}" for idx in range(4)]
+    start = time.perf_counter()
+    bodies = fetch_all(urls, concurrency=4, retries=0)
+    elapsed = time.perf_counter() - start
+    assert bodies == [FEED] * 4
+    assert Feeds.max_in_flight > 1
+    # Four sequential downloads would take at least 1.2s
+    assert elapsed < 1.0
+
+
+def test_concurrency_is_bounded(server):
+    fetch_all([f"{server}/slow{idx}" for idx in range(4)], concurrency=2, retries=0)
+    assert Feeds.max_in_flight <= 2
+
+
+def test_server_errors_are_retried(server):
+    assert fetch_all([f"{server}/flaky"], retries=3, backoff=0) == [FEED]
+    assert Feeds.calls['/flaky'] == 3
+
+
+def test_server_errors_fail_once_retries_run_out(server):
+    with pytest.raises(fetch.FetchError) as excinfo:
+        fetch_all([f"{server}/flaky"], retries=1, backoff=0)
+    assert excinfo.value.url == f"{server}/flaky"
+    assert Feeds.calls['/flaky'] == 2
+
+
+def test_client_errors_are_not_retried(server):
+    with pytest.raises(fetch.FetchError):
+        fetch_all([f"{server}/missing"], retries=3, backoff=0)
+    assert Feeds.calls['/missing'] == 1
+
+
+def test_slow_server_times_out(server):
+    start = time.perf_counter()
+    with pytest.raises(fetch.FetchError):
+        fetch_all([f"{server}/hang"], timeout=0.2, retries=0)
+    assert time.perf_counter() - start < 1.5
+
+
+def test_one_failed_url_fails_the_fetch(server):
+    with pytest.raises(fetch.FetchError) as excinfo:
+        fetch_all([f"{server}/slow0", f"{server}/missing"], retries=0)
+    assert excinfo.value.url == f"{server}/missing"
+
+
+def test_unchanged_url_is_revalidated_and_read_from_the_source_cache(server, client, monkeypatch):
+    monkeypatch.setattr(config, 'SOURCE_CACHE', True)
+    url = f"{server}/etag.csv"
+    first = client.post('/generate-report', data={
+        'task_name': 'revalidated', 'task_description': 'd', 'source_urls': [url]
+    }, files=[csv_source([('F1', 'Kia', 20000, '2024-01-01')])])
+    assert first.status_code == 200, first.text
+    assert first.json()['total_records'] == 3
+
+    downloads = asyncio.run(fetch.fetch_sources([url], retries=0))
+    assert isinstance(downloads[0], source_cache.CachedSource)
+    assert Feeds.calls['/etag.csv'] == 2
+
+    second = client.post('/generate-report', data={
+        'task_name': 'revalidated', 'task_description': 'd', 'source_urls': [url]
+    }, files=[csv_source([('F1', 'Kia', 20000, '2024-01-01')])])
+    assert second.status_code == 200, second.text
+    assert second.json()['total_records'] == 3
+    assert Feeds.calls['/etag.csv'] == 3
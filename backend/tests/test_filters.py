@@ -0,0 +1,79 @@
+import json
+
+import pandas as pd
+import pytest
+from conftest import csv_source
+
+from app.services.filters import FilterError, compile_filters
+
+SALES = pd.DataFrame({
+    'price': [500.0, 1500.0, 2500.0],
+    'manufacturing_year': [2015, 2019, 2023],
+    'sales_location': ['Austin, TX', 'Dallas', 'Reno|NV']
+})
+
+
+def _kept(spec):
+    return list(compile_filters(spec).apply(SALES)['price'])
+
+
+def test_legacy_range_without_a_bound_is_open_ended():
+    assert _kept({'priceRange': {'min': 1000}}) == [1500.0, 2500.0]
+    assert _kept({'yearRange': {'max': 2019}}) == [500.0, 1500.0]
+    assert _kept({'priceRange': {'min': 1000, 'max': 2000}}) == [1500.0]
+    assert _kept({'priceRange': {}}) == [500.0, 1500.0, 2500.0]
+
+
+def test_legacy_range_that_is_not_an_object_is_a_filter_error():
+    with pytest.raises(FilterError):
+        compile_filters({'priceRange': 1000})
+
+
+def test_quoted_text_values_keep_their_commas_and_bars():
+    assert _kept('location = "Austin, TX"') == [500.0]
+    assert _kept('location in "Austin, TX"|"Reno|NV", price > 1000') == [2500.0]
+    assert _kept('location not in "Austin, TX"') == [1500.0, 2500.0]
+
+
+def test_unterminated_quote_is_a_filter_error():
+    with pytest.raises(FilterError):
+        compile_filters('location = "Austin, price > 1000')
+
+
+NUMERIC_TEXT = pd.DataFrame({
+    'sale_id': [1, 2, 23],
+    'car_model': pd.Series([3, 6, 3]).astype('category'),
+    'company': pd.Series(['Mazda', 3, None], dtype=object)
+})
+
+
+@pytest.mark.parametrize('spec, sale_ids', [
+    ('sale_id = 2', [2]),
+    ('sale_id in 1|23', [1, 23]),
+    ('sale_id ^= 2', [2, 23]),
+    ('sale_id ~ ^2', [2, 23]),
+    ('sale_id != 2', [1, 23]),
+    ('car_model = 3', [1, 23]),
+    ('car_model in 6', [2]),
+    ('car_model ^= 6', [2]),
+    ('car_model ~ [36]', [1, 2, 23]),
+    ('car_model not in 3', [2]),
+    ('company = 3', [2]),
+])
+def test_text_columns_read_as_numbers_match_as_text(spec, sale_ids):
+    assert list(compile_filters(spec).apply(NUMERIC_TEXT)['sale_id']) == sale_ids
+
+
+def test_source_filters_agree_with_stored_data_filters_on_numeric_ids(client):
+    rows = [(sale_id, 'Mazda', 1000, '2024-01-01') for sale_id in (1, 2, 23)]
+    response = client.post('/generate-report', data={
+        'task_name': 'numeric_ids', 'task_description': 'd',
+        'source_filters': json.dumps({'0': 'sale_id ^= 2'})
+    }, files=[csv_source(rows)])
+    assert response.status_code == 200
+    assert response.json()['total_records'] == 2
+
+    client.post('/generate-report', data={'task_name': 'numeric_all', 'task_description': 'd'},
+                files=[csv_source(rows)])
+    cells = client.get('/tasks/numeric_all/query', params={'filters': 'sale_id ^= 2'}).json()['cells']
+    assert cells[0]['count'] == 2
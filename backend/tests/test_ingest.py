@@ -0,0 +1,31 @@
+from conftest import csv_source
+
+
+def test_duplicate_sale_id_under_error_policy_is_a_conflict(client):
+    response = client.post('/generate-report', data={
+        'task_name': 'dupes', 'task_description': 'd', 'on_duplicate': 'error'
+    }, files=[csv_source([('S1', 'Ford', 100, '2024-01-01'), ('S2', 'BMW', 200, '2024-01-02'),
+                          ('S1', 'Audi', 300, '2024-01-03')])])
+    assert response.status_code == 409
+    assert "'S1'" in response.json()['detail']
+    # Nothing of the rejected report is kept
+    assert 'dupes' not in [task['task_name'] for task in client.get('/tasks').json()['tasks']]
+
+
+def test_duplicate_across_sources_rolls_back_the_whole_report(client):
+    response = client.post('/generate-report', data={
+        'task_name': 'dupes2', 'task_description': 'd', 'on_duplicate': 'error'
+    }, files=[csv_source([('S1', 'Ford', 100, '2024-01-01')], 'a.csv'),
+              csv_source([('S2', 'BMW', 200, '2024-01-02'), ('S1', 'Audi', 300, '2024-01-03')], 'b.csv')])
+    assert response.status_code == 409
+    assert "'S1'" in response.json()['detail']
+    assert 'dupes2' not in [task['task_name'] for task in client.get('/tasks').json()['tasks']]
+
+
+def test_skip_policy_keeps_the_first_sale(client):
+    response = client.post('/generate-report', data={
+        'task_name': 'skipped', 'task_description': 'd', 'on_duplicate': 'skip'
+    }, files=[csv_source([('S1', 'Ford', 100, '2024-01-01'), ('S1', 'Audi', 300, '2024-01-03')])])
+    assert response.status_code == 200
+    assert response.json()['ingest']['rows_skipped'] == 1
+    assert client.get('/tasks/skipped/analytics').json()['summary']['total_revenue'] == 100
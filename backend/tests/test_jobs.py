@@ -0,0 +1,59 @@
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from app import config
+from app.database import SessionLocal
+from app.models import IngestJob
+from app.services import jobs
+
+
+def _running_job(started_at, lease_age=None):
+    """A running job claimed at started_at, with a lease last renewed lease_age seconds ago"""
+    job_id = uuid.uuid4().hex
+    os.makedirs(jobs._job_dir(job_id), exist_ok=True)
+    if lease_age is not None:
+        path = jobs._lease_path(job_id)
+        open(path, 'a').close()
+        renewed = time.time() - lease_age
+        os.utime(path, (renewed, renewed))
+
+    db = SessionLocal()
+    try:
+        db.add(IngestJob(
+            id=job_id, task_name='leases', status='running', sources=[], options={},
+            started_at=started_at, worker_id='elsewhere:1:abcd'
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return job_id
+
+
+def _status(job_id):
+    db = SessionLocal()
+    try:
+        job = db.get(IngestJob, job_id)
+        return job.status, job.worker_id
+    finally:
+        db.close()
+
+
+def test_only_jobs_with_expired_leases_are_requeued(app):
+    long_ago = datetime.utcnow() - timedelta(seconds=config.JOB_LEASE_SECONDS * 10)
+    live = _running_job(long_ago, lease_age=1)
+    just_claimed = _running_job(datetime.utcnow())
+    stale = _running_job(long_ago, lease_age=config.JOB_LEASE_SECONDS * 2)
+    never_renewed = _running_job(long_ago)
+
+    db = SessionLocal()
+    try:
+        assert jobs.requeue_abandoned(db) == 2
+    finally:
+        db.close()
+
+    assert _status(live) == ('running', 'elsewhere:1:abcd')
+    assert _status(just_claimed) == ('running', 'elsewhere:1:abcd')
+    assert _status(stale) == ('queued', None)
+    assert _status(never_renewed) == ('queued', None)
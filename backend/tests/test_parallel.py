@@ -0,0 +1,50 @@
+from io import BytesIO
+
+import pandas as pd
+
+from app.services import parallel
+
+HEADER = 'Sale ID,Company,Car Model,Price\n'
+
+
+def _parts(path, part_bytes):
+    """Each range parsed as a worker would, with the header prepended"""
+    header, ranges = parallel.split_csv(str(path), part_bytes)
+    with open(path, 'rb') as f:
+        frames = []
+        for start, end in ranges:
+            f.seek(start)
+            frames.append(pd.read_csv(BytesIO(header + f.read(end - start)), dtype=str))
+    return ranges, frames
+
+
+def test_quoted_fields_spanning_lines_are_not_cut(tmp_path):
+    path = tmp_path / 'quoted.csv'
+    path.write_text(HEADER + ''.join(f'S{i},Ford,"Fiesta\nST",{i}\n' for i in range(2000)))
+
+    ranges, frames = _parts(path, 1000)
+    assert len(ranges) > 1
+    assert pd.concat(frames, ignore_index=True).equals(pd.read_csv(path, dtype=str))
+
+
+def test_stray_quote_falls_back_to_one_unit(tmp_path):
+    # The quote in 5" Wheel is data, so counting quotes would put boundaries inside the quoted models
+    rows = [f'S{i},Ford,"Fiesta\nST",{i}\n' for i in range(2000)]
+    rows[10] = 'S10,Ford,5" Wheel,10\n'
+    path = tmp_path / 'stray.csv'
+    path.write_text(HEADER + ''.join(rows))
+
+    assert parallel.split_csv(str(path), 1000) == (b'', [])
+    units = parallel._source_units(str(path), 'stray.csv')
+    assert len(units) == 1 and units[0]['header'] is None
+
+
+def test_boundary_inside_a_quoted_field_falls_back_to_one_unit(tmp_path):
+    # A stray quote ending a field looks like a closing quote, so only the probe after each boundary catches it
+    rows = [f'S{i},Ford,"Fiesta\nST",{i}\n' for i in range(2000)]
+    rows[10] = 'S10,Ford,Fiesta",10\n'
+    path = tmp_path / 'odd.csv'
+    path.write_text(HEADER + ''.join(rows))
+
+    header, ranges = parallel.split_csv(str(path), 1000)
+    assert header == HEADER.encode() and ranges == []
@@ -0,0 +1,47 @@
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.profiling import ProfilingMiddleware
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def request_work():
+    _spin(0.3)
+
+
+def unrelated_work(stop):
+    while not stop.is_set():
+        _spin(0.01)
+
+
+def test_profile_samples_only_the_request_threads():
+    app = FastAPI()
+
+    @app.get('/work')
+    def work():
+        request_work()
+        return {}
+
+    app.add_middleware(ProfilingMiddleware)
+    stop = threading.Event()
+    # Load outside the request, e.g. a background job
+    background = threading.Thread(target=unrelated_work, args=(stop,), daemon=True)
+    background.start()
+    try:
+        with TestClient(app) as client:
+            response = client.get('/work', headers={'X-Profile': '1'})
+    finally:
+        stop.set()
+        background.join()
+
+    assert response.headers['x-profiled-status'] == '200'
+    assert 'request_work' in response.text
+    assert 'unrelated_work' not in response.text
@@ -0,0 +1,28 @@
+from conftest import csv_source
+
+from app import partitions
+from app.services import query_plans
+
+
+def test_analytics_queries_search_their_indexes_in_a_partition(client):
+    response = client.post('/generate-report', data={'task_name': 'planned', 'task_description': 'd'}, files=[
+        csv_source([(f"S{i}", ['Ford', 'BMW', 'Audi'][i % 3], 1000 + i, f"2024-{i % 12 + 1:02d}-01") for i in range(300)])
+    ])
+    assert response.status_code == 200
+
+    db = partitions.open_session('planned')
+    try:
+        assert query_plans.find_full_scans(db) == {}
+        assert query_plans.find_unexpected_plans(db) == {}
+    finally:
+        db.close()
+
+
+def test_a_search_on_the_task_name_alone_is_reported(client, monkeypatch):
+    # The keyset page must be constrained on sale_id, not just the partition's one task_name
+    monkeypatch.setitem(query_plans.EXPECTED_PLANS, 'sales_page', ('sqlite_autoindex_sales_1', ['sale_id', 'price']))
+    db = partitions.open_session('planned', write=True, create=True)
+    try:
+        assert list(query_plans.find_unexpected_plans(db)) == ['sales_page']
+    finally:
+        db.close()
@@ -0,0 +1,79 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from conftest import csv_source
+
+from app import partitions
+from app.database import ReadSessionLocal
+from app.services import analytics, catalog, ingest
+
+# Far below the busy timeout, so a read that waited on the writer's lock fails it
+MAX_READ_SECONDS = 1.0
+
+
+def _rows(count, offset=0):
+    return [
+        (f"S{offset + i}", ['Ford', 'BMW', 'Audi'][i % 3], 1000 + i, f"2024-{i % 12 + 1:02d}-01")
+        for i in range(count)
+    ]
+
+
+def _read(task_name):
+    """The reads behind the task list, analytics and sales pages, returning the task's total sales"""
+    db = ReadSessionLocal()
+    try:
+        catalog.get_catalog_version(db)
+        catalog.list_tasks(db)
+    finally:
+        db.close()
+    db = partitions.open_session(task_name)
+    try:
+        catalog.get_task_version(db, task_name)
+        analytics.get_sales_rows(db, task_name, limit=100)
+        return analytics.get_task_summary(db, task_name)['total_sales']
+    finally:
+        db.close()
+
+
+def test_reads_do_not_wait_for_an_open_ingest(client):
+    response = client.post('/generate-report', data={'task_name': 'busy', 'task_description': 'd'},
+                           files=[csv_source(_rows(1000))])
+    assert response.status_code == 200
+
+    writing, done = threading.Event(), threading.Event()
+
+    def write():
+        # An ingest into the same task, holding the write lock until the reads are over
+        db = partitions.open_session('busy', write=True)
+        try:
+            upload = csv_source(_rows(20000, offset=1000))[1]
+            ingest.ingest_sources(db, 'busy', [(upload[0], 'file', BytesIO(upload[1]))])
+            writing.set()
+            done.wait(30)
+        finally:
+            db.rollback()
+            db.close()
+
+    def timed_reads():
+        latencies = []
+        for _ in range(10):
+            start = time.perf_counter()
+            assert _read('busy') == 1000
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        assert writing.wait(30)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            # Raises on a "database is locked" error in any reader
+            readers = [pool.submit(timed_reads) for _ in range(8)]
+            latencies = [latency for reader in readers for latency in reader.result()]
+    finally:
+        done.set()
+        writer.join()
+
+    assert max(latencies) < MAX_READ_SECONDS
@@ -0,0 +1,46 @@
+import json
+from io import BytesIO
+
+import pytest
+
+from app.services import readers
+
+
+class CountingReader(BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+RECORDS = [
+    {'sale_id': f"S{i}", 'company': 'Ford', 'price': 1000.5 + i, 'sold': i % 2 == 0, 'note': None, 'tags': ['aé', 'b']}
+    for i in range(200)
+]
+
+
+def test_records_split_across_small_blocks_are_decoded():
+    data = json.dumps(RECORDS, ensure_ascii=False).encode()
+    # Blocks cut through strings, numbers, literals and multi-byte characters
+    for block_size in (1, 3, 7, 64):
+        assert list(readers.iter_json_records(BytesIO(data), block_size=block_size)) == RECORDS
+
+
+def test_syntax_error_fails_without_reading_to_the_end():
+    data = b'[{"sale_id": "S0", "price": 1 2}, ' + json.dumps(RECORDS).encode()[1:]
+    source = CountingReader(data)
+    with pytest.raises(ValueError):
+        list(readers.iter_json_records(source, block_size=64))
+    assert source.reads <= 2
+
+
+def test_oversized_record_fails_without_reading_to_the_end():
+    # A string that is never closed, so every block leaves the record incomplete
+    data = b'[{"sale_id": "S0", "note": "' + b'x' * 100000
+    source = CountingReader(data)
+    with pytest.raises(ValueError, match='larger than'):
+        list(readers.iter_json_records(source, block_size=64, max_record_size=1024))
+    assert source.reads <= 1024 // 64 + 2
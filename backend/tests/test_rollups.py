@@ -0,0 +1,30 @@
+
+def _source(rows, name='dealer.csv'):
+    """An upload of (sale_id, company, car_model, price) rows, blanks for missing values"""
+    lines = ['Sale ID,Company,Car Model,Manufacturing Year,Price,Sales Location,Date of Sale']
+    lines += [f"{sale_id},{company},{model},2020,{price},Austin,2024-01-01" for sale_id, company, model, price in rows]
+    return ('sources', (name, ('\n'.join(lines) + '\n').encode('utf-8'), 'text/csv'))
+
+
+def _breakdowns(client, task_name):
+    data = client.get(f'/tasks/{task_name}/analytics').json()
+    return (
+        {entry['company']: entry['count'] for entry in data['company_chart_data']},
+        {entry['car_model']: entry['count'] for entry in data['model_chart_data']},
+        data['summary']['total_sales']
+    )
+
+
+def test_sales_missing_a_company_or_model_are_kept_under_unknown(client):
+    response = client.post('/generate-report', data={'task_name': 'unknowns', 'task_description': 'd'}, files=[
+        _source([('S1', 'Ford', 'Focus', 100), ('S2', '', 'Focus', 200), ('S3', 'BMW', '', 300)])
+    ])
+    assert response.status_code == 200
+    assert _breakdowns(client, 'unknowns') == ({'BMW': 1, 'Ford': 1, 'Unknown': 1}, {'Focus': 2, 'Unknown': 1}, 3)
+
+    # Appends fold into the same bucket, replacing an unknown sale regroups it
+    response = client.post('/tasks/unknowns/append', data={'on_duplicate': 'upsert'}, files=[
+        _source([('S4', '', '', 400), ('S2', 'Ford', 'Focus', 200)])
+    ])
+    assert response.status_code == 200
+    assert _breakdowns(client, 'unknowns') == ({'BMW': 1, 'Ford': 2, 'Unknown': 1}, {'Focus': 2, 'Unknown': 2}, 4)
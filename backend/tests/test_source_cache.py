@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from app import config, partitions
+from app.services import ingest, parallel, source_cache
+
+URL = 'http://feeds.example/evicted.csv'
+
+
+@pytest.fixture
+def evicted(monkeypatch):
+    """A source the server reported unchanged, whose cached chunks are gone"""
+    monkeypatch.setattr(config, 'SOURCE_CACHE', True)
+    source_cache.remember_url(URL, 'f' * 64, '"v1"', None, 'text/csv')
+    return source_cache.CachedSource(URL, 'f' * 64, 'text/csv')
+
+
+@pytest.mark.parametrize('workers', [0, 1])
+def test_evicted_cached_source_fails_and_is_fetched_in_full_next_time(evicted, monkeypatch, workers):
+    monkeypatch.setattr(config, 'INGEST_WORKERS', workers)
+    db = partitions.open_session('evicted', write=True, create=True)
+    try:
+        with pytest.raises(ingest.SourceError, match='evicted'):
+            ingest.ingest_sources(db, 'evicted', [(URL, 'url', evicted)])
+    finally:
+        db.rollback()
+        db.close()
+        partitions.drop('evicted')
+        parallel.shutdown()
+
+    # Its validators are forgotten, so the next fetch is not conditional and gets the body
+    assert not os.path.exists(source_cache._url_path(URL))
@@ -0,0 +1,28 @@
+from conftest import csv_source
+
+
+def test_unknown_task_analytics_is_not_found(client):
+    response = client.get('/tasks/missing/analytics')
+    assert response.status_code == 404
+
+
+def test_invalid_requests_are_rejected_not_failed(client):
+    assert client.get('/tasks/' + 'x' * 101 + '/analytics').status_code == 400
+    assert client.get('/jobs', params={'limit': 0}).status_code == 400
+
+
+def test_task_list_revalidates_with_its_etag(client):
+    client.post('/generate-report', data={'task_name': 'listed', 'task_description': 'd'},
+                files=[csv_source([('S1', 'Ford', 100, '2024-01-01')])])
+    response = client.get('/tasks')
+    assert response.status_code == 200
+    assert 'listed' in [task['task_name'] for task in response.json()['tasks']]
+    assert client.get('/tasks', headers={'If-None-Match': response.headers['etag']}).status_code == 304
+
+
+def test_unknown_task_is_not_found_on_every_read(client):
+    for path in ['/tasks/missing', '/tasks/missing?columnar=true', '/tasks/missing/analytics',
+                 '/tasks/missing/query?dimensions=company', '/tasks/missing/timeseries',
+                 '/tasks/missing/distribution', '/tasks/missing/sales']:
+        response = client.get(path)
+        assert response.status_code == 404, (path, response.text)
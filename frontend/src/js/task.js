@@ -184,7 +184,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     <label class="form-label">Filters for this source:</label>
                     <input type="text" class="form-control source-filter-input" 
                            data-source-id="${sourceId}"
-                           placeholder="Enter filters (e.g., price > 1000, year = 2020)"
+                           placeholder="Enter filters (e.g., price > 1000 < 5000, company in Toyota|Honda)"
                            value="${filters}">
                     <small class="text-muted">Separate multiple filters with commas</small>
                 </div>
@@ -240,7 +240,7 @@ document.addEventListener('DOMContentLoaded', function() {
             currentSources.forEach((source, index) => {
                 const filterInput = document.querySelector(`input[data-source-id="${source.id}"]`);
                 if (filterInput && filterInput.value.trim()) {
-                    sourceFilters[index] = parseFilters(filterInput.value.trim());
+                    sourceFilters[index] = filterInput.value.trim();  // Parsed and validated by the backend
                 }
             });
 
@@ -389,9 +389,9 @@ document.addEventListener('DOMContentLoaded', function() {
             // Show the analytics section
             analyticsSection.style.display = 'block';
             
-            // Process data for charts
-            const companyChartData = processCompanyChartData(data.sales_data);
-            const monthlyChartData = processMonthlyChartData(data.sales_data);
+            // Process data for charts from the server-side aggregates
+            const companyChartData = processCompanyChartData(data.company_chart_data);
+            const monthlyChartData = processMonthlyChartData(data.monthly_chart_data);
             
             // Create charts only if we have data
             if (companyChartData.length > 0) {
@@ -411,42 +411,24 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // Helper function to process data for company chart
-    function processCompanyChartData(salesData) {
-        const companyData = {};
-        salesData.forEach(sale => {
-            if (!companyData[sale.company]) {
-                companyData[sale.company] = {
-                    company: sale.company,
-                    total_sales: 0,
-                    total_revenue: 0
-                };
-            }
-            companyData[sale.company].total_sales += 1;
-            companyData[sale.company].total_revenue += sale.price;
-        });
-        return Object.values(companyData);
+    function processCompanyChartData(companyData) {
+        return companyData.map(item => ({
+            company: item.company,
+            total_sales: item.count,
+            total_revenue: item.total_revenue
+        }));
     }
 
     // Helper function to process data for monthly chart
-    function processMonthlyChartData(salesData) {
-        const monthlyData = {};
-        salesData.forEach(sale => {
-            const date = new Date(sale.date_of_sale);
-            const monthKey = `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}`;
-            
-            if (!monthlyData[monthKey]) {
-                monthlyData[monthKey] = {
-                    month: monthKey,
-                    total_revenue: 0,
-                    count: 0,
-                    average_price: 0
-                };
-            }
-            monthlyData[monthKey].total_revenue += sale.price;
-            monthlyData[monthKey].count += 1;
-            monthlyData[monthKey].average_price = monthlyData[monthKey].total_revenue / monthlyData[monthKey].count;
-        });
-        return Object.values(monthlyData).sort((a, b) => a.month.localeCompare(b.month));
+    function processMonthlyChartData(monthlyData) {
+        return monthlyData
+            .map(item => ({
+                month: item.month,
+                total_revenue: item.total_revenue,
+                count: item.count,
+                average_price: item.avg_price
+            }))
+            .sort((a, b) => a.month.localeCompare(b.month));
     }
 
     // Function to create a bar chart using D3.js
@@ -973,28 +955,4 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Fetch existing tasks when the page loads
     fetchExistingTasks();
-
-    // Add helper function to parse filters
-    function parseFilters(filterString) {
-        const filters = {};
-        const filterParts = filterString.split(',').map(part => part.trim());
-        
-        filterParts.forEach(filter => {
-            if (filter.includes('price')) {
-                const [min, max] = filter.split('>')[1].split('<').map(Number);
-                filters.priceRange = { min, max };
-            } else if (filter.includes('year')) {
-                const [min, max] = filter.split('>')[1].split('<').map(Number);
-                filters.yearRange = { min, max };
-            } else if (filter.includes('company')) {
-                filters.company = filter.split('=')[1].trim();
-            } else if (filter.includes('model')) {
-                filters.model = filter.split('=')[1].trim();
-            } else if (filter.includes('location')) {
-                filters.location = filter.split('=')[1].trim();
-            }
-        });
-        
-        return filters;
-    }
 }); 
\ No newline at end of file